@@ -1,17 +1,80 @@
-from flask import Blueprint
-from flask_bcrypt import Bcrypt
+from flask import Blueprint, current_app, json
+from concurrent.futures import ThreadPoolExecutor
 import datetime
+import click
+import time
 
 from main import db
-from models import Country, Currency, LocationType, Location, User, Project, Drawing, Comment, Manufacture
+from models import Country, Currency, ExchangeRate, LocationType, Location, User, Project, Drawing, DrawingRevision, Comment, Manufacture
+from utils.passwords import PasswordHasher, hash_password, bcrypt_hash, bcrypt_check
+from utils.migrations import upgrade_schema, downgrade_schema
+from utils.synthetic import seed_synthetic
+from utils.benchmark import benchmark_routes, run_test_client, run_http_load, http_login, format_report, compare_results
+from utils.benchmark import load_serialisation_rows, compare_json_backends, compare_serialisers, format_serialisation_report
 
-bcrypt = Bcrypt()
 db_commands = Blueprint("db", __name__)
-
-@db_commands.cli.command("create")
-def create_db():
-    db.create_all()
-    print("Tables have been created.")
+benchmark_commands = Blueprint("benchmark", __name__)
+
+@db_commands.cli.command("upgrade")
+def upgrade_db():
+    '''
+    Brings the database schema up to the latest revision in the migrations package. An empty database is created from the
+    models; an existing database only has the revisions it is missing applied, so its data is kept.
+    '''
+    for script in upgrade_schema():
+        print(f"Applied revision {script.revision}: {script.description}.")
+    print("Tables are up to date.")
+
+@db_commands.cli.command("downgrade")
+def downgrade_db():
+    '''
+    Reverts the latest applied revision of the database schema.
+    '''
+    script = downgrade_schema()
+    if script is None:
+        print("There is no revision to revert.")
+    else:
+        print(f"Reverted revision {script.revision}: {script.description}.")
+
+@db_commands.cli.command("check-indexes")
+def check_indexes():
+    '''
+    Runs EXPLAIN on the queries of the routes that filter by a foreign key, and fails if the query plan does not use the
+    index declared for that filter. On PostgreSQL sequential scans are disabled for the check, so the result does not
+    depend on how many rows are in the tables.
+    '''
+    filter_paths = [
+        ("Suppliers of a project", "ix_manufactures_project_id_location_id",
+         db.select(Manufacture).filter_by(project_id=1).order_by(Manufacture.location_id, Manufacture.project_id)),
+        ("Drawings of a project", "ix_drawings_project_id_id",
+         db.select(Drawing).filter_by(project_id=1).where(Drawing.id > 0).order_by(Drawing.id)),
+        ("Comments of a project", "ix_comments_project_id_id",
+         db.select(Comment).filter_by(project_id=1).where(Comment.id > 0).order_by(Comment.id)),
+        ("Comments of a user", "ix_comments_user_id_id",
+         db.select(Comment).filter_by(user_id=1).where(Comment.id > 0).order_by(Comment.id)),
+        ("History of a drawing", "ix_drawing_revisions_drawing_id_version",
+         db.select(DrawingRevision).filter_by(drawing_id=1).where(DrawingRevision.version > 0).order_by(DrawingRevision.version)),
+    ]
+
+    dialect = db.engine.dialect
+    explain = "EXPLAIN QUERY PLAN" if dialect.name == "sqlite" else "EXPLAIN"
+    missing = []
+
+    with db.engine.begin() as connection:
+        if dialect.name == "postgresql":
+            connection.execute(db.text("SET LOCAL enable_seqscan = off"))
+
+        for description, index_name, query in filter_paths:
+            sql = query.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+            plan = "\n".join(str(row[-1]) for row in connection.execute(db.text(f"{explain} {sql}")))
+            used = index_name in plan
+            print(f"{'ok' if used else 'MISSING':>7}  {description} ({index_name})")
+            if not used:
+                print("         " + plan.replace("\n", "\n         "))
+                missing.append(index_name)
+
+    if missing:
+        raise click.ClickException(f"Query plans do not use: {', '.join(missing)}. Run `flask db upgrade`.")
 
 @db_commands.cli.command("drop")
 def drop_db():
@@ -19,7 +82,8 @@ def drop_db():
     print("Tables have been dropped.")
 
 @db_commands.cli.command("seed")
-def seed_db():
+@click.option("--scale", default=0, help="Also add a synthetic dataset of this many locations and projects, with their drawings, comments, suppliers, users and lookup entries (about 22 rows per unit, see utils/synthetic.py).")
+def seed_db(scale):
 
     ctry1 = Country(
         country = "Australia"
@@ -65,6 +129,13 @@ def seed_db():
     db.session.add_all([ctry1, ctry2, ctry3, loc_type1, loc_type2, loc_type3, curr1, curr2, curr3, curr4])
     db.session.commit()
 
+    # Seed exchange rates, in US dollars per unit of each currency
+    curr1.exchange_rate = ExchangeRate(rate=0.65, last_modified=datetime.datetime.now())
+    curr2.exchange_rate = ExchangeRate(rate=0.000064, last_modified=datetime.datetime.now())
+    curr3.exchange_rate = ExchangeRate(rate=0.73, last_modified=datetime.datetime.now())
+    curr4.exchange_rate = ExchangeRate(rate=1.0, last_modified=datetime.datetime.now())
+    db.session.commit()
+
     loc1 = Location(
         name = "Balmora",
         admin_phone_number = "+614 555 555 55",
@@ -122,7 +193,7 @@ def seed_db():
         username = "ccosades",
         email_address = "ccosades@blades.com",
         position = "Mechanical Engineer",
-        password = bcrypt.generate_password_hash("blades4ever").decode("utf-8"),
+        password = hash_password("blades4ever"),
         is_admin = True,
         location_id = 1
     )
@@ -131,7 +202,7 @@ def seed_db():
         username = "tsadus",
         email_address = "tsadus@genmerch.com",
         position = "Maintenance Superintendent",
-        password = bcrypt.generate_password_hash("justice4juib").decode("utf-8"),
+        password = hash_password("justice4juib"),
         is_admin = False,
         location_id = 2
     )
@@ -140,7 +211,7 @@ def seed_db():
         username = "ajira",
         email_address = "ajira@magesguild.com",
         position = "Fabrication Supervisor",
-        password = bcrypt.generate_password_hash("alchemist4").decode("utf-8"),
+        password = hash_password("alchemist4"),
         is_admin = False,
         location_id = 1
     )
@@ -149,7 +220,7 @@ def seed_db():
         username = "lvarro",
         email_address = "larrius.varro@legion.com",
         position = "Asset Engineer",
-        password = bcrypt.generate_password_hash("byanymeans").decode("utf-8"),
+        password = hash_password("byanymeans"),
         is_admin = True,
         location_id = 3
     )
@@ -158,7 +229,7 @@ def seed_db():
         username = "sgravius",
         email_address = "sgravius@legion.com",
         position = "Workshop Supervisor",
-        password = bcrypt.generate_password_hash("ahyesyoumustbe").decode("utf-8"),
+        password = hash_password("ahyesyoumustbe"),
         is_admin = False,
         location_id = 4
     )
@@ -167,7 +238,7 @@ def seed_db():
         username = "arrille",
         email_address = "arrille@tradehouse.com",
         position = "Maintenance Manager",
-        password = bcrypt.generate_password_hash("hideindatrunk5").decode("utf-8"),
+        password = hash_password("hideindatrunk5"),
         is_admin = False,
         location_id = 5
     )
@@ -176,7 +247,7 @@ def seed_db():
         username = "prielle",
         email_address = "phane@cornerclub.com",
         position = "Mechanical Engineer",
-        password = bcrypt.generate_password_hash("savant952").decode("utf-8"),
+        password = hash_password("savant952"),
         is_admin = True,
         location_id = 4
     )
@@ -185,7 +256,7 @@ def seed_db():
         username = "rathrys",
         email_address = "ranis@magesguild.com",
         position = "Asset Specialist",
-        password = bcrypt.generate_password_hash("alteration4life").decode("utf-8"),
+        password = hash_password("alteration4life"),
         is_admin = False,
         location_id = 6
     )
@@ -194,7 +265,7 @@ def seed_db():
         username = "amantiti",
         email_address = "a.mantiti@mantitimining.com",
         position = "Maintenance Superintendent",
-        password = bcrypt.generate_password_hash("moneyyyyyy").decode("utf-8"),
+        password = hash_password("moneyyyyyy"),
         is_admin = False,
         location_id = 7
     )
@@ -203,7 +274,7 @@ def seed_db():
         username = "ehlaalu",
         email_address = "eno@househlaalu.com",
         position = "Diesel Fitter",
-        password = bcrypt.generate_password_hash("password#4").decode("utf-8"),
+        password = hash_password("password#4"),
         is_admin = False,
         location_id = 7
     )
@@ -478,4 +549,132 @@ def seed_db():
     db.session.add_all([manu1, manu2, manu3, manu4, manu5, manu6, manu7, manu8, manu9, manu10])
     db.session.commit()
 
+    # Seed the synthetic benchmark dataset
+    if scale:
+        seed_synthetic(scale)
+
     print("Tables have been seeded.")
+
+
+@benchmark_commands.cli.command("passwords")
+@click.option("--costs", default="10,11,12,13", help="Comma separated bcrypt cost factors to measure.")
+@click.option("--logins", default=20, help="Number of password checks to time at each cost.")
+def benchmark_passwords(costs, logins):
+    '''
+    Reports how many logins per second one CPU core can verify at each bcrypt cost factor, and how many the configured
+    password hashing worker pool (PASSWORD_HASH_WORKERS) can verify in total. Use this to choose BCRYPT_LOG_ROUNDS and
+    PASSWORD_HASH_WORKERS for a deployment.
+    '''
+    workers = current_app.config["PASSWORD_HASH_WORKERS"] or 1
+    hasher = PasswordHasher(workers=workers, queue_size=logins, queue_timeout=None)
+    print(f"{'cost':>4} {'ms/login':>10} {'logins/s/core':>14} {'logins/s pool':>14} ({workers} workers)")
+
+    try:
+        for cost in [int(cost) for cost in costs.split(",")]:
+            hashed = bcrypt_hash("benchmark-password", cost)
+
+            # Single core: check passwords one after another on this process.
+            start = time.perf_counter()
+            for _ in range(logins):
+                bcrypt_check(hashed, "benchmark-password")
+            per_core = logins / (time.perf_counter() - start)
+
+            # Worker pool: submit every check at once, the same way concurrent login requests would.
+            hasher.run(bcrypt_check, hashed, "benchmark-password")
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=logins) as clients:
+                list(clients.map(lambda _: hasher.run(bcrypt_check, hashed, "benchmark-password"), range(logins)))
+            pool = logins / (time.perf_counter() - start)
+
+            print(f"{cost:>4} {1000 / per_core:>10.1f} {per_core:>14.1f} {pool:>14.1f}")
+    finally:
+        hasher.shutdown()
+
+
+def benchmark_options(command):
+    # Options shared by the route benchmarks
+    command = click.option("--requests", default=50, help="Number of timed requests to each route.")(command)
+    command = click.option("--username", default="ccosades", help="User to log in as; an admin so that admin routes are included.")(command)
+    command = click.option("--password", default="blades4ever", help="Password of the user.")(command)
+    command = click.option("--save", type=click.Path(dir_okay=False), help="Save the results as JSON, as a baseline to compare other runs with.")(command)
+    command = click.option("--compare", type=click.Path(exists=True, dir_okay=False), help="Fail if the results regressed from a saved baseline.")(command)
+    command = click.option("--tolerance", default=20.0, help="Percent of p95 latency or throughput change allowed by --compare.")(command)
+    command = click.option("--min-delta-ms", default=2.0, help="Latency changes smaller than this many milliseconds are never regressions.")(command)
+    return command
+
+
+def report_benchmark(results, save, compare, tolerance, min_delta_ms):
+    print(format_report(results))
+
+    if save:
+        with open(save, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Results saved to {save}.")
+
+    if compare:
+        with open(compare) as file:
+            regressions = compare_results(json.load(file), results, tolerance, min_delta_ms)
+        if regressions:
+            raise click.ClickException("Regressions from the baseline:\n" + "\n".join(regressions))
+        print(f"No regressions from {compare}.")
+
+
+@benchmark_commands.cli.command("routes")
+@benchmark_options
+def benchmark_routes_command(requests, username, password, save, compare, tolerance, min_delta_ms):
+    '''
+    Requests every GET route listed on the homepage through the Flask test client, one request at a time, and reports the
+    p50/p95/p99 latency, throughput and database statements per request of each route. The routes run against the
+    configured database, e.g. one seeded with `flask db seed --scale 1000`.
+
+    Save a run on one branch with --save, and check another branch against it with --compare: the command fails if any
+    route is slower by more than --tolerance percent, or runs more database statements per request.
+    '''
+    app = current_app._get_current_object()
+    token = app.test_client().post("/auth/login", json={"username": username, "password": password}).get_json()["access_token"]
+    results = run_test_client(app, benchmark_routes(app), {"Authorization": f"Bearer {token}"}, requests)
+    report_benchmark(results, save, compare, tolerance, min_delta_ms)
+
+
+@benchmark_commands.cli.command("load")
+@click.option("--url", default="http://127.0.0.1:5000", help="Base url of the running server.")
+@click.option("--concurrency", default=10, help="Number of requests in flight at once.")
+@benchmark_options
+def benchmark_load(url, concurrency, requests, username, password, save, compare, tolerance, min_delta_ms):
+    '''
+    Sends concurrent HTTP requests to every GET route listed on the homepage of a running server (e.g. gunicorn or
+    `uvicorn asgi:app`), and reports the p50/p95/p99 latency and throughput of each route under load. The database
+    statements per request of a server are reported by its GET /metrics route. --save and --compare work the same as for
+    `flask benchmark routes`.
+    '''
+    base_url = url.rstrip("/")
+    token = http_login(base_url, username, password)
+    urls = benchmark_routes(current_app._get_current_object())
+    results = run_http_load(base_url, urls, {"Authorization": f"Bearer {token}"}, requests, concurrency)
+    report_benchmark(results, save, compare, tolerance, min_delta_ms)
+
+
+@benchmark_commands.cli.command("json")
+@click.option("--rows", default=10000, help="Number of entries of each table to serialise.")
+@click.option("--repeat", default=5, help="Number of times each response is built; the fastest is reported.")
+def benchmark_json(rows, repeat):
+    '''
+    Reports the time taken to build a json response from the dumped entries of each list schema with the standard library
+    json module and with orjson (see utils/json_provider.py), checking that both give the same data. Seed a synthetic
+    dataset first (`flask db seed --scale N`) to measure large lists.
+    '''
+    entries = load_serialisation_rows(rows)
+    print(format_serialisation_report(compare_json_backends(current_app._get_current_object(), entries, repeat)))
+
+
+@benchmark_commands.cli.command("schemas")
+@click.option("--rows", default=100000, help="Number of entries of each table to dump.")
+@click.option("--repeat", default=3, help="Number of times each list is dumped; the fastest is reported.")
+def benchmark_schemas(rows, repeat):
+    '''
+    Reports the time taken to dump the entries of each list schema with marshmallow's generic serialisation and with the
+    compiled serialisers (see utils/serialisers.py), checking that both give the same json. Seed a synthetic dataset
+    first (`flask db seed --scale N`) to measure large lists.
+    '''
+    entries = load_serialisation_rows(rows)
+    print(format_serialisation_report(compare_serialisers(entries, repeat)))
@@ -1,7 +1,102 @@
 import os
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+
+def env_int(name, default):
+    '''
+    Reads an integer setting from an environment variable, so that it can be tuned per deployment without a code change.
+    '''
+    value = os.environ.get(name)
+    return default if value in (None, "") else int(value)
+
+
+def env_flag(name, default=False):
+    value = os.environ.get(name)
+    return default if value in (None, "") else value.lower() in ("1", "true", "yes")
 
 
 class BaseConfig(object):
+    # Keyset pagination for list routes
+    PAGINATION_DEFAULT_LIMIT = 50
+    PAGINATION_MAX_LIMIT = 500
+
+    # Seconds that a user's id and is_admin flag are cached for after lookup by JWT identity
+    IDENTITY_CACHE_TTL = 30
+
+    # Password hashing: bcrypt cost factor, worker processes, and how many hashes may queue (and for how long, in seconds)
+    # before logins are turned away with a 503
+    BCRYPT_LOG_ROUNDS = 12
+    PASSWORD_HASH_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+    PASSWORD_HASH_QUEUE_SIZE = 64
+    PASSWORD_HASH_QUEUE_TIMEOUT = 5
+
+    # Cache for the countries, currencies and location_types lookup tables. Set REFERENCE_CACHE_URL to a Redis URL to
+    # share the cache between worker processes; otherwise each process keeps its own copy for REFERENCE_CACHE_TTL seconds.
+    REFERENCE_CACHE_URL = os.environ.get("REFERENCE_CACHE_URL")
+    REFERENCE_CACHE_TTL = 300
+
+    # Maximum number of entries accepted by a single request to a bulk route
+    BULK_MAX_ITEMS = 1000
+
+    # Rows read from the database and serialised at a time by streamed list responses
+    STREAM_BATCH_SIZE = 1000
+
+    # Text search configuration used to build and query the PostgreSQL search documents
+    SEARCH_LANGUAGE = "english"
+
+    # Database connection pool of each worker process. The pool keeps DB_POOL_SIZE connections open and opens up to
+    # DB_MAX_OVERFLOW more under load; a request waits up to DB_POOL_TIMEOUT seconds for a connection before failing.
+    # Connections are replaced after DB_POOL_RECYCLE seconds, and tested before use if DB_POOL_PRE_PING is set, so that
+    # connections closed by the server or a proxy are never handed to a request.
+    DB_POOL_SIZE = env_int("DB_POOL_SIZE", 5)
+    DB_MAX_OVERFLOW = env_int("DB_MAX_OVERFLOW", 10)
+    DB_POOL_TIMEOUT = env_int("DB_POOL_TIMEOUT", 30)
+    DB_POOL_RECYCLE = env_int("DB_POOL_RECYCLE", 1800)
+    DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING", True)
+
+    # Milliseconds a single SQL statement may run for before PostgreSQL cancels it. 0 is no limit.
+    DB_STATEMENT_TIMEOUT = env_int("DB_STATEMENT_TIMEOUT", 0)
+
+    # Set when connecting through PgBouncer in transaction pooling mode. PgBouncer then does the pooling, so each worker
+    # process opens connections only as needed (NullPool), and the statement timeout is set at the start of each
+    # transaction, because PgBouncer does not pass connection startup options on to the server.
+    DB_PGBOUNCER = env_flag("DB_PGBOUNCER")
+
+    # Request instrumentation (see utils/instrumentation.py). Statements slower than SLOW_QUERY_MS milliseconds are logged
+    # (0 turns the slow query log off), and a warning is logged when a request runs the same statement more than
+    # N_PLUS_ONE_THRESHOLD times. When METRICS_TOKEN is set, GET /metrics accepts it as a bearer token in place of an admin
+    # JWT, for Prometheus to scrape with.
+    SLOW_QUERY_MS = env_int("SLOW_QUERY_MS", 200)
+    N_PLUS_ONE_THRESHOLD = env_int("N_PLUS_ONE_THRESHOLD", 10)
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+    # JSON serialisation of requests and responses (see utils/json_provider.py): "orjson", or "json" for the json module of
+    # the standard library. The standard library is also used when orjson is not installed.
+    JSON_BACKEND = os.environ.get("JSON_BACKEND", "orjson")
+
+    @property
+    def SQLALCHEMY_ENGINE_OPTIONS(self):
+        backend = make_url(self.SQLALCHEMY_DATABASE_URI).get_backend_name()
+
+        # SQLite is only used locally; its connections are cheap and the pool settings do not apply to it.
+        if backend == "sqlite":
+            return {}
+
+        if self.DB_PGBOUNCER:
+            return {"poolclass": NullPool}
+
+        options = {
+            "pool_size": self.DB_POOL_SIZE,
+            "max_overflow": self.DB_MAX_OVERFLOW,
+            "pool_timeout": self.DB_POOL_TIMEOUT,
+            "pool_recycle": self.DB_POOL_RECYCLE,
+            "pool_pre_ping": self.DB_POOL_PRE_PING,
+            }
+        if backend == "postgresql" and self.DB_STATEMENT_TIMEOUT:
+            options["connect_args"] = {"options": f"-c statement_timeout={self.DB_STATEMENT_TIMEOUT}"}
+        return options
+
     @property
     def SQLALCHEMY_DATABASE_URI(self):
 
@@ -28,11 +123,15 @@ class DevelopmentConfig(BaseConfig):
 
 
 class TestingConfig(DevelopmentConfig):
-    pass
+    BCRYPT_LOG_ROUNDS = 4
+    PASSWORD_HASH_WORKERS = 0
     
 
 class ProductionConfig(DevelopmentConfig):
-    pass
+    DB_POOL_SIZE = env_int("DB_POOL_SIZE", 10)
+    DB_MAX_OVERFLOW = env_int("DB_MAX_OVERFLOW", 20)
+    DB_POOL_TIMEOUT = env_int("DB_POOL_TIMEOUT", 10)
+    DB_STATEMENT_TIMEOUT = env_int("DB_STATEMENT_TIMEOUT", 30000)
 
 
 current_env = os.environ.get("FLASK_ENV")
@@ -8,6 +8,9 @@ from controllers.drawings_controller import drawings
 from controllers.comments_controller import comments
 from controllers.manufactures_controller import manufactures
 from controllers.auths_controller import auths
+from controllers.search_controller import search
+from controllers.status_controller import status
+from controllers.metrics_controller import metrics
 from controllers.homepage_controller import homepage
 
 register_controllers = (
@@ -21,5 +24,8 @@ register_controllers = (
     comments,
     manufactures,
     auths,
+    search,
+    status,
+    metrics,
     homepage
     )
\ No newline at end of file
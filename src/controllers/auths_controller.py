@@ -1,13 +1,15 @@
 from flask import Blueprint, jsonify, request
 from marshmallow.exceptions import ValidationError
-from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import BadRequest, ServiceUnavailable
 from sqlalchemy.exc import IntegrityError, DataError
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
+from flask_jwt_extended import create_access_token, jwt_required
 from datetime import timedelta
 
-from main import db, bcrypt
+from main import db
 from models.users import User
 from schemas.user_schema import user_schema, login_schema
+from utils.identity import get_current_identity
+from utils.passwords import hash_password, check_password, needs_rehash
 
 auths = Blueprint('auth', __name__, url_prefix="/auth")
 
@@ -32,22 +34,26 @@ def integrity_error_handler(e):
 def data_error_handler(e):
     return jsonify({"data_error": f"{e}"}), 400
 
+@auths.errorhandler(ServiceUnavailable)
+def service_unavailable_error_handler(e):
+    return jsonify({"error": e.description}), 503
+
 
 def check_admin():
     '''
     This helper function is used throughout the application to check for is_admin=True before allowing use of admin-level
     access routes.
 
-    The following database query will filter the users.username column to match the username given from the JWT identity.
-    Database statement: SELECT * FROM users WHERE username=get_jwt_identity();
+    The identity of the user is found with get_current_identity(), which caches the id and is_admin attribute of the user
+    so that admin routes do not need to query the users table on every request. The cache is cleared for a user whenever
+    their entry is updated or deleted.
+    Database statement (cache miss only): SELECT id, is_admin FROM users WHERE username=get_jwt_identity();
 
-    For the matching user entry in the users table, the is_admin attribute will be returned (True/False).
+    The is_admin attribute of the matching user will be returned (True/False). False is returned if the user no longer exists.
     '''
     # Get the identity of the user using this route & check is_admin=True.
-    username = get_jwt_identity()
-    query = db.select(User).filter_by(username=username)
-    user = db.session.scalar(query)
-    return user.is_admin
+    identity = get_current_identity()
+    return identity is not None and identity.is_admin
 
 
 # Register a New User
@@ -63,7 +69,7 @@ def register_user():
     The following database statement is used to add the entry into the users table.
     Database statement: INSERT INTO users (username, email_address, position, location_id, is_admin, password)
     VALUES (user_json["username"], user_json["email_address"], user_json["position"], user_json["location_id"], 
-    False, bcrypt.generate_password_hash(user_json["password"]).decode("utf-8"));
+    False, hash_password(user_json["password"]));
 
     Example json body for POST request:
     {
@@ -88,7 +94,7 @@ def register_user():
     new_user.is_admin = False
 
     # Hash password before storing
-    new_user.password = bcrypt.generate_password_hash(user_json["password"]).decode("utf-8")
+    new_user.password = hash_password(user_json["password"])
 
     # Add to the database and commit changes
     db.session.add(new_user)
@@ -120,6 +126,10 @@ def login_user():
         "password": "string between 6 and 50 chars"
     }
 
+    Passwords are checked by the password hashing worker pool (see utils/passwords.py). If the stored hash was made with an
+    older cost factor, it is replaced with a hash at the current BCRYPT_LOG_ROUNDS while the plain password is available.
+    Database statement: UPDATE users SET password=hash_password(request.json["password"]) WHERE id=user.id;
+
     This route performs authentication, so no prior authentication is required for this route.
     '''
     login_json = login_schema.load(request.json)
@@ -127,9 +137,14 @@ def login_user():
     user = db.session.scalar(query)
 
     # Check if user exists and that the entered password matches
-    if not user or not bcrypt.check_password_hash(user.password, login_json["password"]):
+    if not user or not check_password(user.password, login_json["password"]):
         return jsonify({"error": "The username or password you have entered is incorrect. Please try again."}), 401
-    
+
+    # Rehash the password if it was stored with a different cost factor to the current BCRYPT_LOG_ROUNDS.
+    if needs_rehash(user.password):
+        user.password = hash_password(login_json["password"])
+        db.session.commit()
+
     # Create an access token that expires in 1 day
     expiry = timedelta(days=7)
     access_token = create_access_token(identity=login_json["username"], expires_delta=expiry)
@@ -148,7 +163,8 @@ def promote_user_to_admin():
     username will be sent via json body in the request. This design choice was made because it feels more deliberate and
     less prone to error than sending a users.id via URL.
 
-    A PATCH request seems most appropriate here, as only one field is being updated for the user entry.
+    A PATCH request seems most appropriate here, as only one field is being updated for the user entry. The cached identity
+    of the promoted user (see get_current_identity) is cleared when the change is committed.
 
     The following database query will filter the users.username column to match the username given from the request json.
     Database statement: SELECT * FROM users WHERE username='request.json["username"]';
@@ -2,13 +2,21 @@ from flask import Blueprint, jsonify, abort, request
 from marshmallow.exceptions import ValidationError
 from werkzeug.exceptions import BadRequest
 from sqlalchemy.exc import IntegrityError, DataError
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 import datetime
 
 from main import db
 from models.comments import Comment
+from models.projects import Project
 from models.users import User
 from schemas.comment_schema import comment_schema, comments_schema
+from utils.streaming import wants_stream, stream_response
+from utils.list_options import read_list_options
+from utils.pagination import paginate
+from utils.identity import get_current_identity
+from utils.loading import eager_load_options
+from utils.conditional import conditional_get
+from utils.updates import read_partial_update, read_expected_version, update_entry, version_etag, changed_fields
 
 comments = Blueprint('comment', __name__, url_prefix="/comments")
 
@@ -46,8 +54,9 @@ def post_comment():
     the current user's user_id. This means that the user will only have to include the comment and project_id in their
     request.
 
-    The following statement will be used to find the current user's user_id by way of get_jwt_identity().
-    Database statement: SELECT * FROM users WHERE username=get_jwt_identity();
+    The following statement will be used to find the current user's user_id by way of get_jwt_identity(), unless the identity
+    is already cached (see get_current_identity).
+    Database statement: SELECT id, is_admin FROM users WHERE username=get_jwt_identity();
 
     The following statement will be used to create the entry in the comments data table.
     Database statement: INSERT INTO comments (comment, when_created, last_edited, project_id, user_id) 
@@ -69,10 +78,10 @@ def post_comment():
     comment_json["last_edited"] = None
 
     # Get the user_id using the jwt identity.
-    username = get_jwt_identity()
-    query = db.select(User).filter_by(username=username)
-    user = db.session.scalar(query)
-    comment_json["user_id"] = user.id
+    identity = get_current_identity()
+    if identity is None:
+        return jsonify(error="The user of this access token no longer exists."), 401
+    comment_json["user_id"] = identity.user_id
 
     # Create the new entry.
     new_comment = Comment(**comment_json)
@@ -98,92 +107,101 @@ def update_comment_by_id(comment_id: int):
     For ease of use, the user only has to pass the fields that they want to update. The PATCH request feels more appropriate
     in this instance given that not all fields are required to be passed.
 
-    The user modifying the comment must first be found in the database to check if they are an admin or to if their user id
-    matches the user_id of the modified comment.
-    Database statement: SELECT * FROM users WHERE username=get_jwt_identity().
+    The user modifying the comment must first be found in the database (or identity cache) to check if they are an admin or
+    to if their user id matches the user_id of the modified comment.
+    Database statement: SELECT id, is_admin FROM users WHERE username=get_jwt_identity().
 
-    The comment being modified must also be found in the database, to firstly retrieve the user_id then to modify.
-    Database statement: SELECT * FROM comments where id=comment_id;
+    Only the fields passed are validated, and they are applied to the comment with a single statement, which also returns
+    the updated comment (see utils/updates.py). The statement only matches the comment of another user if the user is an
+    admin.
+    Database statement: UPDATE comments SET (fields passed), last_edited=now(), version=version+1 WHERE id=comment_id
+    AND user_id=user.id AND version=expected version RETURNING *;
+
+    The version of the comment is increased by every update. To make sure that changes made by someone else in the meantime
+    are not overwritten, the version the changes were based on can be given in the If-Match header (the ETag returned by
+    GET /comments/<id>, e.g. If-Match: "3") or the `version` field. If the comment has been updated since, nothing is
+    changed and 409 Conflict is returned with the current version.
 
     Example json body for PATCH request:
     {
         "comment": "string",
-        "project_id": "integer"
+        "project_id": "integer",
+        "version": "OPTIONAL, integer, the version the changes are based on"
     }
 
     JWT is required for this route. is_admin=True is required to modify a comment made by a different user.
     '''
-    # Query the database to find the comment specified in the URL
-    query = db.select(Comment).filter_by(id=comment_id)
-    comment = db.session.scalar(query)
-
-    # If a comment with that id doesn't exist, provide feedback to the user of the error.
-    response = comment_schema.dump(comment)
-    if not response:
-        return jsonify({"error": f"A comment with `id`={comment_id} does not exist in the database. No edits have been made."}), 404
-
-    # Query the database to find the user making the modification.
-    query = db.select(User).filter_by(username=get_jwt_identity())
-    user = db.session.scalar(query)
-
-    # Ensure that the user is either an admin or the owner of the comment.
-    if not comment.user_id == user.id and not user.is_admin:
+    # Find the identity of the user making the modification.
+    identity = get_current_identity()
+    if identity is None:
         return jsonify(error="You can only modify comments that you have made."), 401
 
-    # Validate input coming from json request using schema.
-    # Load-only fields need dummy data if not passed by the user.
-    if request.json.get("comment"):
-        response["comment"] = request.json["comment"]
-    if request.json.get("project_id"):
-        response["project_id"] = request.json["project_id"]
+    # Validate the fields given in the json request body, and only those fields, and read the expected version.
+    changes = read_partial_update(comment_schema, ("comment", "project_id"))
+    expected = read_expected_version()
+
+    # Apply the changes, and update the last_edited date, with a single statement which returns the updated comment.
+    # Users who are not admins can only change their own comments.
+    if changes:
+        conditions = [] if identity.is_admin else [Comment.user_id == identity.user_id]
+        comment = update_entry(Comment, {"id": comment_id}, {**changes, "last_edited": datetime.datetime.now()}, *conditions, version=expected)
     else:
-        response["project_id"] = 1
-    # Add dummy user_id for schema valiation only
-    response["user_id"] = 1
-    # Add dummy datetime for schema validation only
-    response["last_edited"] = datetime.datetime.now()
-    response = comment_schema.load(response)
-
-    # Map the json request properties to the comment if they are given.
-    # Build string of changes to provide feedback to user.
-    changed_string = ""
-    if request.json.get("comment"):
-        comment.comment = request.json["comment"]
-        changed_string = " comment"
-    if request.json.get("project_id"):
-        comment.project_id = request.json["project_id"]
-        changed_string += " project_id"
-    comment.last_edited = datetime.datetime.now()
-
-    # Check if any information was changed. Give response if nothing was changed.
-    if changed_string == "":
+        comment = None
+
+    if comment is None:
+        # Nothing was changed, so find out why: the comment does not exist, belongs to another user, has been changed since
+        # the expected version, or no fields were given.
+        current = db.session.execute(db.select(Comment.user_id, Comment.version).filter_by(id=comment_id)).first()
+        if current is None:
+            return jsonify({"error": f"A comment with `id`={comment_id} does not exist in the database. No edits have been made."}), 404
+        if not current.user_id == identity.user_id and not identity.is_admin:
+            return jsonify(error="You can only modify comments that you have made."), 401
+        if changes:
+            return jsonify({"error": f"The comment with `id`={comment_id} has been changed since version {expected}. No edits have been made.", "version": current.version}), 409
         return jsonify(message="No user information has been changed.")
-    
+
     # Commit changes and return changed information.
+    response = comment_schema.dump(comment)
     db.session.commit()
-    return jsonify(message=f"The following user information has been changed:{changed_string}.", **comment_schema.dump(comment))
+    return version_etag(jsonify(message=f"The following user information has been changed:{changed_fields(changes)}.", **response), comment)
 
 
 # GET all comments
 # /comments/
 @comments.route("/", methods=["GET"])
 @jwt_required()
+@conditional_get(Comment, Project, User)
 def get_comments_list():
     '''
-    This route is used to get a list of all the comments currently stored in the comments table.
+    This route is used to get a list of all the comments currently stored in the comments table. The list is paginated;
+    the `limit` and `after` query parameters select the page, and `next_cursor` is returned for the next page.
 
-    The following database query is used to get all entries in the comments table.
-    Database statement: SELECT * FROM comments;
+    The following database query is used to get a page of entries in the comments table.
+    Database statement: SELECT * FROM comments WHERE id > after ORDER BY id LIMIT limit;
+
+    The whole table can instead be streamed, as newline delimited json with the "Accept: application/x-ndjson" header or
+    as a json array with the "?stream=true" query parameter (see utils/streaming.py).
+
+    The `filter`, `sort` and `fields` query parameters narrow, order and trim the list, e.g.
+    ?filter[id][gt]=10&sort=-id&fields=id (see utils/list_options.py).
 
     JWT is required for this route.
     '''
-    # Query the database to select all entries in the comments table.
-    query = db.select(Comment)
-    comment_list = db.session.scalars(query)
-    response = comments_schema.dump(comment_list)
+    # Read the filter, sort and fields query parameters.
+    options = read_list_options(Comment, comments_schema)
+
+    # Query the database to select a page of entries in the comments table.
+    query = db.select(Comment).where(*options.filters).options(*eager_load_options(options.schema, Comment))
 
-    # Provide the user with a list of all comments.
-    return jsonify(response)
+    # Stream every entry instead of a single page if the client asked for a streamed response.
+    if wants_stream():
+        return stream_response(query, Comment, options.schema, options.sort)
+
+    comment_list, next_cursor = paginate(query, Comment, options.sort)
+    response = options.schema.dump(comment_list)
+
+    # Provide the user with a page of comments.
+    return jsonify(results=response, next_cursor=next_cursor)
 
 
 # GET a comment by id
@@ -201,7 +219,7 @@ def get_comment_by_id(comment_id: int):
     JWT is required for this route.
     '''
     # Query database to select the comment with a matching id=comment_id.
-    query = db.select(Comment).filter_by(id=comment_id)
+    query = db.select(Comment).options(*eager_load_options(comment_schema, Comment)).filter_by(id=comment_id)
     comment = db.session.scalar(query)
     response = comment_schema.dump(comment)
 
@@ -209,8 +227,8 @@ def get_comment_by_id(comment_id: int):
     if not response:
         return jsonify({"error": f"A comment with id=`{comment_id}` does not exist in the database."}), 404
 
-    # Return the requested comment to the user.
-    return jsonify(response)
+    # Return the requested comment to the user, with its version as the ETag.
+    return version_etag(jsonify(response), comment)
 
 
 # DELETE a comment by id
@@ -226,12 +244,13 @@ def delete_comment_by_id(comment_id: int):
     The "/delete_comment/" portion was added to the URL to make it more deliberate and less prone to mistake. Deleting a
     comment has no flow-on effects to other tables.
 
-    The user modifying the comment must first be found in the database to check if they are an admin or to if their user id
-    matches the user_id of the modified comment.
-    Database statement: SELECT * FROM users WHERE username=get_jwt_identity().
+    The user modifying the comment must first be found in the database (or identity cache) to check if they are an admin or
+    to if their user id matches the user_id of the modified comment.
+    Database statement: SELECT id, is_admin FROM users WHERE username=get_jwt_identity().
 
-    The comment being modified must also be found in the database, to firstly retrieve the user_id then to modify.
+    The comment being deleted must also be found in the database, to firstly retrieve the user_id then to delete.
     Database statement: SELECT * FROM comments where id=comment_id;
+    Database statement: DELETE FROM comments WHERE id=comment_id;
 
     JWT and is_admin=True are required for this route.
     '''
@@ -244,12 +263,11 @@ def delete_comment_by_id(comment_id: int):
     if not response:
         return jsonify({"error": f"A comment with `id`={comment_id} does not exist in the database. No edits have been made."}), 404
 
-    # Query the database to find the user making the deletion.
-    query = db.select(User).filter_by(username=get_jwt_identity())
-    user = db.session.scalar(query)
+    # Find the identity of the user making the deletion.
+    identity = get_current_identity()
 
     # Ensure that the user is either an admin or the owner of the comment.
-    if not comment.user_id == user.id and not user.is_admin:
+    if identity is None or (not comment.user_id == identity.user_id and not identity.is_admin):
         return jsonify(error="You can only delete comments that you have made."), 401
     
     # Delete the entry and commit changes.
@@ -8,6 +8,8 @@ from main import db
 from models.countries import Country
 from schemas.country_schema import country_schema, countries_schema
 from controllers.auths_controller import check_admin
+from utils.conditional import conditional_get
+from utils.reference_cache import get_reference_list, get_reference_entry, invalidate_reference_list
 
 countries = Blueprint('country', __name__, url_prefix="/countries")
 
@@ -60,6 +62,7 @@ def create_country():
     new_country = Country(**country_json)
     db.session.add(new_country)
     db.session.commit()
+    invalidate_reference_list(Country)
 
     # Return new created entry and 201 status
     return jsonify(country_schema.dump(new_country)), 201
@@ -104,6 +107,7 @@ def update_country_by_id(country_id: int):
 
         # Commit changes
         db.session.commit()
+        invalidate_reference_list(Country)
         return jsonify(country_schema.dump(country))
 
     return jsonify({"error": f"A country with `id`={country_id} does not exist in the database. No updates have been made."}), 404
@@ -113,19 +117,19 @@ def update_country_by_id(country_id: int):
 # /countries/
 @countries.route("/", methods=["GET"])
 @jwt_required()
+@conditional_get(Country)
 def get_countries_list():
     '''
     This route is used to get a list of all country entries in the countries table.
 
-    The following database query is used to get all entries in the countries table.
-    Database statement: SELECT * FROM countries;
+    The list is served from the reference cache (see utils/reference_cache.py). Only when the cache is empty is the following
+    database query used to get all entries in the countries table.
+    Database statement: SELECT * FROM countries ORDER BY id;
 
     JWT is required for this route.
     '''
-    # Query the database to select all entries in the countries table.
-    query = db.select(Country)
-    country_list = db.session.scalars(query)
-    response = countries_schema.dump(country_list)
+    # Get all entries in the countries table, from the reference cache where possible.
+    response = get_reference_list(countries_schema, Country)
 
     return jsonify(response)
 
@@ -138,15 +142,13 @@ def get_country_by_id(country_id: int):
     '''
     This route is used to get a specific entry from the countries table by providing the country_id in the URL.
 
-    The following database query is used to find the entry with a matching id=country_id.
-    Database statement: SELECT * FROM countries WHERE id=country_id;
+    The entry with a matching id=country_id is found in the cached list of the whole table (see utils/reference_cache.py).
+    Database statement (only when the reference cache is empty): SELECT * FROM countries ORDER BY id;
 
     JWT is required for this route.
     '''
-    # Query the database to find the entry in the countries table with matching id=country_id.
-    query = db.select(Country).filter_by(id=country_id)
-    country = db.session.scalar(query)
-    response = country_schema.dump(country)
+    # Find the entry in the countries table with matching id=country_id, from the reference cache where possible.
+    response = get_reference_entry(countries_schema, Country, country_id)
 
     # In the case that no entry is found with matching country_id, provide feedback to the user.
     if not response:
@@ -187,6 +189,7 @@ def delete_country_by_id(country_id: int):
     # Delete the entry and commit changes
     db.session.delete(country)
     db.session.commit()
+    invalidate_reference_list(Country)
 
     # Provide confirmation that the deletion was successful.
     return jsonify(message=f"The country with id=`{country_id}` has been deleted successfully.")
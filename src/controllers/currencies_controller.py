@@ -3,11 +3,17 @@ from marshmallow.exceptions import ValidationError
 from werkzeug.exceptions import BadRequest
 from sqlalchemy.exc import IntegrityError, DataError
 from flask_jwt_extended import jwt_required
+import datetime
 
 from main import db
 from models.currencies import Currency
+from models.exchange_rates import ExchangeRate
 from schemas.currency_schema import currency_schema, currencies_schema
+from schemas.exchange_rate_schema import exchange_rate_schema, exchange_rates_schema
 from controllers.auths_controller import check_admin
+from utils.conditional import conditional_get
+from utils.loading import eager_load_options
+from utils.reference_cache import get_reference_list, get_reference_entry, invalidate_reference_list
 
 currencies = Blueprint('currency', __name__, url_prefix="/currencies")
 
@@ -62,6 +68,7 @@ def create_currency():
     # Insert the new entry into the currencies table and commit changes.
     db.session.add(new_currency)
     db.session.commit()
+    invalidate_reference_list(Currency)
 
     # Display the new entry for a successful insert
     return jsonify(currency_schema.dump(new_currency)), 201
@@ -94,7 +101,7 @@ def update_currency_by_id(currency_id: int):
     if not check_admin():
         return jsonify(message="Admin-level authorisation required for this function."), 401
 
-    # Query the database to find the entry in the currencies table with matching id=currency_id.
+    # Find the entry in the currencies table with matching id=currency_id.
     query = db.select(Currency).filter_by(id=currency_id)
     currency = db.session.scalar(query)
     response = currency_schema.dump(currency)
@@ -108,6 +115,7 @@ def update_currency_by_id(currency_id: int):
 
         # Commit changes
         db.session.commit()
+        invalidate_reference_list(Currency)
         return jsonify(currency_schema.dump(currency))
 
     # If the entry with the given currency_id does not exist, provide feedback to the user.
@@ -118,19 +126,19 @@ def update_currency_by_id(currency_id: int):
 # /currencies/
 @currencies.route("/", methods=["GET"])
 @jwt_required()
+@conditional_get(Currency)
 def get_currencies_list():
     '''
     This route is used to get a list of all currency entries in the currencies table.
 
-    The following database query is used to get all entries in the currencies table.
-    Database statement: SELECT * FROM currencies;
+    The list is served from the reference cache (see utils/reference_cache.py). Only when the cache is empty is the following
+    database query used to get all entries in the currencies table.
+    Database statement: SELECT * FROM currencies ORDER BY id;
 
     JWT is required for this route.
     '''
-    # Query the database to select all entries in the currencies table.
-    query = db.select(Currency)
-    currency_list = db.session.scalars(query)
-    response = currencies_schema.dump(currency_list)
+    # Get all entries in the currencies table, from the reference cache where possible.
+    response = get_reference_list(currencies_schema, Currency)
 
     # Return all currencies.
     return jsonify(response)
@@ -144,15 +152,13 @@ def get_currency_by_id(currency_id: int):
     '''
     This route is used to get a specific entry from the currencies table by providing the currency_id in the URL.
 
-    The following database query is used to find the entry with a matching id=currency_id.
-    Database statement: SELECT * FROM currencies WHERE id=currency_id;
+    The entry with a matching id=currency_id is found in the cached list of the whole table (see utils/reference_cache.py).
+    Database statement (only when the reference cache is empty): SELECT * FROM currencies ORDER BY id;
 
     JWT is required for this route.    
     '''
-    # Query the database to find the entry in the currencies table with matching id=currency_id.
-    query = db.select(Currency).filter_by(id=currency_id)
-    currency = db.session.scalar(query)
-    response = currency_schema.dump(currency)
+    # Find the entry in the currencies table with matching id=currency_id, from the reference cache where possible.
+    response = get_reference_entry(currencies_schema, Currency, currency_id)
 
     # In the case that no entry with the given currency_id exists, provide feedback to the user.
     if not response:
@@ -194,6 +200,70 @@ def delete_currency_by_id(currency_id: int):
     # Delete the specified currency and commit changes.
     db.session.delete(currency)
     db.session.commit()
+    invalidate_reference_list(Currency)
 
     # Provide feedback to the user of the successful deletion.
-    return jsonify(message=f"The currency with id=`{currency_id}` has been deleted successfully.")
\ No newline at end of file
+    return jsonify(message=f"The currency with id=`{currency_id}` has been deleted successfully.")
+
+
+# SET the exchange rate of a currency
+# /currencies/<id>/exchange_rate
+@currencies.route("/<int:currency_id>/exchange_rate", methods=["PUT"])
+@jwt_required()
+def set_exchange_rate(currency_id: int):
+    '''
+    This route is used by an admin to set the exchange rate of a currency: the value of one unit of the currency in US
+    dollars. The rates are used to compare supplier prices in a common currency (see GET /projects/supplier_prices). The
+    rate is created if the currency does not have one yet, and replaced otherwise.
+
+    The following statement will be used to find the currency and its current exchange rate.
+    Database statement: SELECT * FROM currencies LEFT JOIN exchange_rates ON ... WHERE currencies.id=currency_id;
+
+    Example json body for PUT request:
+    {
+        "rate": "float, greater than 0, e.g. 0.65 for AUD"
+    }
+
+    JWT and is_admin=True are required for this route.
+    '''
+    # First call the check_admin function to check authorisation level.
+    if not check_admin():
+        return jsonify(message="Admin-level authorisation required for this function."), 401
+
+    # Find the entry in the currencies table with matching id=currency_id.
+    currency = db.session.get(Currency, currency_id)
+    if currency is None:
+        return jsonify({"error": f"A currency with `id`={currency_id} does not exist in the database. No updates have been made."}), 404
+
+    rate_json = exchange_rate_schema.load(request.json)
+
+    # Create or replace the exchange rate, and commit changes.
+    if currency.exchange_rate is None:
+        currency.exchange_rate = ExchangeRate()
+    currency.exchange_rate.rate = rate_json["rate"]
+    currency.exchange_rate.last_modified = datetime.datetime.now()
+    db.session.commit()
+
+    return jsonify(exchange_rate_schema.dump(currency.exchange_rate))
+
+
+# GET all exchange rates
+# /currencies/exchange_rates
+@currencies.route("/exchange_rates", methods=["GET"])
+@jwt_required()
+@conditional_get(ExchangeRate, Currency)
+def get_exchange_rates():
+    '''
+    This route is used to get the exchange rate of every currency that has one, in US dollars per unit of the currency.
+
+    The following database query returns every exchange rate with its currency.
+    Database statement: SELECT * FROM exchange_rates JOIN currencies ON ... ORDER BY currency_id;
+
+    JWT is required for this route.
+    '''
+    # Query the database for every exchange rate, with its currency loaded in the same query.
+    query = db.select(ExchangeRate).options(*eager_load_options(exchange_rates_schema, ExchangeRate)).order_by(ExchangeRate.currency_id)
+    rates = db.session.scalars(query).all()
+
+    # Return all exchange rates.
+    return jsonify(exchange_rates_schema.dump(rates))
@@ -7,8 +7,20 @@ import datetime
 
 from main import db
 from models.drawings import Drawing
+from models.projects import Project
+from models.drawing_revisions import DrawingRevision
 from schemas.drawing_schema import drawing_schema, drawings_schema
+from schemas.drawing_revision_schema import drawing_revisions_schema
 from controllers.auths_controller import check_admin
+from utils.streaming import wants_stream, stream_response
+from utils.list_options import read_list_options
+from utils.pagination import paginate
+from utils.loading import eager_load_options
+from utils.conditional import conditional_get
+from utils.queries import record_exists
+from utils.revisions import get_drawing_history
+from utils.updates import read_partial_update, read_expected_version, update_entry, current_version, version_etag, changed_fields
+from utils.bulk import read_bulk_items, load_bulk_items, check_foreign_keys, bulk_insert, bulk_response
 
 drawings = Blueprint('drawing', __name__, url_prefix="/drawings")
 
@@ -45,17 +57,18 @@ def create_drawing():
 
     The following statement will be used to create the entry in the drawings data table.
     Database statement: INSERT INTO drawings (drawing_number, part_description, version, last_modified, project_id) 
-    VALUES (request.json["drawing_number"], request.json["part_description"], request.json["version"], 
-    datetime.datetime.now(), request.json["project_id"]);
+    VALUES (request.json["drawing_number"], request.json["part_description"], 1, datetime.datetime.now(),
+    request.json["project_id"]);
 
     Example json body for POST request:
     {
         "drawing_number": "string, length from 3 to 10 chars",
         "part_description": "OPTIONAL, string",
-        "version": "OPTIONAL, integer",
         "project_id": "integer"
     }
 
+    New drawings start at version 1, which every update increases.
+
     JWT and is_admin=True are required for this route.
     '''
     # First call the check_admin function to check authorisation level.
@@ -75,6 +88,53 @@ def create_drawing():
     return jsonify(drawing_schema.dump(new_drawing)), 201
 
 
+# CREATE drawings in bulk
+# /drawings/bulk
+@drawings.route("/bulk", methods=["POST"])
+@jwt_required()
+def create_drawings_bulk():
+    '''
+    This route will be used by an admin to create many entries in the drawings table with one request. The request body is
+    either a json array of drawings, or newline delimited json with one drawing per line (Content-Type: application/x-ndjson).
+    Each drawing takes the same fields as the create drawing route.
+
+    All drawings are validated together, and the project_id of each drawing is checked against the projects table with a
+    single query. The valid drawings are then inserted with a single statement. Invalid drawings are not inserted, and do
+    not stop the valid drawings from being inserted. The response has one result per drawing, in the same order as the
+    request, with either the id of the new drawing or the errors.
+    Database statement: SELECT id FROM projects WHERE id IN (project_ids);
+    Database statement: INSERT INTO drawings (drawing_number, part_description, version, last_modified, project_id)
+    VALUES (...), (...), ... RETURNING id;
+
+    Example json body for POST request:
+    [
+        {"drawing_number": "string, length from 3 to 10 chars", "project_id": "integer"},
+        {"drawing_number": "string, length from 3 to 10 chars", "part_description": "OPTIONAL, string", "project_id": "integer"}
+    ]
+
+    JWT and is_admin=True are required for this route.
+    '''
+    # First call the check_admin function to check authorisation level.
+    if not check_admin():
+        return jsonify(message="Admin-level authorisation required for this function."), 401
+
+    # Validate every drawing in the request body, and check that the projects exist.
+    items = read_bulk_items()
+    rows, errors = load_bulk_items(drawings_schema, items)
+    check_foreign_keys(Drawing, rows, errors)
+
+    # Add the last_modified date, then insert the valid drawings and commit changes.
+    now = datetime.datetime.now()
+    for drawing_json in rows.values():
+        drawing_json["last_modified"] = now
+    ids = bulk_insert(Drawing, list(rows.values()))
+    db.session.commit()
+
+    # Return the result for each drawing in the request.
+    results = {index: {"index": index, "status": "created", "id": new_id} for index, new_id in zip(rows, ids)}
+    return bulk_response(results, errors, len(items))
+
+
 # UPDATE a drawing by id
 # /drawings/<id>
 @drawings.route("/<int:drawing_id>", methods=["PATCH"])
@@ -88,14 +148,21 @@ def update_drawing_by_id(drawing_id: int):
     For ease of use, the user only has to pass the fields that they want to update. The PATCH request feels more appropriate
     in this instance given that not all fields are required to be passed.
 
-    The following database query will filter the drawings.id column to match the drawings_id passed in the URL.
-    Database statement: SELECT * FROM drawings WHERE id=drawing_id;
+    Only the fields passed are validated, and they are applied to the drawing with a single statement, which also returns
+    the updated drawing (see utils/updates.py).
+    Database statement: UPDATE drawings SET (fields passed), last_modified=now(), version=version+1 WHERE id=drawing_id
+    AND version=expected version RETURNING *;
+
+    The version of the drawing is increased by every update. To make sure that changes made by another user in the meantime
+    are not overwritten, the version the changes were based on can be given in the If-Match header (the ETag returned by
+    GET /drawings/<id>, e.g. If-Match: "3") or the `version` field. If the drawing has been updated since, nothing is
+    changed and 409 Conflict is returned with the current version.
 
     Example json body for PATCH request:
     {
         "drawing_number": "OPTIONAL, string, length from 3 to 10 chars",
         "part_description": "OPTIONAL, string",
-        "version": "OPTIONAL, integer",
+        "version": "OPTIONAL, integer, the version the changes are based on",
         "project_id": "OPTIONAL, integer"
     }
 
@@ -105,78 +172,68 @@ def update_drawing_by_id(drawing_id: int):
     if not check_admin():
         return jsonify(message="Admin-level authorisation required for this function."), 401
     
-    # Query the database to find the matching drawing with id=drawing_id.
-    query = db.select(Drawing).filter_by(id=drawing_id)
-    drawing = db.session.scalar(query)
-    response = drawing_schema.dump(drawing)
+    # Validate the fields given in the json request body, and only those fields, and read the expected version.
+    changes = read_partial_update(drawing_schema, ("drawing_number", "part_description", "project_id"))
+    expected = read_expected_version()
 
-    # Return an error if the specified drawing does not exist in the drawings table.
-    if not response:
-        return jsonify({"error": f"A drawing with id=`{drawing_id}` does not exist in the database."}), 404
+    # Check if any information was changed. Give response if nothing was changed.
+    if not changes:
+        if not record_exists(Drawing, drawing_id):
+            return jsonify({"error": f"A drawing with id=`{drawing_id}` does not exist in the database."}), 404
+        return jsonify(message="No drawing information has been changed.")
 
-    # Validate input coming from json request using schema.
-    # Load-only fields need dummy data if not passed in the request json
-    if request.json.get("drawing_number"):
-        response["drawing_number"] = request.json["drawing_number"]
-    if request.json.get("part_description"):
-        response["part_description"] = request.json["part_description"]
-    if request.json.get("version"):
-        response["version"] = request.json["version"]
-    else: response["version"] = 1
-    if request.json.get("project_id"):
-        response["project_id"] = request.json["project_id"]
-    else:
-        response["project_id"] = 1
-    response = drawing_schema.load(response)
-
-    # Map the json request body to the entry selected by the database query.
-    # Build string of changes to provide feedback to user.
-    changed_string = ""
-    if request.json.get("drawing_number"):
-        drawing.drawing_number = request.json["drawing_number"]
-        changed_string = " drawing_number"
-    if request.json.get("part_description"):
-        drawing.part_description = request.json["part_description"]
-        changed_string += " part_description"
-    if request.json.get("version"):
-        drawing.version = request.json["version"]
-        changed_string += " version"
-    if request.json.get("project_id"):
-        drawing.project_id = request.json["project_id"]
-        changed_string += " project_id"
+    # Apply the changes, and update the last_modified date, with a single statement which returns the updated drawing.
+    drawing = update_entry(Drawing, {"id": drawing_id}, {**changes, "last_modified": datetime.datetime.now()}, version=expected)
 
-    # Check if any information was changed. Give response if nothing was changed.
-    if changed_string == "":
-        return jsonify(message="No drawing information has been changed.") 
-    
-    # Update the last_modified date after it is confirmed that changes have been made.
-    drawing.last_modified = datetime.datetime.now()
+    # Return an error if the specified drawing does not exist in the drawings table, or has been changed since the expected version.
+    if drawing is None:
+        version = current_version(Drawing, {"id": drawing_id})
+        if version is None:
+            return jsonify({"error": f"A drawing with id=`{drawing_id}` does not exist in the database."}), 404
+        return jsonify({"error": f"The drawing with id=`{drawing_id}` has been changed since version {expected}. No edits have been made.", "version": version}), 409
 
     # Commit changes and return changed information.
+    response = drawing_schema.dump(drawing)
     db.session.commit()
-    return jsonify(message=f"The following drawing information has been changed:{changed_string}.", **drawing_schema.dump(drawing))
+    return version_etag(jsonify(message=f"The following drawing information has been changed:{changed_fields(changes)}.", **response), drawing)
 
 
 # GET all drawings
 # /drawings/
 @drawings.route("/", methods=["GET"])
 @jwt_required()
+@conditional_get(Drawing, Project)
 def get_drawings_list():
     '''
-    This route will be used to get a list of all drawings currently recorded in the drawings table.
+    This route will be used to get a list of all drawings currently recorded in the drawings table. The list is paginated;
+    the `limit` and `after` query parameters select the page, and `next_cursor` is returned for the next page.
+
+    The following database query is used to get a page of entries in the drawings table.
+    Database statement: SELECT * FROM drawings WHERE id > after ORDER BY id LIMIT limit;
 
-    The following database query is used to get all entries in the drawings table.
-    Database statement: SELECT * FROM drawings;
+    The whole table can instead be streamed, as newline delimited json with the "Accept: application/x-ndjson" header or
+    as a json array with the "?stream=true" query parameter (see utils/streaming.py).
+
+    The `filter`, `sort` and `fields` query parameters narrow, order and trim the list, e.g.
+    ?filter[id][gt]=10&sort=-id&fields=id (see utils/list_options.py).
 
     JWT is required for this route.
     '''
-    # Query the database to select all entries in the drawings table. Dump into the plural schema.
-    query = db.select(Drawing)
-    drawing_list = db.session.scalars(query)
-    response = drawings_schema.dump(drawing_list)
+    # Read the filter, sort and fields query parameters.
+    options = read_list_options(Drawing, drawings_schema)
+
+    # Query the database to select a page of entries in the drawings table. Dump into the plural schema.
+    query = db.select(Drawing).where(*options.filters).options(*eager_load_options(options.schema, Drawing))
+
+    # Stream every entry instead of a single page if the client asked for a streamed response.
+    if wants_stream():
+        return stream_response(query, Drawing, options.schema, options.sort)
 
-    # Return list of all drawings and their details.
-    return jsonify(response)
+    drawing_list, next_cursor = paginate(query, Drawing, options.sort)
+    response = options.schema.dump(drawing_list)
+
+    # Return the page of drawings and their details.
+    return jsonify(results=response, next_cursor=next_cursor)
 
 
 # GET a drawing by id
@@ -195,7 +252,7 @@ def get_drawing_by_id(drawing_id: int):
     JWT is required for this route.
     '''
     # Query the database the find the entry in the drawings table with id=drawing_id.
-    query = db.select(Drawing).filter_by(id=drawing_id)
+    query = db.select(Drawing).options(*eager_load_options(drawing_schema, Drawing)).filter_by(id=drawing_id)
     drawing = db.session.scalar(query)
     response = drawing_schema.dump(drawing)
 
@@ -203,8 +260,37 @@ def get_drawing_by_id(drawing_id: int):
     if not response:
         return jsonify({"error": f"A drawing with id=`{drawing_id}` does not exist in the database."}), 404
 
-    # When successfully retrieving an entry, display drawing details to user.
-    return jsonify(response)
+    # When successfully retrieving an entry, display drawing details to user, with its version as the ETag.
+    return version_etag(jsonify(response), drawing)
+
+
+# GET the revision history of a drawing
+# /drawings/<id>/history
+@drawings.route("/<int:drawing_id>/history", methods=["GET"])
+@jwt_required()
+@conditional_get(DrawingRevision)
+def get_drawing_history_by_id(drawing_id: int):
+    '''
+    This route is used to audit the changes made to a drawing. Every version of the drawing is returned, oldest first, with
+    the drawing number, project, part description and modified time it had at that version. A revision is recorded every
+    time the drawing is created or updated (see utils/revisions.py).
+
+    The history is paginated by version; the `limit` and `after` query parameters select the page, and `next_cursor` is
+    returned for the next page. The part descriptions are stored as deltas between snapshots, and rebuilt here.
+    Database statement: SELECT * FROM drawing_revisions WHERE drawing_id=drawing_id AND version >= (first snapshot needed)
+    ORDER BY version LIMIT limit + SNAPSHOT_INTERVAL;
+
+    JWT is required for this route.
+    '''
+    # Read a page of revisions, with their part descriptions rebuilt.
+    revisions, next_cursor = get_drawing_history(drawing_id)
+
+    # If the page is empty, check that the drawing exists, and provide feedback to the user if it does not.
+    if not revisions and not record_exists(Drawing, drawing_id):
+        return jsonify({"error": f"A drawing with id=`{drawing_id}` does not exist in the database."}), 404
+
+    # Return the page of revisions.
+    return jsonify(results=drawing_revisions_schema.dump(revisions), next_cursor=next_cursor)
 
 
 # DELETE a drawing by id
@@ -67,5 +67,15 @@ def get_homepage():
         "50_Update_Currency_by_ID (admin)": "PUT /currencies/<id>",
         "51_Get_All_Currencies": "GET /currencies",
         "52_Get_Currency_by_ID": "GET /currencies/<id>",
-        "53_Delete_Currency_by_ID (admin)": "DELETE /currencies/delete_currency/<id>"
+        "53_Delete_Currency_by_ID (admin)": "DELETE /currencies/delete_currency/<id>",
+        "54_Create_Projects_in_Bulk (admin)": "POST /projects/bulk",
+        "55_Create_Drawings_in_Bulk (admin)": "POST /drawings/bulk",
+        "56_Create_or_Update_Manufactures_in_Bulk (admin)": "POST /manufactures/bulk",
+        "57_Search_Projects_Drawings_and_Comments": "GET /search?q=<text>",
+        "58_Database_Connection_Pool_Status (admin)": "GET /status/database",
+        "59_Prometheus_Metrics (admin)": "GET /metrics",
+        "60_Set_Currency_Exchange_Rate (admin)": "PUT /currencies/<id>/exchange_rate",
+        "61_Get_All_Exchange_Rates": "GET /currencies/exchange_rates",
+        "62_Get_Supplier_Price_Summaries": "GET /projects/supplier_prices?currency=AUD",
+        "63_Get_Drawing_History_by_ID": "GET /drawings/<id>/history"
     })
\ No newline at end of file
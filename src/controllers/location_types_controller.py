@@ -8,6 +8,8 @@ from main import db
 from models.location_types import LocationType
 from schemas.location_type_schema import location_type_schema, location_types_schema
 from controllers.auths_controller import check_admin
+from utils.conditional import conditional_get
+from utils.reference_cache import get_reference_list, get_reference_entry, invalidate_reference_list
 
 location_types = Blueprint('location_type', __name__, url_prefix="/location-types")
 
@@ -62,6 +64,7 @@ def create_location_type():
     # Add entry and commit changes.
     db.session.add(new_location_type)
     db.session.commit()
+    invalidate_reference_list(LocationType)
 
     # Return the new entry for confirmation.
     return jsonify(location_type_schema.dump(new_location_type)), 201
@@ -106,6 +109,7 @@ def update_location_type_by_id(location_type_id: int):
 
         # Commit changes
         db.session.commit()
+        invalidate_reference_list(LocationType)
         return jsonify(location_type_schema.dump(location_type))
 
     return jsonify({"error": f"A location_type with `id`={location_type_id} does not exist in the database. No updates have been made."}), 404
@@ -115,19 +119,19 @@ def update_location_type_by_id(location_type_id: int):
 # /location-types/
 @location_types.route("/", methods=["GET"])
 @jwt_required()
+@conditional_get(LocationType)
 def get_location_types_list():
     '''
     This route is used to get a list of all location type entries in the location_types table.
 
-    The following database query is used to get all entries in the location_types table.
-    Database statement: SELECT * FROM location_types;
+    The list is served from the reference cache (see utils/reference_cache.py). Only when the cache is empty is the following
+    database query used to get all entries in the location_types table.
+    Database statement: SELECT * FROM location_types ORDER BY id;
 
     JWT is required for this route.
     '''
-    # Query the database to select all entries in the location_types table.
-    query = db.select(LocationType)
-    location_type_list = db.session.scalars(query)
-    response = location_types_schema.dump(location_type_list)
+    # Get all entries in the location_types table, from the reference cache where possible.
+    response = get_reference_list(location_types_schema, LocationType)
 
     return jsonify(response)
 
@@ -140,15 +144,13 @@ def get_location_type_by_id(location_type_id: int):
     '''
     This route is used to get a specific entry from the location_types table by providing the location_type_id in the URL.
 
-    The following database query is used to find the entry with a matching id=location_type_id.
-    Database statement: SELECT * FROM countries WHERE id=country_id;
+    The entry with a matching id=location_type_id is found in the cached list of the whole table (see utils/reference_cache.py).
+    Database statement (only when the reference cache is empty): SELECT * FROM location_types ORDER BY id;
 
     JWT is required for this route.
     '''
-    # Query the database to find a matching entry in the location_types table where id=location_type_id.
-    query = db.select(LocationType).filter_by(id=location_type_id)
-    location_type = db.session.scalar(query)
-    response = location_type_schema.dump(location_type)
+    # Find a matching entry in the location_types table where id=location_type_id, from the reference cache where possible.
+    response = get_reference_entry(location_types_schema, LocationType, location_type_id)
 
     if not response:
         return jsonify({"error": f"A location_type with id=`{location_type_id}` does not exist in the database."}), 404
@@ -177,7 +179,7 @@ def delete_location_type_by_id(location_type_id: int):
     if not check_admin():
         return jsonify(message="Admin-level authorisation required for this function."), 401
     
-    # Query the database to find a matching entry in the location_types table where id=location_type_id.
+    # Find a matching entry in the location_types table where id=location_type_id.
     location_type = LocationType.query.filter_by(id=location_type_id).first()
     response = location_type_schema.dump(location_type)
 
@@ -187,6 +189,7 @@ def delete_location_type_by_id(location_type_id: int):
     # Delete the entry and commit the changes.
     db.session.delete(location_type)
     db.session.commit()
+    invalidate_reference_list(LocationType)
 
     return jsonify({
         "message": f"The location_type with id=`{location_type_id}` has been deleted successfully."
@@ -6,10 +6,19 @@ from flask_jwt_extended import jwt_required
 
 from main import db
 from models.locations import Location
-from models.manufactures import Manufacture
+from models.catalogue_entries import CatalogueEntry
+from models.countries import Country
+from models.location_types import LocationType
 from schemas.location_schema import location_schema, locations_schema
 from schemas.manufacture_schema import manufactures_schema
 from controllers.auths_controller import check_admin
+from utils.streaming import wants_stream, stream_response
+from utils.list_options import read_list_options
+from utils.pagination import paginate, paginate_children
+from utils.loading import eager_load_options
+from utils.conditional import conditional_get
+from utils.queries import record_exists
+from utils.updates import read_partial_update, update_entry, changed_fields
 
 locations = Blueprint('location', __name__, url_prefix="/locations")
 
@@ -85,8 +94,9 @@ def update_location_by_id(location_id: int):
     For ease of use, the user only has to pass the fields that they want to update. The PATCH request feels more appropriate
     in this instance given that not all fields are required to be passed.
 
-    The following database query will filter the locations.id column to match the location id passed in the URL.
-    Database statement: SELECT * FROM users WHERE id=location_id;
+    Only the fields passed are validated, and they are applied to the location with a single statement, which also
+    returns the updated location (see utils/updates.py).
+    Database statement: UPDATE locations SET (fields passed) WHERE id=location_id RETURNING *;
 
     Example json body for PATCH request:
     {
@@ -102,75 +112,63 @@ def update_location_by_id(location_id: int):
     if not check_admin():
         return jsonify(message="Admin-level authorisation required for this function."), 401
 
-    # Query the database to find the entry with matching id=location_id.
-    query = db.select(Location).filter_by(id=location_id)
-    location = db.session.scalar(query)
-    response = location_schema.dump(location)
-
-    # Return error response to user if no location exists with id=location_id.
-    if not response:
-        return jsonify({"error": f"A location with id=`{location_id}` does not exist in the database."}), 404
-
-    # Validate input coming from json request using schema.
-    # Load-only fields need dummy data if not passed by the user.
-    if request.json.get("name"):
-        response["name"] = request.json["name"]
-    if request.json.get("admin_phone_number"):
-        response["admin_phone_number"] = request.json["admin_phone_number"]
-    if request.json.get("country_id"):
-        response["country_id"] = request.json["country_id"]
-    else:
-        response["country_id"] = 1
-    if request.json.get("location_type_id"):
-        response["location_type_id"] = request.json["location_type_id"]
-    else:
-        response["location_type_id"] = 1
-    response = location_schema.load(response)
-
-    # Map the json request properties to the user if they are given.
-    # Build string of changes to provide feedback to user.
-    changed_string = ""
-    if request.json.get("name"):
-        location.name = request.json["name"]
-        changed_string = " name"
-    if request.json.get("admin_phone_number"):
-        location.admin_phone_number = request.json["admin_phone_number"]
-        changed_string += " admin_phone_number"
-    if request.json.get("country_id"):
-        location.country_id = request.json["country_id"]
-        changed_string += " country_id"
-    if request.json.get("location_type_id"):
-        location.location_type_id = request.json["location_type_id"]
-        changed_string += " location_type_id"
+    # Validate the fields given in the json request body, and only those fields.
+    changes = read_partial_update(location_schema, ("name", "admin_phone_number", "country_id", "location_type_id"))
 
     # Check if any information was changed. Give response if nothing was changed.
-    if changed_string == "":
+    if not changes:
+        if not record_exists(Location, location_id):
+            return jsonify({"error": f"A location with id=`{location_id}` does not exist in the database."}), 404
         return jsonify(message="No location information has been changed.")
 
+    # Apply the changes with a single statement, which returns the updated location.
+    location = update_entry(Location, {"id": location_id}, changes)
+
+    # Return error response to user if no location exists with id=location_id.
+    if location is None:
+        return jsonify({"error": f"A location with id=`{location_id}` does not exist in the database."}), 404
+
     # Commit changes and return changed information.
+    response = location_schema.dump(location)
     db.session.commit()
-    return jsonify(message=f"The following location information has been changed:{changed_string}.", **location_schema.dump(location))
+    return jsonify(message=f"The following location information has been changed:{changed_fields(changes)}.", **response)
 
 
 # GET all locations
 # /locations/
 @locations.route("/", methods=["GET"])
 @jwt_required()
+@conditional_get(Location, Country, LocationType)
 def get_locations_list():
     '''
-    This route is used to get a list of all location entries in the locations table.
+    This route is used to get a list of all location entries in the locations table. The list is paginated; the `limit`
+    and `after` query parameters select the page, and `next_cursor` is returned for the next page.
+
+    The following database query is used to get a page of entries in the locations table.
+    Database statement: SELECT * FROM locations WHERE id > after ORDER BY id LIMIT limit;
 
-    The following database query is used to get all entries in the locations table.
-    Database statement: SELECT * FROM locations;
+    The whole table can instead be streamed, as newline delimited json with the "Accept: application/x-ndjson" header or
+    as a json array with the "?stream=true" query parameter (see utils/streaming.py).
+
+    The `filter`, `sort` and `fields` query parameters narrow, order and trim the list, e.g.
+    ?filter[id][gt]=10&sort=-id&fields=id (see utils/list_options.py).
 
     JWT is required for this route.
     '''
-    # Query the database to select all entries in the locations table.
-    query = db.select(Location)
-    location_list = db.session.scalars(query)
-    response = locations_schema.dump(location_list)
+    # Read the filter, sort and fields query parameters.
+    options = read_list_options(Location, locations_schema)
 
-    return jsonify(response)
+    # Query the database to select a page of entries in the locations table.
+    query = db.select(Location).where(*options.filters).options(*eager_load_options(options.schema, Location))
+
+    # Stream every entry instead of a single page if the client asked for a streamed response.
+    if wants_stream():
+        return stream_response(query, Location, options.schema, options.sort)
+
+    location_list, next_cursor = paginate(query, Location, options.sort)
+    response = options.schema.dump(location_list)
+
+    return jsonify(results=response, next_cursor=next_cursor)
 
 
 # GET a location by id
@@ -188,7 +186,7 @@ def get_location_by_id(location_id: int):
     JWT is required for this route.
     '''
     # Query the database to find the entry in the locations table with id=location_id.
-    query = db.select(Location).filter_by(id=location_id)
+    query = db.select(Location).options(*eager_load_options(location_schema, Location)).filter_by(id=location_id)
     location = db.session.scalar(query)
     response = location_schema.dump(location)
 
@@ -244,40 +242,46 @@ def delete_location_by_id(location_id: int):
 # /locations/<id>/catalogue
 @locations.route("/<int:location_id>/catalogue", methods=["GET"])
 @jwt_required()
+@conditional_get(CatalogueEntry, Location)
 def get_location_catalogue(location_id: int):
     '''
     This route will be used to find all project manufacturing offerings a location provides; in other words, a catalogue for
     a specified location. The user gives the id of the desired location in the URL, which will be used to query the 
-    manufactures table by location_id. Firstly, the locations table must be queried to ensure that a location with the given
-    id exists in the locations table.
+    catalogue_entries table by location_id.
 
-    The following database query will return the unique entry in the locations table with matching id to the location_id
-    passed in the URL.
-    Database statement: SELECT * FROM locations WHERE id=location_id;
+    The catalogue_entries table holds each manufacturing offering together with its project title, location, country and
+    currency, kept up to date whenever those tables change (see utils/catalogue.py). A catalogue page is therefore read
+    with a single scan of its primary key, without joining the other tables.
 
-    The following database query will return all entries in the manufactures table with location_id matching the location_id
-    passed in the URL.
-    Database statement: SELECT * FROM locations WHERE location_id=location_id;
+    The following database query will return a page of entries in the catalogue_entries table with location_id matching
+    the location_id passed in the URL.
+    Database statement: SELECT * FROM catalogue_entries WHERE location_id=location_id ORDER BY location_id, project_id LIMIT limit;
+
+    Only if no entries are found, the following database query checks that the location exists, to tell a missing location
+    apart from a location with no manufacturing offerings.
+    Database statement: SELECT EXISTS (SELECT 1 FROM locations WHERE id=location_id);
+
+    The `filter`, `sort` and `fields` query parameters narrow, order and trim the list, e.g.
+    ?filter[currency_id]=1&filter[price_estimate][lt]=5000&sort=price_estimate (see utils/list_options.py).
 
     JWT is required for this route.
     '''
-    # First ensure that a location with the provided location_id exists in the locations table.
-    query = db.select(Location).filter_by(id=location_id)
-    location = db.session.scalar(query)
-    response = location_schema.dump(location)
+    # Read the filter, sort and fields query parameters.
+    options = read_list_options(CatalogueEntry, manufactures_schema)
+
+    # Query the database to find a page of catalogue entries with the matching location_id.
+    query = db.select(CatalogueEntry).filter_by(location_id=location_id).where(*options.filters)
+    manufactures_list, next_cursor, location_exists = paginate_children(query, CatalogueEntry, Location, location_id, options.sort)
 
     # In the case that such a location does not exist, provide feedback to the user of the error.
-    if not response:
+    if not location_exists:
         return jsonify(error=f"A location with id=`{location_id}` does not exist in the database."), 404
 
-    # Query the database to find all manufacturing offerings with the matching location_id.
-    query = db.select(Manufacture).filter_by(location_id=location_id)
-    manufactures_list = db.session.scalars(query)
-    response = manufactures_schema.dump(manufactures_list)
+    response = options.schema.dump(manufactures_list)
 
     # In the case that this location does not have any manufacturing offerings listed, provide feedback.
     if not response:
         return jsonify(message=f"This location does not offer to manufacture any projects."), 200
 
-    # Return the location's catalogue.
-    return jsonify(response)
\ No newline at end of file
+    # Return the page of the location's catalogue.
+    return jsonify(results=response, next_cursor=next_cursor)
\ No newline at end of file
@@ -6,8 +6,20 @@ from flask_jwt_extended import jwt_required
 
 from main import db
 from models.manufactures import Manufacture
+from models.projects import Project
+from models.locations import Location
+from models.countries import Country
+from models.currencies import Currency
 from schemas.manufacture_schema import manufacture_schema, manufactures_schema
 from controllers.auths_controller import check_admin
+from utils.streaming import wants_stream, stream_response
+from utils.list_options import read_list_options
+from utils.pagination import paginate
+from utils.loading import eager_load_options
+from utils.conditional import conditional_get
+from utils.queries import record_exists
+from utils.updates import read_partial_update, update_entry, changed_fields
+from utils.bulk import read_bulk_items, load_bulk_items, check_foreign_keys, drop_duplicate_keys, bulk_upsert, bulk_response
 
 manufactures = Blueprint('manufacture', __name__, url_prefix="/manufactures")
 
@@ -74,6 +86,58 @@ def create_manufacture():
     return jsonify(manufacture_schema.dump(new_manufacture)), 201
 
 
+# CREATE or UPDATE manufactures in bulk
+# /manufactures/bulk
+@manufactures.route("/bulk", methods=["POST"])
+@jwt_required()
+def upsert_manufactures_bulk():
+    '''
+    This route will be used by an admin to load many manufacturing offerings with one request, e.g. the whole catalogue of
+    a new workshop. The request body is either a json array of offerings, or newline delimited json with one offering per
+    line (Content-Type: application/x-ndjson). Each offering takes the same fields as the create manufacture route.
+
+    If an offering for the same location_id and project_id already exists, its price_estimate and currency_id are updated
+    instead, so the same file can be loaded again after prices change. If the same location_id and project_id are given
+    more than once in a request, the last one is used.
+
+    All offerings are validated together, and the location_id, project_id and currency_id of each offering are checked with
+    one query per column. The valid offerings are then written with a single statement. Invalid offerings are not written,
+    and do not stop the valid offerings from being written. The response has one result per offering, in the same order as
+    the request.
+    Database statement: INSERT INTO manufactures (location_id, project_id, price_estimate, currency_id)
+    VALUES (...), (...), ... ON CONFLICT (location_id, project_id)
+    DO UPDATE SET price_estimate=excluded.price_estimate, currency_id=excluded.currency_id;
+
+    Example json body for POST request:
+    [
+        {"location_id": "integer", "project_id": "integer", "price_estimate": "float", "currency_id": "integer"},
+        {"location_id": "integer", "project_id": "integer", "price_estimate": "float", "currency_id": "integer"}
+    ]
+
+    JWT and is_admin=True are required for this route.
+    '''
+    # First call the check_admin function to check authorisation level.
+    if not check_admin():
+        return jsonify(message="Admin-level authorisation required for this function."), 401
+
+    # Validate every offering in the request body, and check that the referenced entries exist.
+    items = read_bulk_items()
+    rows, errors = load_bulk_items(manufactures_schema, items)
+    check_foreign_keys(Manufacture, rows, errors)
+    drop_duplicate_keys(Manufacture, rows, errors)
+
+    # Insert or update the valid offerings and commit changes.
+    bulk_upsert(Manufacture, list(rows.values()), ["price_estimate", "currency_id"])
+    db.session.commit()
+
+    # Return the result for each offering in the request.
+    results = {
+        index: {"index": index, "status": "upserted", "location_id": data["location_id"], "project_id": data["project_id"]}
+        for index, data in rows.items()
+        }
+    return bulk_response(results, errors, len(items))
+
+
 # UPDATE a manufacture by ids
 # /manufactures/loc/<id1>/proj/<id2>
 @manufactures.route("/loc/<int:location_id>/proj/<int:project_id>", methods=["PATCH"])
@@ -92,7 +156,10 @@ def update_manufacture_by_ids(location_id: int, project_id: int):
     in this instance given that not all fields are required to be passed.
 
     The following database query will filter the manufactures table to find the location and project ids requested.
-    Database statement: SELECT * FROM manufactures WHERE location_id=location_id AND project_id=project_id;
+    Only the fields passed are validated, and they are applied to the offering with a single statement, which also returns
+    the updated offering (see utils/updates.py).
+    Database statement: UPDATE manufactures SET (fields passed) WHERE location_id=location_id AND project_id=project_id
+    RETURNING *;
 
     Example json body for PATCH request:
     {
@@ -108,83 +175,68 @@ def update_manufacture_by_ids(location_id: int, project_id: int):
     if not check_admin():
         return jsonify(message="Admin-level authorisation required for this function."), 401
 
-    # Query the manufactures table with conditions on two columns: location_id and project_id. These foreign keys combine
-    # to create the composite key for the table, so the result should always be unique.
-    query = db.select(Manufacture).filter_by(
-        location_id=location_id,
-        project_id=project_id
-        )
-    manufacture = db.session.scalar(query)
-    response = manufacture_schema.dump(manufacture)
+    # Validate the fields given in the json request body, and only those fields.
+    changes = read_partial_update(manufacture_schema, ("location_id", "project_id", "price_estimate", "currency_id"))
+
+    # Check if any information was changed. Give response if nothing was changed.
+    if not changes:
+        if not record_exists(Manufacture, location_id, project_id):
+            return jsonify(error=f"A manufacturing offering with location_id=`{location_id}` and project_id=`{project_id}` does not exist in the database."), 404
+        return jsonify(message="No manufacture offering information has been changed.")
+
+    # Apply the changes with a single statement, which returns the updated offering. The location_id and project_id
+    # columns combine to create the composite key for the table, so the statement changes at most one entry.
+    manufacture = update_entry(Manufacture, {"location_id": location_id, "project_id": project_id}, changes)
 
     # If no such entry exists in the manufactures table, provide feedback of the error to the user.
-    if not response:
+    if manufacture is None:
         return jsonify(error=f"A manufacturing offering with location_id=`{location_id}` and project_id=`{project_id}` does not exist in the database."), 404
-    
-    # Validate input coming from json request using schema.
-    # Load-only fields must be given placeholder data if not passed by the user.
-    if request.json.get("location_id"):
-        response["location_id"] = request.json["location_id"]
-    else:
-        response["location_id"] = 1
-    if request.json.get("project_id"):
-        response["project_id"] = request.json["project_id"]
-    else:
-        response["project_id"] = 1
-    if request.json.get("price_esimate"):
-        response["price_esimate"] = request.json["price_esimate"]
-    if request.json.get("currency_id"):
-        response["currency_id"] = request.json["currency_id"]
-    else:
-        response["currency_id"] = 1
-    response = manufacture_schema.load(response)
-
-    # Map the json request body to the entry selected by the database query.
-    # Build string of changes to provide feedback to user.
-    changed_string = ""
-    if request.json.get("location_id"):
-        manufacture.location_id = request.json["location_id"]
-        changed_string = " location_id"
-    if request.json.get("project_id"):
-        manufacture.project_id = request.json["project_id"]
-        changed_string += " project_id"
-    if request.json.get("price_estimate"):
-        manufacture.price_estimate = request.json["price_estimate"]
-        changed_string += " price_estimate"
-    if request.json.get("currency_id"):
-        manufacture.currency_id = request.json["currency_id"]
-        changed_string += " currency_id"
-
-    # Check if any information was changed. Give response if nothing was changed.
-    if changed_string == "":
-        return jsonify(message="No manufacture offering information has been changed.") 
 
     # Commit changes and return changed information.
+    response = manufacture_schema.dump(manufacture)
     db.session.commit()
-    return jsonify(message=f"The following manufacture offering information has been changed:{changed_string}.", **manufacture_schema.dump(manufacture))
+    return jsonify(message=f"The following manufacture offering information has been changed:{changed_fields(changes)}.", **response)
 
 
 # GET all manufactures
 # /manufactures/
 @manufactures.route("/", methods=["GET"])
 @jwt_required()
+@conditional_get(Manufacture, Project, Location, Country, Currency)
 def get_complete_catalogue():
     '''
     This route will be used to retrieve all entries in the manufactures table. The information retrieved will be the full
-    catalogue of internal fabrication, not filtered by either location or project.
+    catalogue of internal fabrication, not filtered by either location or project. The catalogue is paginated on the
+    composite key (location_id, project_id); the `limit` and `after` query parameters select the page, and `next_cursor` is
+    returned for the next page.
+
+    The following database query is used to get a page of entries in the manufactures table.
+    Database statement: SELECT * FROM manufactures WHERE (location_id, project_id) > after
+    ORDER BY location_id, project_id LIMIT limit;
+
+    The whole table can instead be streamed, as newline delimited json with the "Accept: application/x-ndjson" header or
+    as a json array with the "?stream=true" query parameter (see utils/streaming.py).
 
-    The following database query is used to get all entries in the projects table.
-    Database statement: SELECT * FROM manufactures;
+    The `filter`, `sort` and `fields` query parameters narrow, order and trim the list, e.g.
+    ?filter[currency_id]=1&filter[price_estimate][lt]=5000&sort=price_estimate (see utils/list_options.py).
 
     JWT is required for this route.
     '''
-    # Query the database to select all entries in the manufactures table.
-    query = db.select(Manufacture)
-    manufacture_list = db.session.scalars(query)
-    response = manufactures_schema.dump(manufacture_list)
+    # Read the filter, sort and fields query parameters.
+    options = read_list_options(Manufacture, manufactures_schema)
 
-    # Return all entries to the user in json format.
-    return jsonify(response)
+    # Query the database to select a page of entries in the manufactures table.
+    query = db.select(Manufacture).where(*options.filters).options(*eager_load_options(options.schema, Manufacture))
+
+    # Stream every entry instead of a single page if the client asked for a streamed response.
+    if wants_stream():
+        return stream_response(query, Manufacture, options.schema, options.sort)
+
+    manufacture_list, next_cursor = paginate(query, Manufacture, options.sort)
+    response = options.schema.dump(manufacture_list)
+
+    # Return the page of entries to the user in json format.
+    return jsonify(results=response, next_cursor=next_cursor)
 
 
 # GET a manufacture by ids
@@ -207,7 +259,7 @@ def get_manufacture_by_ids(location_id: int, project_id: int):
     '''
     # Query the manufactures table with conditions on two columns: location_id and project_id. These foreign keys combine
     # to create the composite key for the table, so the result should always be unique.
-    query = db.select(Manufacture).filter_by(
+    query = db.select(Manufacture).options(*eager_load_options(manufacture_schema, Manufacture)).filter_by(
         location_id=location_id,
         project_id=project_id
         )
@@ -0,0 +1,33 @@
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import verify_jwt_in_request
+import hmac
+
+from controllers.auths_controller import check_admin
+from utils.instrumentation import render_metrics
+
+metrics = Blueprint('metrics', __name__, url_prefix="/metrics")
+
+
+# GET the request and database metrics
+# /metrics
+@metrics.route("", methods=["GET"])
+def get_metrics():
+    '''
+    This route returns the metrics of the worker process that answers the request, in the Prometheus text exposition
+    format: request latency histograms by blueprint, endpoint, method and status code, database statements and time per
+    request, serialisation time per request, slow query and N+1 warning counters, and the state of the connection pool
+    (see utils/instrumentation.py).
+
+    No database queries are performed in this route, other than the admin check.
+
+    Either the METRICS_TOKEN of config.py as a bearer token, or a JWT with is_admin=True, is required for this route.
+    '''
+    # A scraper authenticates with METRICS_TOKEN; otherwise the route is admin only.
+    token = current_app.config["METRICS_TOKEN"]
+    authorization = request.headers.get("Authorization", "")
+    if not (token and hmac.compare_digest(authorization.encode("utf-8"), f"Bearer {token}".encode("utf-8"))):
+        verify_jwt_in_request()
+        if not check_admin():
+            return jsonify(message="Admin-level authorisation required for this function."), 401
+
+    return current_app.response_class(render_metrics(), mimetype="text/plain; version=0.0.4")
@@ -9,11 +9,25 @@ from models.projects import Project
 from models.manufactures import Manufacture
 from models.drawings import Drawing
 from models.comments import Comment
+from models.users import User
+from models.locations import Location
+from models.countries import Country
+from models.currencies import Currency
+from models.exchange_rates import ExchangeRate
 from schemas.project_schema import project_schema, projects_schema
 from schemas.manufacture_schema import manufactures_schema
 from schemas.drawing_schema import drawings_schema
 from schemas.comment_schema import comments_schema
 from controllers.auths_controller import check_admin
+from utils.streaming import wants_stream, stream_response
+from utils.list_options import read_list_options
+from utils.pagination import paginate, paginate_children
+from utils.loading import eager_load_options
+from utils.conditional import conditional_get
+from utils.bulk import read_bulk_items, load_bulk_items, bulk_insert, bulk_response
+from utils.prices import get_price_summaries
+from utils.queries import record_exists
+from utils.updates import read_partial_update, read_expected_version, update_entry, current_version, version_etag, changed_fields
 
 projects = Blueprint('project', __name__, url_prefix="/projects")
 
@@ -79,6 +93,48 @@ def create_project():
     return jsonify(project_schema.dump(new_project)), 201
 
 
+# CREATE projects in bulk
+# /projects/bulk
+@projects.route("/bulk", methods=["POST"])
+@jwt_required()
+def create_projects_bulk():
+    '''
+    This route will be used by an admin to create many entries in the projects table with one request, e.g. when loading
+    the catalogue of a new workshop. The request body is either a json array of projects, or newline delimited json with
+    one project per line (Content-Type: application/x-ndjson). Each project takes the same fields as the create project
+    route.
+
+    All projects are validated together, and the valid projects are inserted with a single statement. Invalid projects are
+    not inserted, and do not stop the valid projects from being inserted. The response has one result per project, in the
+    same order as the request, with either the id of the new project or the validation errors.
+    Database statement: INSERT INTO projects (title, published_date, description, certification_number)
+    VALUES (...), (...), ... RETURNING id;
+
+    Example json body for POST request:
+    [
+        {"title": "string, length from 3 to 50 chars", "description": "OPTIONAL, string"},
+        {"title": "string, length from 3 to 50 chars", "certification_number": "OPTIONAL, string, length from 3 to 25"}
+    ]
+
+    JWT and is_admin=True are required for this route.
+    '''
+    # First call the check_admin function to check authorisation level.
+    if not check_admin():
+        return jsonify(message="Admin-level authorisation required for this function."), 401
+
+    # Validate every project in the request body.
+    items = read_bulk_items()
+    rows, errors = load_bulk_items(projects_schema, items)
+
+    # Insert the valid projects and commit changes.
+    ids = bulk_insert(Project, list(rows.values()))
+    db.session.commit()
+
+    # Return the result for each project in the request.
+    results = {index: {"index": index, "status": "created", "id": new_id} for index, new_id in zip(rows, ids)}
+    return bulk_response(results, errors, len(items))
+
+
 # UPDATE a project by id
 # /projects/<id>
 @projects.route("/<int:project_id>", methods=["PATCH"])
@@ -90,15 +146,23 @@ def update_project_by_id(project_id: int):
     For ease of use, the user only has to pass the fields that they want to update. The PATCH request feels more appropriate
     in this instance given that not all fields are required to be passed.
 
-    The following database query will filter the projects.id column to match the project id passed in the URL.
-    Database statement: SELECT * FROM projects WHERE id=project_id;
+    Only the fields passed are validated, and they are applied to the project with a single statement, which also returns
+    the updated project (see utils/updates.py).
+    Database statement: UPDATE projects SET (fields passed), version=version+1 WHERE id=project_id
+    AND version=expected version RETURNING *;
+
+    The version of the project is increased by every update. To make sure that changes made by another admin in the
+    meantime are not overwritten, the version the changes were based on can be given in the If-Match header (the ETag
+    returned by GET /projects/<id>, e.g. If-Match: "3") or the `version` field. If the project has been updated since,
+    nothing is changed and 409 Conflict is returned with the current version.
 
     Example json body for PATCH request:
     {
         "title": "OPTIONAL, string, length from 3 to 50 chars"
         "published_date": "OPTIONAL, date",
         "description": "OPTIONAL, string",
-        "certification_number": "OPTIONAL, string, length from 3 to 25"
+        "certification_number": "OPTIONAL, string, length from 3 to 25",
+        "version": "OPTIONAL, integer, the version the changes are based on"
     }
 
     JWT and is_admin=True are required for this route.
@@ -107,70 +171,95 @@ def update_project_by_id(project_id: int):
     if not check_admin():
         return jsonify(message="Admin-level authorisation required for this function."), 401
     
-    # Query the database to find the entry in the projects table with the matching id=project_id.
-    query = db.select(Project).filter_by(id=project_id)
-    project = db.session.scalar(query)
-    response = project_schema.dump(project)
-
-    # Return an error if the specified project does not exist in the projects table.
-    if not response:
-        return jsonify({"error": f"A project with id=`{project_id}` does not exist in the database."}), 404
-    
-    # Validate input coming from json request using schema.
-    if request.json.get("title"):
-        response["title"] = request.json["title"]
-    if request.json.get("published_date"):
-        response["published_date"] = request.json["published_date"]
-    if request.json.get("description"):
-        response["description"] = request.json["description"]
-    if request.json.get("certification_number"):
-        response["certification_number"] = request.json["certification_number"]
-    response = project_schema.load(response)
-
-    # Map the json request body to the entry selected by the database query.
-    # Build string of changes to provide feedback to user.
-    changed_string = ""
-    if request.json.get("title"):
-        project.title = request.json["title"]
-        changed_string = " title"
-    if request.json.get("published_date"):
-        project.published_date = request.json["published_date"]
-        changed_string += " published_date"
-    if request.json.get("description"):
-        project.description = request.json["description"]
-        changed_string += " description"
-    if request.json.get("certification_number"):
-        project.certification_number = request.json["certification_number"]
-        changed_string += " certification_number"
+    # Validate the fields given in the json request body, and only those fields, and read the expected version.
+    changes = read_partial_update(project_schema, ("title", "published_date", "description", "certification_number"))
+    expected = read_expected_version()
 
     # Check if any information was changed. Give response if nothing was changed.
-    if changed_string == "":
-        return jsonify(message="No project information has been changed.") 
+    if not changes:
+        if not record_exists(Project, project_id):
+            return jsonify({"error": f"A project with id=`{project_id}` does not exist in the database."}), 404
+        return jsonify(message="No project information has been changed.")
+
+    # Apply the changes with a single statement, which returns the updated project.
+    project = update_entry(Project, {"id": project_id}, changes, version=expected)
+
+    # Return an error if the specified project does not exist in the projects table, or has been changed since the expected version.
+    if project is None:
+        version = current_version(Project, {"id": project_id})
+        if version is None:
+            return jsonify({"error": f"A project with id=`{project_id}` does not exist in the database."}), 404
+        return jsonify({"error": f"The project with id=`{project_id}` has been changed since version {expected}. No edits have been made.", "version": version}), 409
 
     # Commit changes and return changed information.
+    response = project_schema.dump(project)
     db.session.commit()
-    return jsonify(message=f"The following project information has been changed:{changed_string}.", **project_schema.dump(project))
+    return version_etag(jsonify(message=f"The following project information has been changed:{changed_fields(changes)}.", **response), project)
 
 
 # GET all projects
 # /projects/
 @projects.route("/", methods=["GET"])
 @jwt_required()
+@conditional_get(Project)
 def get_projects_list():
     '''
-    This route will be used by a user to get a list of all of the projects stored in the projects table.
+    This route will be used by a user to get a list of all of the projects stored in the projects table. The list is
+    paginated; the `limit` and `after` query parameters select the page, and `next_cursor` is returned for the next page.
+
+    The following database query is used to get a page of entries in the projects table.
+    Database statement: SELECT * FROM projects WHERE id > after ORDER BY id LIMIT limit;
+
+    The whole table can instead be streamed, as newline delimited json with the "Accept: application/x-ndjson" header or
+    as a json array with the "?stream=true" query parameter (see utils/streaming.py).
+
+    The `filter`, `sort` and `fields` query parameters narrow, order and trim the list, e.g.
+    ?filter[published_date][gte]=2020-01-01&sort=-published_date&fields=id,title (see utils/list_options.py).
+
+    JWT is required for this route.
+    '''
+    # Read the filter, sort and fields query parameters.
+    options = read_list_options(Project, projects_schema)
+
+    # Query the database to find a page of entries in the projects table, selecting only the columns that are returned.
+    query = db.select(Project).where(*options.filters).options(*eager_load_options(options.schema, Project))
+
+    # Stream every entry instead of a single page if the client asked for a streamed response.
+    if wants_stream():
+        return stream_response(query, Project, options.schema, options.sort)
+
+    project_list, next_cursor = paginate(query, Project, options.sort)
+    response = options.schema.dump(project_list)
+
+    return jsonify(results=response, next_cursor=next_cursor)
 
-    The following database query is used to get all entries in the projects table.
-    Database statement: SELECT * FROM projects;
+
+# GET the supplier price summary of each project
+# /projects/supplier_prices
+@projects.route("/supplier_prices", methods=["GET"])
+@jwt_required()
+@conditional_get(Manufacture, Project, Currency, ExchangeRate)
+def get_supplier_prices():
+    '''
+    This route will be used by a user to compare what the suppliers of each project charge, without looking through every
+    offering. For each project with manufacturing offerings, the number of offerings and their min, median and max price
+    estimates are returned, converted to the currency given by the required `currency` query parameter, e.g.
+    ?currency=AUD, with the exchange rates of the currencies (see PUT /currencies/<id>/exchange_rate). Offerings in a
+    currency without an exchange rate are counted as `unconverted` and left out of the prices.
+
+    The list is paginated by project id with the `limit` and `after` query parameters, and `filter[project_id]` narrows the
+    projects, e.g. ?currency=AUD&filter[project_id][in]=1,2,3. The prices are converted and aggregated by the database in
+    a single statement (see utils/prices.py), and each page is cached until the prices or exchange rates change.
+    Database statement: WITH converted AS (SELECT project_id, price_estimate * rate / target_rate AS price FROM manufactures
+    LEFT JOIN exchange_rates ...), ranked AS (...) SELECT project_id, title, count(price), min(price), median, max(price)
+    FROM ranked JOIN projects ... GROUP BY project_id ORDER BY project_id LIMIT limit;
 
     JWT is required for this route.
     '''
-    # Query the database to find all entries in the projects table
-    query = db.select(Project)
-    project_list = db.session.scalars(query)
-    response = projects_schema.dump(project_list)
+    # Compute (or read from the cache) a page of price summaries.
+    summaries, next_cursor = get_price_summaries()
 
-    return jsonify(response)
+    return jsonify(results=summaries, next_cursor=next_cursor)
 
 
 # GET a project by id
@@ -196,8 +285,8 @@ def get_project_by_id(project_id: int):
     if not response:
         return jsonify({"error": f"A project with id=`{project_id}` does not exist in the database."}), 404
 
-    # Return the requested project information back to the user.
-    return jsonify(response)
+    # Return the requested project information back to the user, with its version as the ETag.
+    return version_etag(jsonify(response), project)
 
 
 # DELETE a project by id
@@ -245,48 +334,52 @@ def delete_project_by_id(project_id: int):
 # /projects/<id>/suppliers
 @projects.route("/<int:project_id>/suppliers", methods=["GET"])
 @jwt_required()
+@conditional_get(Manufacture, Project, Location, Country, Currency)
 def get_project_suppliers(project_id: int):
     '''
     This route will be used by a user to find all the locations that offer to fabricate a specified project. If a user
     finds a project they need built in the projects list, they can enter that project id into this route to find
     which internal workshops will manufacture the project, and for what price.
 
-    The following database query will return the unique entry in the projects table with matching id to the project_id
+    The following database query will return a page of entries in the manufactures table with project_id matching the project_id
     passed in the URL.
-    Database statement: SELECT * FROM projects WHERE id=projects_id;
+    Database statement: SELECT * FROM manufactures WHERE project_id=project_id ORDER BY location_id, project_id LIMIT limit;
 
-    The following database query will return all entries in the manufactures table with project_id matching the project_id
-    passed in the URL.
-    Database statement: SELECT * FROM manufactures WHERE project_id=project_id;
+    Only if no entries are found, the following database query checks that the project exists, to tell a missing project
+    apart from a project with no entries.
+    Database statement: SELECT EXISTS (SELECT 1 FROM projects WHERE id=project_id);
+
+    The `filter`, `sort` and `fields` query parameters narrow, order and trim the list, e.g.
+    ?filter[currency_id]=1&filter[price_estimate][lt]=5000&sort=price_estimate (see utils/list_options.py).
 
     JWT is required for this route.
     '''
-    # First ensure that a project with the provided project_id exists in the projects table.
-    query = db.select(Project).filter_by(id=project_id)
-    project = db.session.scalar(query)
-    response = project_schema.dump(project)
+    # Read the filter, sort and fields query parameters.
+    options = read_list_options(Manufacture, manufactures_schema)
+
+    # Query the database to find a page of manufacturing offerings with the matching project_id.
+    query = db.select(Manufacture).filter_by(project_id=project_id).where(*options.filters).options(*eager_load_options(options.schema, Manufacture))
+    manufactures_list, next_cursor, project_exists = paginate_children(query, Manufacture, Project, project_id, options.sort)
 
     # In the case that such a project does not exist, provide feedback to the user of the error.
-    if not response:
+    if not project_exists:
         return jsonify(error=f"A project with id=`{project_id}` does not exist in the database."), 404
 
-    # Query the database to find all manufacturing offerings with the matching project_id.
-    query = db.select(Manufacture).filter_by(project_id=project_id)
-    manufactures_list = db.session.scalars(query)
-    response = manufactures_schema.dump(manufactures_list)
+    response = options.schema.dump(manufactures_list)
 
     # In the case that no locations offer to manufacture this project, notify the user instead of giving an empty response.
     if not response:
         return jsonify(message=f"No locations currently offer to manufacture this project."), 200
 
-    # Return the list of suppliers and their prices.
-    return jsonify(response)
+    # Return the page of suppliers and their prices.
+    return jsonify(results=response, next_cursor=next_cursor)
 
 
 # GET all drawings by project ID
 # /projects/<id>/drawings
 @projects.route("/<int:project_id>/drawings", methods=["GET"])
 @jwt_required()
+@conditional_get(Drawing, Project)
 def get_project_drawings(project_id: int):
     '''
     This route will be used by a user to retrieve all of the drawing numbers required to build a specified project. It is 
@@ -294,42 +387,45 @@ def get_project_drawings(project_id: int):
     may also be no internal locations that offer to manufacture a particular project. This route allows the user to retrieve
     all drawings for a project so that they can be requested from engineering.
 
-    The following database query will return the unique entry in the projects table with matching id to the project_id
+    The following database query will return a page of entries in the drawings table with project_id matching the project_id
     passed in the URL.
-    Database statement: SELECT * FROM projects WHERE id=projects_id;
+    Database statement: SELECT * FROM drawings WHERE project_id=project_id ORDER BY id LIMIT limit;
 
-    The following database query will return all entries in the drawings table with project_id matching the project_id
-    passed in the URL.
-    Database statement: SELECT * FROM drawings WHERE project_id=project_id;
+    Only if no entries are found, the following database query checks that the project exists, to tell a missing project
+    apart from a project with no entries.
+    Database statement: SELECT EXISTS (SELECT 1 FROM projects WHERE id=project_id);
+
+    The `filter`, `sort` and `fields` query parameters narrow, order and trim the list, e.g.
+    ?filter[id][gt]=10&sort=-id&fields=id (see utils/list_options.py).
 
     JWT is required for this route.
     '''
-    # First ensure that a project with the provided project_id exists in the projects table.
-    query = db.select(Project).filter_by(id=project_id)
-    project = db.session.scalar(query)
-    response = project_schema.dump(project)
+    # Read the filter, sort and fields query parameters.
+    options = read_list_options(Drawing, drawings_schema)
+
+    # Query the database to find a page of drawings with the matching project_id.
+    query = db.select(Drawing).filter_by(project_id=project_id).where(*options.filters).options(*eager_load_options(options.schema, Drawing))
+    drawings_list, next_cursor, project_exists = paginate_children(query, Drawing, Project, project_id, options.sort)
 
     # In the case that such a project does not exist, provide feedback to the user of the error.
-    if not response:
+    if not project_exists:
         return jsonify(error=f"A project with id=`{project_id}` does not exist in the database."), 404
 
-    # Query the database to find all drawings with the matching project_id.
-    query = db.select(Drawing).filter_by(project_id=project_id)
-    drawings_list = db.session.scalars(query)
-    response = drawings_schema.dump(drawings_list)
+    response = options.schema.dump(drawings_list)
 
     # In the case that no drawings have been linked to the specified project, provide feedback to the user.
     if not response:
         return jsonify(message=f"No drawings have yet been linked to the requested project."), 200
 
-    # Return the list of drawings for the specified project.
-    return jsonify(response)
+    # Return the page of drawings for the specified project.
+    return jsonify(results=response, next_cursor=next_cursor)
 
 
 # GET all comments by project ID
 # /projects/<id>/comments
 @projects.route("/<int:project_id>/comments", methods=["GET"])
 @jwt_required()
+@conditional_get(Comment, Project, User)
 def get_project_comments(project_id: int):
     '''
     This route will be used by a user to retrieve all of the comments made by users on a specified project. A user may
@@ -337,33 +433,35 @@ def get_project_comments(project_id: int):
     discussion on by providing the project_id in the URL. The project_id must be an integer and a project with the
     corresponding id must exist in the projects table.
 
-    The following database query will return the unique entry in the projects table with matching id to the project_id
+    The following database query will return a page of entries in the comments table with project_id matching the project_id
     passed in the URL.
-    Database statement: SELECT * FROM projects WHERE id=projects_id;
+    Database statement: SELECT * FROM comments WHERE project_id=project_id ORDER BY id LIMIT limit;
 
-    The following database query will return all entries in the comments table with project_id matching the project_id
-    passed in the URL.
-    Database statement: SELECT * FROM comments WHERE project_id=project_id;
+    Only if no entries are found, the following database query checks that the project exists, to tell a missing project
+    apart from a project with no entries.
+    Database statement: SELECT EXISTS (SELECT 1 FROM projects WHERE id=project_id);
+
+    The `filter`, `sort` and `fields` query parameters narrow, order and trim the list, e.g.
+    ?filter[id][gt]=10&sort=-id&fields=id (see utils/list_options.py).
 
     JWT is required for this route.
     '''
-    # First ensure that a project with the provided project_id exists in the projects table.
-    query = db.select(Project).filter_by(id=project_id)
-    project = db.session.scalar(query)
-    response = project_schema.dump(project)
+    # Read the filter, sort and fields query parameters.
+    options = read_list_options(Comment, comments_schema)
+
+    # Query the database to find a page of comments with the matching project_id.
+    query = db.select(Comment).filter_by(project_id=project_id).where(*options.filters).options(*eager_load_options(options.schema, Comment))
+    comments_list, next_cursor, project_exists = paginate_children(query, Comment, Project, project_id, options.sort)
 
     # In the case that such a project does not exist, provide feedback to the user of the error.
-    if not response:
+    if not project_exists:
         return jsonify(error=f"A project with id=`{project_id}` does not exist in the database."), 404
 
-    # Query the database to find all comments with the matching project_id.
-    query = db.select(Comment).filter_by(project_id=project_id)
-    comments_list = db.session.scalars(query)
-    response = comments_schema.dump(comments_list)
+    response = options.schema.dump(comments_list)
 
     # In the case that there is no discussion of a project, provide feedback to the user.
     if not response:
         return jsonify(message=f"No comments have yet been posted about this project."), 200
 
-    # Return the list of comments for the specified project.
-    return jsonify(response)
\ No newline at end of file
+    # Return the page of comments for the specified project.
+    return jsonify(results=response, next_cursor=next_cursor)
\ No newline at end of file
@@ -0,0 +1,45 @@
+from flask import Blueprint, jsonify
+from werkzeug.exceptions import BadRequest
+from flask_jwt_extended import jwt_required
+
+from models.search_documents import SearchDocument
+from utils.conditional import conditional_get
+from utils.search import read_search_query, search_documents
+
+search = Blueprint('search', __name__, url_prefix="/search")
+
+# Error handlers
+@search.errorhandler(BadRequest)
+def bad_request_error_handler(e):
+    return jsonify({"error": e.description}), 400
+
+
+# SEARCH projects, drawings and comments
+# /search?q=<text>
+@search.route("/", methods=["GET"])
+@jwt_required()
+@conditional_get(SearchDocument)
+def search_catalogue():
+    '''
+    This route is used to find projects, drawings and comments by their text, e.g. to check whether a design already exists
+    before starting a new project. Project titles and descriptions, drawing numbers and part descriptions, and comments are
+    searched. Results are ranked best match first, and each has a fragment of the matching text as HTML, with the text
+    escaped and the matched words wrapped in <mark></mark>.
+
+    The `q` query parameter is the search text. The optional `type` query parameter narrows the search to one or more of
+    project, drawing and comment (comma separated). The results are paginated with the `limit` and `after` query parameters,
+    the same as the list routes.
+
+    The search documents are kept up to date as entries are created, updated and deleted (see utils/search.py).
+    Database statement: SELECT ... FROM search_documents WHERE document @@ websearch_to_tsquery(q)
+    ORDER BY ts_rank(document, query) DESC LIMIT limit;
+
+    JWT is required for this route.
+    '''
+    # Read the search text and kinds of entry to search from the query string.
+    text, kinds = read_search_query()
+
+    # Query the search documents for a page of ranked matches.
+    results, next_cursor = search_documents(text, kinds)
+
+    return jsonify(results=results, next_cursor=next_cursor)
@@ -0,0 +1,30 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required
+
+from main import db
+from controllers.auths_controller import check_admin
+from utils.database import get_pool_status
+
+status = Blueprint('status', __name__, url_prefix="/status")
+
+
+# GET the database connection pool status
+# /status/database
+@status.route("/database", methods=["GET"])
+@jwt_required()
+def get_database_status():
+    '''
+    This route is used by an admin to see the state of the database connection pool of the worker process that answers
+    the request: its size, how many connections are checked out or idle, how many overflow connections are open, and
+    counters of connections opened, checked out, returned and invalidated since the process started. The pool settings
+    are in config.py (DB_POOL_SIZE, DB_MAX_OVERFLOW, ...).
+
+    No database queries are performed in this route, other than the admin check.
+
+    JWT and is_admin=True are required for this route.
+    '''
+    # First call the check_admin function to check authorisation level.
+    if not check_admin():
+        return jsonify(message="Admin-level authorisation required for this function."), 401
+
+    return jsonify(get_pool_status(db.engine))
@@ -1,15 +1,24 @@
 from flask import Blueprint, jsonify, request
 from marshmallow.exceptions import ValidationError
-from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import BadRequest, ServiceUnavailable
 from sqlalchemy.exc import IntegrityError, DataError
 from flask_jwt_extended import get_jwt_identity, jwt_required
 
-from main import db, bcrypt
+from main import db
 from models.users import User
 from models.comments import Comment
+from models.projects import Project
+from models.locations import Location
+from models.countries import Country
 from schemas.user_schema import user_schema, users_schema
 from schemas.comment_schema import comments_schema
 from controllers.auths_controller import check_admin
+from utils.streaming import wants_stream, stream_response
+from utils.list_options import read_list_options
+from utils.pagination import paginate, paginate_children
+from utils.loading import eager_load_options
+from utils.conditional import conditional_get
+from utils.passwords import hash_password
 
 users = Blueprint('user', __name__, url_prefix="/users")
 
@@ -34,6 +43,10 @@ def integrity_error_handler(e):
 def data_error_handler(e):
     return jsonify({"data_error": f"{e}"}), 400
 
+@users.errorhandler(ServiceUnavailable)
+def service_unavailable_error_handler(e):
+    return jsonify({"error": e.description}), 503
+
 
 # UPDATE User Information
 # /users/update_info
@@ -100,7 +113,7 @@ def update_user_information():
         user.position = request.json["position"]
         changed_string += " position"
     if request.json.get("password"):
-        user.password = bcrypt.generate_password_hash(request.json["password"]).decode("utf-8")
+        user.password = hash_password(request.json["password"])
         changed_string += " password"
 
     # Check if any information was changed. Give response if nothing was changed.
@@ -116,20 +129,37 @@ def update_user_information():
 # /users/
 @users.route("/", methods=["GET"])
 @jwt_required()
+@conditional_get(User, Location, Country)
 def get_users_list():
     '''
-    This route will be used to see all users of the application, therefore a GET request is used.
+    This route will be used to see all users of the application, therefore a GET request is used. The list is paginated;
+    the `limit` and `after` query parameters select the page, and `next_cursor` is returned for the next page.
+
+    The following database query will return a page of entries in the users table. The hashed password is load_only and not
+    displayed.
+    Database statement: SELECT * FROM users WHERE id > after ORDER BY id LIMIT limit;
 
-    The following database query will return all entries in the users table. The hashed password is load_only and not displayed.
-    Database statement: SELECT * FROM users;
+    The whole table can instead be streamed, as newline delimited json with the "Accept: application/x-ndjson" header or
+    as a json array with the "?stream=true" query parameter (see utils/streaming.py).
+
+    The `filter`, `sort` and `fields` query parameters narrow, order and trim the list, e.g.
+    ?filter[id][gt]=10&sort=-id&fields=id (see utils/list_options.py).
 
     JWT is required for this route.
     '''
-    query = db.select(User)
-    user_list = db.session.scalars(query)
-    response = users_schema.dump(user_list)
+    # Read the filter, sort and fields query parameters.
+    options = read_list_options(User, users_schema)
 
-    return jsonify(response)
+    query = db.select(User).where(*options.filters).options(*eager_load_options(options.schema, User))
+
+    # Stream every entry instead of a single page if the client asked for a streamed response.
+    if wants_stream():
+        return stream_response(query, User, options.schema, options.sort)
+
+    user_list, next_cursor = paginate(query, User, options.sort)
+    response = options.schema.dump(user_list)
+
+    return jsonify(results=response, next_cursor=next_cursor)
 
 
 # GET a User by User ID
@@ -147,7 +177,7 @@ def get_user_by_id(user_id: int):
 
     JWT is required for this route.
     '''
-    query = db.select(User).filter_by(id=user_id)
+    query = db.select(User).options(*eager_load_options(user_schema, User)).filter_by(id=user_id)
     user = db.session.scalar(query)
     response = user_schema.dump(user)
 
@@ -167,7 +197,8 @@ def delete_user_by_id(user_id: int):
     the user_id passed in the URL. The user id passed in the URL must be an integer and must exist in the users table.
 
     The "/delete_user/" portion of the URL was added to make sure that this action was deliberate and less prone to mistake.
-    Accidentally deleting a user would have flow on effects to comments due to the cascade delete.
+    Accidentally deleting a user would have flow on effects to comments due to the cascade delete. The cached identity of the
+    deleted user (see get_current_identity) is cleared when the deletion is committed.
 
     The following data query will return the user with the matching user id passed in the URL.
     Database statement: SELECT * FROM users WHERE id=user_id;
@@ -198,36 +229,40 @@ def delete_user_by_id(user_id: int):
 # /users/<id>/comments
 @users.route("/<int:user_id>/comments", methods=["GET"])
 @jwt_required()
+@conditional_get(Comment, Project, User)
 def get_comments_by_user(user_id: int):
     '''
     This route will be used to see all comments made by a specific user. The user is filtered by providing a user ID in the 
     URL.
 
-    The following database query will return the unique entry in the users table with matching id provded by the URL.
-    Database statement: SELECT * FROM users WHERE id=user_id;
+    The following database query will return a page of entries in the comments table with matching user_id.
+    Database query: SELECT * FROM comments WHERE user_id=user_id ORDER BY id LIMIT limit;
+
+    Only if no comments are found, the following database query checks that the user exists, to tell a missing user apart
+    from a user who has not posted any comments.
+    Database statement: SELECT EXISTS (SELECT 1 FROM users WHERE id=user_id);
 
-    The following database query will return all entries in the comments table with matching user_id.
-    Database query: SELECT * FROM comments WHERE user_id=user_id;
+    The `filter`, `sort` and `fields` query parameters narrow, order and trim the list, e.g.
+    ?filter[id][gt]=10&sort=-id&fields=id (see utils/list_options.py).
 
     JWT is required for this route.
     '''
-    # First ensure that a user with the provided user_id exists in the database.
-    query = db.select(User).filter_by(id=user_id)
-    user = db.session.scalar(query)
-    response = user_schema.dump(user)
+    # Read the filter, sort and fields query parameters.
+    options = read_list_options(Comment, comments_schema)
+
+    # Query the database to find a page of comments made by the user with id=user_id.
+    query = db.select(Comment).filter_by(user_id=user_id).where(*options.filters).options(*eager_load_options(options.schema, Comment))
+    comments_list, next_cursor, user_exists = paginate_children(query, Comment, User, user_id, options.sort)
 
     # Provide feedback that the user they're looking for does not exist in the database.
-    if not response:
+    if not user_exists:
         return jsonify(error=f"A user with id=`{user_id}` does not exist in the database."), 404
 
-    # Query the database to find all comments made by the user with id=user_id.
-    query = db.select(Comment).filter_by(user_id=user_id)
-    comments_list = db.session.scalars(query)
-    response = comments_schema.dump(comments_list)
+    response = options.schema.dump(comments_list)
 
     # If the user has not made any comments, provide this feedback to the user so they know it's actually working.
     if not response:
         return jsonify(message=f"The user with id=`{user_id}` has not posted any comments."), 200
 
-    # Return all comments made by the user.
-    return jsonify(response)
\ No newline at end of file
+    # Return the page of comments made by the user.
+    return jsonify(results=response, next_cursor=next_cursor)
\ No newline at end of file
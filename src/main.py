@@ -2,11 +2,9 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
 from flask_jwt_extended import JWTManager
-from flask_bcrypt import Bcrypt
 
 db = SQLAlchemy()
 ma = Marshmallow()
-bcrypt = Bcrypt()
 
 def init_app():
 
@@ -14,17 +12,33 @@ def init_app():
 
     # Configuration
     app.config.from_object("config.app_config")
+
+    # JSON serialisation backend
+    from utils.json_provider import init_json_provider
+    init_json_provider(app)
+
     jwt = JWTManager(app)
 
     # Connect DB via ORM
     db.init_app(app)
 
+    # Count connection pool events, and set per-transaction database settings
+    from utils.database import init_engine
+    with app.app_context():
+        init_engine(db.engine, app.config)
+
     # Connect Schemas
     ma.init_app(app)
 
+    # Request latency, database and serialisation metrics, slow query and N+1 logging
+    from utils.instrumentation import init_instrumentation
+    with app.app_context():
+        init_instrumentation(app, db.engine)
+
     # CLI Commands
-    from commands import db_commands
+    from commands import db_commands, benchmark_commands
     app.register_blueprint(db_commands)
+    app.register_blueprint(benchmark_commands)
 
     # Connect Routes & Controllers
     from controllers import register_controllers
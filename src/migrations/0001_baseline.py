@@ -0,0 +1,15 @@
+'''
+The schema created by the `flask db create` command, before migrations were introduced. Databases created with that command
+are stamped with this revision by `flask db upgrade`, which then applies the migrations that follow.
+'''
+
+revision = "0001"
+description = "Baseline schema"
+
+
+def upgrade(connection):
+    pass
+
+
+def downgrade(connection):
+    pass
@@ -0,0 +1,30 @@
+'''
+Indexes for the foreign key columns that the list routes filter by:
+- manufactures (project_id, location_id), for the suppliers of a project. The primary key only covers location_id.
+- drawings (project_id, id), for the drawings of a project.
+- comments (project_id, id) and (user_id, id), for the comments of a project and of a user.
+
+The id column is included so that the pages of a child list (WHERE project_id = ? AND id > after ORDER BY id) are read
+straight from the index.
+'''
+from sqlalchemy import text
+
+revision = "0002"
+description = "Index the foreign key filter paths"
+
+INDEXES = {
+    "ix_manufactures_project_id_location_id": "manufactures (project_id, location_id)",
+    "ix_drawings_project_id_id": "drawings (project_id, id)",
+    "ix_comments_project_id_id": "comments (project_id, id)",
+    "ix_comments_user_id_id": "comments (user_id, id)",
+}
+
+
+def upgrade(connection):
+    for name, columns in INDEXES.items():
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}"))
+
+
+def downgrade(connection):
+    for name in INDEXES:
+        connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
@@ -0,0 +1,72 @@
+'''
+The search_documents table used by the /search route, with a GIN index on its tsvector column on PostgreSQL, or a FTS5
+table kept in step by triggers on SQLite. Every existing project, drawing and comment is added to it.
+
+The tables are defined here as they were at this revision, and the documents are built from the columns the searchable
+tables had at this revision, so that the revision also applies to databases created before later columns were added.
+'''
+from flask import current_app
+import sqlalchemy as sa
+
+from models.search_documents import TSVector
+
+revision = "0003"
+description = "Add full-text search documents"
+
+metadata = sa.MetaData()
+
+search_documents = sa.Table(
+    "search_documents",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("kind", sa.String(20), nullable=False),
+    sa.Column("entity_id", sa.Integer, nullable=False),
+    sa.Column("title", sa.Text, nullable=True),
+    sa.Column("content", sa.Text, nullable=True),
+    sa.Column("document", TSVector, nullable=True),
+    sa.UniqueConstraint("kind", "entity_id"),
+    sa.Index("ix_search_documents_document", "document", postgresql_using="gin").ddl_if(dialect="postgresql"),
+)
+
+SQLITE_STATEMENTS = [
+    "CREATE VIRTUAL TABLE search_documents_fts USING fts5(title, content, content='search_documents', content_rowid='id')",
+    "CREATE TRIGGER search_documents_ai AFTER INSERT ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    "CREATE TRIGGER search_documents_ad AFTER DELETE ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(search_documents_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); END",
+    "CREATE TRIGGER search_documents_au AFTER UPDATE ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(search_documents_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); "
+    "INSERT INTO search_documents_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+]
+
+# The kind, table, title column and content column of each searchable table
+SOURCES = [
+    ("project", "projects", "title", "description"),
+    ("drawing", "drawings", "drawing_number", "part_description"),
+    ("comment", "comments", None, "comment"),
+]
+
+
+def upgrade(connection):
+    search_documents.create(connection)
+    if connection.dialect.name == "sqlite":
+        for statement in SQLITE_STATEMENTS:
+            connection.exec_driver_sql(statement)
+
+    # INSERT INTO search_documents (kind, entity_id, title, content, document) SELECT kind, id, title, content, ... FROM table;
+    for kind, table_name, title_column, content_column in SOURCES:
+        source = sa.table(table_name, *[sa.column(name) for name in ("id", title_column, content_column) if name])
+        title = source.c[title_column] if title_column else sa.null()
+        values = {"kind": sa.literal(kind), "entity_id": source.c.id, "title": title, "content": source.c[content_column]}
+        if connection.dialect.name == "postgresql":
+            language = current_app.config["SEARCH_LANGUAGE"]
+            title_vector = sa.func.to_tsvector(language, sa.func.coalesce(title, ""))
+            content_vector = sa.func.to_tsvector(language, sa.func.coalesce(source.c[content_column], ""))
+            values["document"] = sa.func.setweight(title_vector, "A").op("||")(sa.func.setweight(content_vector, "B"))
+        connection.execute(search_documents.insert().from_select(list(values), sa.select(*values.values())))
+
+
+def downgrade(connection):
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("DROP TABLE IF EXISTS search_documents_fts")
+    search_documents.drop(connection)
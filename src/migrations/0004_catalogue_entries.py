@@ -0,0 +1,77 @@
+'''
+The catalogue_entries table read by the location catalogue route: a denormalised copy of each manufacturing offering
+with the project, location, country and currency values it is served with, built from the existing manufactures.
+
+The tables are defined here with the columns they had at this revision, so that the revision also applies to databases
+created before later columns were added.
+'''
+import sqlalchemy as sa
+
+revision = "0004"
+description = "Add denormalised location catalogue entries"
+
+metadata = sa.MetaData()
+
+# The source tables, with the columns that catalogue entries are built from
+manufactures = sa.Table(
+    "manufactures",
+    metadata,
+    sa.Column("location_id", sa.Integer, primary_key=True),
+    sa.Column("project_id", sa.Integer, primary_key=True),
+    sa.Column("price_estimate", sa.Float),
+    sa.Column("currency_id", sa.Integer),
+)
+projects = sa.Table("projects", metadata, sa.Column("id", sa.Integer, primary_key=True), sa.Column("title", sa.String(50)))
+locations = sa.Table(
+    "locations",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("name", sa.String(50)),
+    sa.Column("admin_phone_number", sa.String(25)),
+    sa.Column("country_id", sa.Integer),
+)
+countries = sa.Table("countries", metadata, sa.Column("id", sa.Integer, primary_key=True), sa.Column("country", sa.String(56)))
+currencies = sa.Table("currencies", metadata, sa.Column("id", sa.Integer, primary_key=True), sa.Column("currency_abbr", sa.String(3)))
+
+catalogue_entries = sa.Table(
+    "catalogue_entries",
+    metadata,
+    sa.Column("location_id", sa.Integer, sa.ForeignKey("locations.id", ondelete="CASCADE"), primary_key=True),
+    sa.Column("project_id", sa.Integer, sa.ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True),
+    sa.Column("price_estimate", sa.Float, nullable=False),
+    sa.Column("currency_id", sa.Integer, sa.ForeignKey("currencies.id", ondelete="CASCADE"), nullable=False),
+    sa.Column("project_title", sa.String(50), nullable=False),
+    sa.Column("location_name", sa.String(50), nullable=False),
+    sa.Column("admin_phone_number", sa.String(25), nullable=False),
+    sa.Column("country", sa.String(56), nullable=False),
+    sa.Column("currency_abbr", sa.String(3), nullable=False),
+)
+
+
+def upgrade(connection):
+    catalogue_entries.create(connection)
+
+    # INSERT INTO catalogue_entries SELECT ... FROM manufactures JOIN projects ... JOIN locations ... JOIN countries ...
+    # JOIN currencies ...;
+    query = (
+        sa.select(
+            manufactures.c.location_id,
+            manufactures.c.project_id,
+            manufactures.c.price_estimate,
+            manufactures.c.currency_id,
+            projects.c.title,
+            locations.c.name,
+            locations.c.admin_phone_number,
+            countries.c.country,
+            currencies.c.currency_abbr,
+            )
+        .join(projects, projects.c.id == manufactures.c.project_id)
+        .join(locations, locations.c.id == manufactures.c.location_id)
+        .join(countries, countries.c.id == locations.c.country_id)
+        .join(currencies, currencies.c.id == manufactures.c.currency_id)
+        )
+    connection.execute(catalogue_entries.insert().from_select([column.name for column in catalogue_entries.c], query))
+
+
+def downgrade(connection):
+    catalogue_entries.drop(connection)
@@ -0,0 +1,28 @@
+'''
+The exchange_rates table used to compare supplier prices in a common currency. It starts empty: admins set the rate of
+each currency with PUT /currencies/<id>/exchange_rate.
+'''
+import sqlalchemy as sa
+
+revision = "0005"
+description = "Add currency exchange rates"
+
+metadata = sa.MetaData()
+
+currencies = sa.Table("currencies", metadata, sa.Column("id", sa.Integer, primary_key=True))
+
+exchange_rates = sa.Table(
+    "exchange_rates",
+    metadata,
+    sa.Column("currency_id", sa.Integer, sa.ForeignKey("currencies.id", ondelete="CASCADE"), primary_key=True),
+    sa.Column("rate", sa.Float, nullable=False),
+    sa.Column("last_modified", sa.DateTime),
+)
+
+
+def upgrade(connection):
+    exchange_rates.create(connection)
+
+
+def downgrade(connection):
+    exchange_rates.drop(connection)
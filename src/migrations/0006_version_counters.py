@@ -0,0 +1,32 @@
+'''
+Version counters for the optimistic locking of projects, drawings and comments (see utils/updates.update_entry). Every
+update increases the version of the entry, and a PATCH request that gives the version its changes were based on is only
+applied while the entry is still at that version.
+
+Projects and comments get a new version column, starting at 1. Drawings already have a version column, which may be
+empty; empty versions are set to 1. The column is also made NOT NULL on PostgreSQL; SQLite can not change the constraints
+of an existing column, and the application always gives drawings a version.
+'''
+from sqlalchemy import text
+
+revision = "0006"
+description = "Add version counters to projects and comments"
+
+TABLES = ("projects", "comments")
+
+
+def upgrade(connection):
+    for table in TABLES:
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
+    connection.execute(text("UPDATE drawings SET version = 1 WHERE version IS NULL"))
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("ALTER TABLE drawings ALTER COLUMN version SET DEFAULT 1, ALTER COLUMN version SET NOT NULL"))
+
+
+def downgrade(connection):
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("ALTER TABLE drawings ALTER COLUMN version DROP NOT NULL, ALTER COLUMN version DROP DEFAULT"))
+
+    for table in TABLES:
+        connection.execute(text(f"ALTER TABLE {table} DROP COLUMN version"))
@@ -0,0 +1,60 @@
+'''
+The drawing_revisions table read by GET /drawings/<id>/history: an append-only record of every version of each drawing,
+with the part description stored as a delta against the previous revision between periodic snapshots (see
+utils/revisions.py), and a unique (drawing_id, version) index. The current version of every existing drawing is recorded
+as its first revision.
+
+The tables are defined here with the columns they had at this revision, so that the revision also applies to databases
+created before later columns were added.
+'''
+import sqlalchemy as sa
+
+revision = "0007"
+description = "Add drawing revision history"
+
+metadata = sa.MetaData()
+
+drawings = sa.Table(
+    "drawings",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("drawing_number", sa.String(10)),
+    sa.Column("part_description", sa.Text),
+    sa.Column("version", sa.Integer),
+    sa.Column("last_modified", sa.DateTime),
+    sa.Column("project_id", sa.Integer),
+)
+
+drawing_revisions = sa.Table(
+    "drawing_revisions",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("version", sa.Integer, nullable=False),
+    sa.Column("drawing_number", sa.String(10), nullable=False),
+    sa.Column("project_id", sa.Integer, nullable=False),
+    sa.Column("last_modified", sa.DateTime),
+    sa.Column("part_description", sa.Text, nullable=True),
+    sa.Column("part_description_delta", sa.Text, nullable=True),
+    sa.Column("base_version", sa.Integer, nullable=False),
+    sa.Column("drawing_id", sa.Integer, sa.ForeignKey("drawings.id", ondelete="CASCADE"), nullable=False),
+    sa.Index("ix_drawing_revisions_drawing_id_version", "drawing_id", "version", unique=True),
+)
+
+# The drawing columns copied into each revision
+COLUMNS = ("version", "drawing_number", "project_id", "part_description", "last_modified")
+
+
+def upgrade(connection):
+    drawing_revisions.create(connection)
+
+    # INSERT INTO drawing_revisions (drawing_id, version, ..., base_version) SELECT id, version, ..., version FROM drawings;
+    connection.execute(
+        drawing_revisions.insert().from_select(
+            ["drawing_id", *COLUMNS, "base_version"],
+            sa.select(drawings.c.id, *[drawings.c[name] for name in COLUMNS], drawings.c.version)
+            )
+        )
+
+
+def downgrade(connection):
+    drawing_revisions.drop(connection)
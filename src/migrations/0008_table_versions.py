@@ -0,0 +1,43 @@
+'''
+The table_versions table that the ETags and Last-Modified times of conditional GET requests are built from (see
+utils/table_versions.py), with a version entry for every table. Databases created from the models since the table was
+added already have it, and only entries that are missing are added; databases created by the old `flask db create`
+command get the table here.
+
+The table is kept on downgrade: every revision of the application since it was added reads and writes it.
+'''
+import datetime
+import sqlalchemy as sa
+
+revision = "0008"
+description = "Add table versions for conditional GET requests"
+
+metadata = sa.MetaData()
+
+table_versions = sa.Table(
+    "table_versions",
+    metadata,
+    sa.Column("table_name", sa.String(50), primary_key=True),
+    sa.Column("version", sa.Integer, nullable=False, default=0),
+    sa.Column("last_modified", sa.DateTime(timezone=True), nullable=False),
+)
+
+# The tables of the schema at this revision
+TABLES = (
+    "countries", "currencies", "location_types", "locations", "users", "projects", "drawings", "comments", "manufactures",
+    "search_documents", "catalogue_entries", "exchange_rates", "drawing_revisions",
+)
+
+
+def upgrade(connection):
+    table_versions.create(connection, checkfirst=True)
+
+    existing = set(connection.scalars(sa.select(table_versions.c.table_name)))
+    now = datetime.datetime.now(datetime.timezone.utc)
+    missing = [{"table_name": name, "version": 0, "last_modified": now} for name in TABLES if name not in existing]
+    if missing:
+        connection.execute(table_versions.insert(), missing)
+
+
+def downgrade(connection):
+    pass
@@ -7,4 +7,8 @@ from models.projects import Project
 from models.drawings import Drawing
 from models.comments import Comment
 from models.manufactures import Manufacture
-
+from models.table_versions import TableVersion
+from models.search_documents import SearchDocument
+from models.catalogue_entries import CatalogueEntry
+from models.exchange_rates import ExchangeRate
+from models.drawing_revisions import DrawingRevision
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+from main import db
+
+# A ready-to-serve row of a location catalogue: a manufacturing offering together with the project, location, country and
+# currency values that the manufacture schema returns for it. The rows are kept in step with those tables by
+# utils/catalogue.py, so that a catalogue is read with a single scan of the primary key, without joins.
+class CatalogueEntry(db.Model):
+
+    # Data Table Name
+    __tablename__ = "catalogue_entries"
+
+    # Primary Keys
+    # (location_id, project_id) is the order a location catalogue is read in.
+    location_id = db.Column(db.Integer, db.ForeignKey("locations.id", ondelete="CASCADE"), primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+
+    # Columns
+    price_estimate = db.Column(db.Float, nullable=False)
+
+    # Foreign Key Columns
+    currency_id = db.Column(db.Integer, db.ForeignKey("currencies.id", ondelete="CASCADE"), nullable=False)
+
+    # Denormalised Columns
+    project_title = db.Column(db.String(50), nullable=False)
+    location_name = db.Column(db.String(50), nullable=False)
+    admin_phone_number = db.Column(db.String(25), nullable=False)
+    country = db.Column(db.String(56), nullable=False)
+    currency_abbr = db.Column(db.String(3), nullable=False)
+
+    # The project, location and currency have the shape of the relationships of Manufacture, so that entries are dumped with
+    # the manufacture schema and give the same response.
+    @property
+    def project(self):
+        return SimpleNamespace(id=self.project_id, title=self.project_title)
+
+    @property
+    def location(self):
+        return SimpleNamespace(
+            id=self.location_id,
+            name=self.location_name,
+            admin_phone_number=self.admin_phone_number,
+            country=SimpleNamespace(country=self.country)
+            )
+
+    @property
+    def currency(self):
+        return SimpleNamespace(id=self.currency_id, currency_abbr=self.currency_abbr)
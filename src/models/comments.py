@@ -5,6 +5,13 @@ class Comment(db.Model):
     # Data Table Name
     __tablename__ = "comments"
 
+    # Indexes
+    # The comments of a project and of a user are filtered by project_id or user_id and paginated by id.
+    __table_args__ = (
+        db.Index("ix_comments_project_id_id", "project_id", "id"),
+        db.Index("ix_comments_user_id_id", "user_id", "id"),
+    )
+
     # Primary Key
     id = db.Column(db.Integer, primary_key=True)
 
@@ -12,6 +19,8 @@ class Comment(db.Model):
     comment = db.Column(db.Text, nullable=False)
     when_created = db.Column(db.DateTime)
     last_edited = db.Column(db.DateTime)
+    # The version counter of the comment, increased by every update and checked against If-Match (see utils/updates.py).
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
 
     # Foreign Key Columns
     project_id = db.Column(db.Integer, db.ForeignKey("projects.id"), nullable=False)
@@ -17,4 +17,9 @@ class Currency(db.Model):
         back_populates="currency",
         cascade="all, delete"
     )
-    
\ No newline at end of file
+    exchange_rate = db.relationship(
+        "ExchangeRate",
+        back_populates="currency",
+        uselist=False,
+        cascade="all, delete"
+    )
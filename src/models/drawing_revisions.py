@@ -0,0 +1,32 @@
+from main import db
+
+# An append-only record of every version of a drawing, written by utils/revisions.py whenever a drawing is created or
+# updated. Revisions are never changed; they are removed together with their drawing.
+class DrawingRevision(db.Model):
+
+    # Data Table Name
+    __tablename__ = "drawing_revisions"
+
+    # Indexes
+    # The history of a drawing is read in version order, and each version of a drawing is recorded once.
+    __table_args__ = (
+        db.Index("ix_drawing_revisions_drawing_id_version", "drawing_id", "version", unique=True),
+    )
+
+    # Primary Key
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Columns
+    version = db.Column(db.Integer, nullable=False)
+    drawing_number = db.Column(db.String(10), nullable=False)
+    project_id = db.Column(db.Integer, nullable=False)
+    last_modified = db.Column(db.DateTime)
+
+    # The part description is stored in full on snapshot revisions (part_description_delta is NULL), and otherwise as a
+    # delta against the previous revision. base_version is the version of the snapshot that the delta chain starts from.
+    part_description = db.Column(db.Text, nullable=True)
+    part_description_delta = db.Column(db.Text, nullable=True)
+    base_version = db.Column(db.Integer, nullable=False)
+
+    # Foreign Key Columns
+    drawing_id = db.Column(db.Integer, db.ForeignKey("drawings.id", ondelete="CASCADE"), nullable=False)
@@ -5,13 +5,20 @@ class Drawing(db.Model):
     # Data Table Name
     __tablename__ = "drawings"
 
+    # Indexes
+    # The drawings of a project are filtered by project_id and paginated by id.
+    __table_args__ = (
+        db.Index("ix_drawings_project_id_id", "project_id", "id"),
+    )
+
     # Primary Key
     id = db.Column(db.Integer, primary_key=True)
 
     # Columns
     drawing_number = db.Column(db.String(10), nullable=False)
     part_description = db.Column(db.Text, nullable=True)
-    version = db.Column(db.Integer, nullable=True)
+    # The version counter of the drawing, increased by every update and checked against If-Match (see utils/updates.py).
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
     last_modified = db.Column(db.DateTime)
 
     # Foreign Key Columns
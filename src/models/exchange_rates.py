@@ -0,0 +1,21 @@
+from main import db
+
+class ExchangeRate(db.Model):
+
+    # Data Table Name
+    __tablename__ = "exchange_rates"
+
+    # Primary Key
+    currency_id = db.Column(db.Integer, db.ForeignKey("currencies.id", ondelete="CASCADE"), primary_key=True)
+
+    # Columns
+    # The value of one unit of the currency in US dollars, e.g. 0.65 for AUD. Prices are converted between any two
+    # currencies through it: price * rate(from) / rate(to).
+    rate = db.Column(db.Float, nullable=False)
+    last_modified = db.Column(db.DateTime)
+
+    # Relationships
+    currency = db.relationship(
+        "Currency",
+        back_populates="exchange_rate"
+    )
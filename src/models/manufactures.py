@@ -5,6 +5,13 @@ class Manufacture(db.Model):
     # Data Table Name
     __tablename__ = "manufactures"
 
+    # Indexes
+    # The primary key (location_id, project_id) covers filtering by location. Filtering by project (the suppliers of a
+    # project) needs its own index with project_id leading.
+    __table_args__ = (
+        db.Index("ix_manufactures_project_id_location_id", "project_id", "location_id"),
+    )
+
     # Primary Keys
     location_id = db.Column(db.Integer, db.ForeignKey("locations.id"), primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey("projects.id"), primary_key=True)
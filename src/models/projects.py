@@ -13,6 +13,8 @@ class Project(db.Model):
     published_date = db.Column(db.Date, nullable=True)
     description = db.Column(db.Text, nullable=True)
     certification_number = db.Column(db.String(25), nullable=True)
+    # The version counter of the project, increased by every update and checked against If-Match (see utils/updates.py).
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
     
     # Relationships
     drawings = db.relationship(
@@ -0,0 +1,56 @@
+from sqlalchemy import DDL, event
+from sqlalchemy.dialects import postgresql
+
+from main import db
+
+class TSVector(db.TypeDecorator):
+    '''
+    A tsvector column on PostgreSQL. Other databases store nothing in this column; on SQLite the search_documents_fts table
+    created below is searched instead.
+    '''
+    impl = db.Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(postgresql.TSVECTOR())
+        return dialect.type_descriptor(db.Text())
+
+
+class SearchDocument(db.Model):
+
+    # Data Table Name
+    __tablename__ = "search_documents"
+
+    # Primary Key
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Columns
+    # The searchable entry, e.g. kind="project" and entity_id=projects.id
+    kind = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.Text, nullable=True)
+    content = db.Column(db.Text, nullable=True)
+    document = db.Column(TSVector, nullable=True)
+
+    # Constraints and Indexes
+    __table_args__ = (
+        db.UniqueConstraint("kind", "entity_id"),
+        db.Index("ix_search_documents_document", "document", postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
+
+
+# SQLite fallback: a FTS5 table over the title and content columns, kept in step with search_documents by triggers.
+for statement in [
+    "CREATE VIRTUAL TABLE search_documents_fts USING fts5(title, content, content='search_documents', content_rowid='id')",
+    "CREATE TRIGGER search_documents_ai AFTER INSERT ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    "CREATE TRIGGER search_documents_ad AFTER DELETE ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(search_documents_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); END",
+    "CREATE TRIGGER search_documents_au AFTER UPDATE ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(search_documents_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); "
+    "INSERT INTO search_documents_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+]:
+    event.listen(SearchDocument.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+
+event.listen(SearchDocument.__table__, "before_drop", DDL("DROP TABLE IF EXISTS search_documents_fts").execute_if(dialect="sqlite"))
@@ -0,0 +1,13 @@
+from main import db
+
+class TableVersion(db.Model):
+
+    # Data Table Name
+    __tablename__ = "table_versions"
+
+    # Primary Key
+    table_name = db.Column(db.String(50), primary_key=True)
+
+    # Columns
+    version = db.Column(db.Integer, nullable=False, default=0)
+    last_modified = db.Column(db.DateTime(timezone=True), nullable=False)
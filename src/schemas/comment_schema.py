@@ -1,13 +1,14 @@
 from marshmallow.validate import Length
 from marshmallow import fields
 
-from main import ma
+from utils.serialisers import CompiledSchema
 
-class CommentSchema(ma.Schema):
+class CommentSchema(CompiledSchema):
     
     # Validation
     comment = fields.String(required=True, validate=Length(min=1))
     project_id = fields.Integer(required=True)
+    version = fields.Integer(dump_only=True)
 
     class Meta:
         fields = (
@@ -15,6 +16,7 @@ class CommentSchema(ma.Schema):
             "comment",
             "when_created",
             "last_edited",
+            "version",
             "project_id",
             "user_id",
             "project",
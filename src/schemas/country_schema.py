@@ -1,9 +1,9 @@
 from marshmallow.validate import Length
 from marshmallow import fields
 
-from main import ma
+from utils.serialisers import CompiledSchema
 
-class CountrySchema(ma.Schema):
+class CountrySchema(CompiledSchema):
 
     # Validation
     country = fields.String(required=True, validate=Length(min=2, max=56))
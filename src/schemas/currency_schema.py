@@ -1,9 +1,9 @@
 from marshmallow.validate import Length, And, Regexp
 from marshmallow import fields
 
-from main import ma
+from utils.serialisers import CompiledSchema
 
-class CurrencySchema(ma.Schema):
+class CurrencySchema(CompiledSchema):
 
     # Validation
     currency_abbr = fields.String(required=True, validate=And(Length(min=3, max=3), Regexp('^[A-Z]+$')))
@@ -0,0 +1,15 @@
+from utils.serialisers import CompiledSchema
+
+class DrawingRevisionSchema(CompiledSchema):
+
+    class Meta:
+        fields = (
+            "version",
+            "drawing_number",
+            "project_id",
+            "part_description",
+            "last_modified"
+        )
+
+drawing_revision_schema = DrawingRevisionSchema()
+drawing_revisions_schema = DrawingRevisionSchema(many=True)
@@ -1,14 +1,14 @@
 from marshmallow.validate import Length
 from marshmallow import fields
 
-from main import ma
+from utils.serialisers import CompiledSchema
 
-class DrawingSchema(ma.Schema):
+class DrawingSchema(CompiledSchema):
 
     # Validation
     drawing_number = fields.String(required=True, validate=Length(min=3, max=10))
     part_description = fields.String(required=False)
-    version = fields.Integer(required=False)
+    version = fields.Integer(dump_only=True)
     project_id = fields.Integer(required=True)
 
     class Meta:
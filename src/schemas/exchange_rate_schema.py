@@ -0,0 +1,23 @@
+from marshmallow.validate import Range
+from marshmallow import fields
+
+from utils.serialisers import CompiledSchema
+
+class ExchangeRateSchema(CompiledSchema):
+
+    # Validation
+    rate = fields.Float(required=True, validate=Range(min=0, min_inclusive=False))
+
+    class Meta:
+        fields = (
+            "rate",
+            "last_modified",
+            "currency"
+        )
+
+        dump_only = ["last_modified", "currency"]
+
+    currency = fields.Nested("CurrencySchema", only=("id", "currency_abbr"))
+
+exchange_rate_schema = ExchangeRateSchema()
+exchange_rates_schema = ExchangeRateSchema(many=True)
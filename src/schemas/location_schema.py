@@ -1,9 +1,9 @@
 from marshmallow.validate import Length, And, Regexp
 from marshmallow import fields
 
-from main import ma
+from utils.serialisers import CompiledSchema
 
-class LocationSchema(ma.Schema):
+class LocationSchema(CompiledSchema):
 
     # Validation
     name = fields.String(required=True, validate=Length(min=4, max=50))
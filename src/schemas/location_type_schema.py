@@ -1,9 +1,9 @@
 from marshmallow.validate import Length
 from marshmallow import fields
 
-from main import ma
+from utils.serialisers import CompiledSchema
 
-class LocationTypeSchema(ma.Schema):
+class LocationTypeSchema(CompiledSchema):
 
     # Validation
     location_type = fields.String(required=True, validate=Length(min=4, max=25))
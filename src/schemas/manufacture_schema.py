@@ -1,8 +1,8 @@
 from marshmallow import fields
 
-from main import ma
+from utils.serialisers import CompiledSchema
 
-class ManufactureSchema(ma.Schema):
+class ManufactureSchema(CompiledSchema):
 
     # Validation
     location_id = fields.Integer(required=True)
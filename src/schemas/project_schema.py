@@ -1,15 +1,16 @@
 from marshmallow.validate import Length, And, Regexp
 from marshmallow import fields
 
-from main import ma
+from utils.serialisers import CompiledSchema
 
-class ProjectSchema(ma.Schema):
+class ProjectSchema(CompiledSchema):
 
     # Validation
     title = fields.String(required=True, validate=Length(min=3, max=50))
     published_date = fields.Date(required=False)
     description = fields.String(required=False)
     certification_number = fields.String(required=False, validate=Length(min=3, max=25))
+    version = fields.Integer(dump_only=True)
     
     class Meta:
         fields = (
@@ -17,7 +18,8 @@ class ProjectSchema(ma.Schema):
             "title", 
             "published_date",
             "description",
-            "certification_number"
+            "certification_number",
+            "version"
         )
 
 project_schema = ProjectSchema()
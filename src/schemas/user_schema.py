@@ -1,9 +1,9 @@
 from marshmallow.validate import Length, And, Regexp
 from marshmallow import fields
 
-from main import ma
+from utils.serialisers import CompiledSchema
 
-class UserSchema(ma.Schema):
+class UserSchema(CompiledSchema):
 
     # Validation
     email_address = fields.Email(required=True)
@@ -29,7 +29,7 @@ class UserSchema(ma.Schema):
     location = fields.Nested("LocationSchema", only=("name","country.country"))
 
 
-class LoginSchema(ma.Schema):
+class LoginSchema(CompiledSchema):
     class Meta:
         fields = (
             "username",
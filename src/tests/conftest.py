@@ -0,0 +1,97 @@
+import datetime
+import os
+import sys
+
+import pytest
+
+# The application modules are imported from the src directory, and the configuration is chosen when config.py is imported.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["FLASK_ENV"] = "testing"
+os.environ.setdefault("JWT_SECRET_KEY", "testing-secret")
+
+from flask_jwt_extended import create_access_token
+
+from main import db, init_app
+from models import Country, Currency, LocationType, Location, User, Project, Drawing, Comment, Manufacture
+from utils.identity import identity_cache
+from utils.migrations import upgrade_schema
+
+
+@pytest.fixture
+def database_uri(tmp_path, monkeypatch):
+    '''
+    A new SQLite database file for each test.
+    '''
+    uri = f"sqlite:///{tmp_path / 'test.db'}"
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", uri)
+    return uri
+
+
+@pytest.fixture
+def app(database_uri):
+    '''
+    The application, with the current schema created in an empty database.
+    '''
+    app = init_app()
+    with app.app_context():
+        upgrade_schema()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+    identity_cache.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def records(app):
+    '''
+    One entry of each table: an admin and a regular user at a location, and a project with a drawing, a comment and a
+    supplier.
+    '''
+    country = Country(country="Australia")
+    location_type = LocationType(location_type="Workshop")
+    currency = Currency(currency_abbr="AUD")
+    db.session.add_all([country, location_type, currency])
+    db.session.commit()
+
+    location = Location(name="Balmora", admin_phone_number="+614 555 555 55", country_id=country.id, location_type_id=location_type.id)
+    db.session.add(location)
+    db.session.commit()
+
+    admin = User(username="admin", email_address="admin@example.com", password="-", is_admin=True, location_id=location.id)
+    user = User(username="user", email_address="user@example.com", password="-", is_admin=False, location_id=location.id)
+    project = Project(title="Silt Strider", published_date=datetime.date(2014, 1, 22), description="A giant insect.")
+    db.session.add_all([admin, user, project])
+    db.session.commit()
+
+    drawing = Drawing(drawing_number="SS-001", part_description="Leg assembly", version=1, last_modified=datetime.datetime.now(), project_id=project.id)
+    comment = Comment(comment="Looks good.", when_created=datetime.datetime.now(), project_id=project.id, user_id=user.id)
+    manufacture = Manufacture(location_id=location.id, project_id=project.id, price_estimate=1000.0, currency_id=currency.id)
+    db.session.add_all([drawing, comment, manufacture])
+    db.session.commit()
+
+    return {
+        "country": country.id,
+        "location_type": location_type.id,
+        "currency": currency.id,
+        "location": location.id,
+        "admin": admin.id,
+        "user": user.id,
+        "project": project.id,
+        "drawing": drawing.id,
+        "comment": comment.id,
+    }
+
+
+@pytest.fixture
+def admin_headers(app):
+    return {"Authorization": f"Bearer {create_access_token(identity='admin')}"}
+
+
+@pytest.fixture
+def user_headers(app):
+    return {"Authorization": f"Bearer {create_access_token(identity='user')}"}
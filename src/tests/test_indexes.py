@@ -0,0 +1,30 @@
+import pytest
+
+from main import db
+from models import Drawing, Comment, Manufacture
+
+# The queries of the routes that filter by a foreign key, and the index that each must be served by. Manufactures are
+# filtered by location_id with the leading column of their (location_id, project_id) primary key.
+FILTER_PATHS = {
+    "Manufacture.location_id": ("sqlite_autoindex_manufactures_1",
+        db.select(Manufacture).filter_by(location_id=1).order_by(Manufacture.location_id, Manufacture.project_id)),
+    "Manufacture.project_id": ("ix_manufactures_project_id_location_id",
+        db.select(Manufacture).filter_by(project_id=1).order_by(Manufacture.location_id, Manufacture.project_id)),
+    "Drawing.project_id": ("ix_drawings_project_id_id",
+        db.select(Drawing).filter_by(project_id=1).where(Drawing.id > 0).order_by(Drawing.id)),
+    "Comment.project_id": ("ix_comments_project_id_id",
+        db.select(Comment).filter_by(project_id=1).where(Comment.id > 0).order_by(Comment.id)),
+    "Comment.user_id": ("ix_comments_user_id_id",
+        db.select(Comment).filter_by(user_id=1).where(Comment.id > 0).order_by(Comment.id)),
+}
+
+
+@pytest.mark.parametrize("path", FILTER_PATHS)
+def test_foreign_key_filter_uses_index(app, records, path):
+    index_name, query = FILTER_PATHS[path]
+    sql = query.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True})
+    plan = [row[-1] for row in db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+    # The table is searched through the index, never scanned
+    assert any(index_name in step and step.startswith("SEARCH") for step in plan), plan
+    assert not any(step.startswith("SCAN") for step in plan), plan
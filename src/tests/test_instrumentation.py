@@ -0,0 +1,50 @@
+import pytest
+
+from utils.instrumentation import request_duration, request_queries
+
+
+def observations(metric, *labels):
+    '''
+    The number of requests a histogram has recorded with the given labels.
+    '''
+    return metric._values.get(labels, (None, 0.0, 0))[2]
+
+
+@pytest.fixture
+def failing_app(app):
+    '''
+    The application with a route that fails with an exception no error handler answers.
+    '''
+    def fail():
+        raise RuntimeError("Unhandled failure")
+
+    app.add_url_rule("/fail", "fail", fail)
+    return app
+
+
+def test_request_is_recorded_with_its_status(client, admin_headers, records):
+    labels = ("project", "project.get_project_by_id", "GET")
+    before = [observations(request_duration, *labels, status) for status in ("200", "404")]
+
+    assert client.get(f"/projects/{records['project']}", headers=admin_headers).status_code == 200
+    assert client.get("/projects/999", headers=admin_headers).status_code == 404
+
+    assert observations(request_duration, *labels, "200") == before[0] + 1
+    assert observations(request_duration, *labels, "404") == before[1] + 1
+
+
+@pytest.mark.parametrize("propagate", [True, False])
+def test_unhandled_exception_is_recorded_as_500(failing_app, propagate):
+    failing_app.config["PROPAGATE_EXCEPTIONS"] = propagate
+    labels = ("", "fail", "GET")
+    before = observations(request_duration, *labels, "500"), observations(request_queries, *labels)
+
+    client = failing_app.test_client()
+    if propagate:
+        with pytest.raises(RuntimeError):
+            client.get("/fail")
+    else:
+        assert client.get("/fail").status_code == 500
+
+    assert observations(request_duration, *labels, "500") == before[0] + 1
+    assert observations(request_queries, *labels) == before[1] + 1
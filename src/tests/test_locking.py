@@ -0,0 +1,79 @@
+import pytest
+
+# The versioned entries: URL, the key of the entry in the records fixture, and a field that can be changed
+ENTRIES = {
+    "project": ("/projects/{}", "project", "description"),
+    "drawing": ("/drawings/{}", "drawing", "part_description"),
+    "comment": ("/comments/{}", "comment", "comment"),
+}
+
+
+@pytest.fixture(params=ENTRIES)
+def entry(request, records):
+    url, key, field = ENTRIES[request.param]
+    return url.format(records[key]), field
+
+
+def test_version_increases_on_each_update(client, admin_headers, entry):
+    url, field = entry
+    assert client.get(url, headers=admin_headers).json["version"] == 1
+
+    for expected in (2, 3, 4):
+        response = client.patch(url, json={field: f"Change {expected}"}, headers=admin_headers)
+        assert response.status_code == 200
+        assert response.json["version"] == expected
+        assert response.get_etag() == (str(expected), False)
+
+
+def test_etag_changes_after_update(client, admin_headers, entry):
+    url, field = entry
+    before = client.get(url, headers=admin_headers)
+    assert before.get_etag() == ("1", False)
+
+    client.patch(url, json={field: "Changed"}, headers=admin_headers)
+    after = client.get(url, headers=admin_headers)
+    assert after.get_etag() == ("2", False)
+    assert after.json[field] == "Changed"
+
+
+@pytest.mark.parametrize("given", ["if_match", "body"])
+def test_stale_version_is_rejected(client, admin_headers, entry, given):
+    url, field = entry
+    etag = client.get(url, headers=admin_headers).headers["ETag"]
+
+    # Another client updates the entry first
+    assert client.patch(url, json={field: "First"}, headers=admin_headers).status_code == 200
+
+    if given == "if_match":
+        response = client.patch(url, json={field: "Second"}, headers={**admin_headers, "If-Match": etag})
+    else:
+        response = client.patch(url, json={field: "Second", "version": 1}, headers=admin_headers)
+    assert response.status_code == 409
+    assert response.json["version"] == 2
+
+    # The first update is kept, and the current version is accepted
+    assert client.get(url, headers=admin_headers).json[field] == "First"
+    response = client.patch(url, json={field: "Second"}, headers={**admin_headers, "If-Match": '"2"'})
+    assert response.status_code == 200
+    assert response.json["version"] == 3
+
+
+def test_mismatched_versions_are_rejected(client, admin_headers, entry):
+    url, field = entry
+    response = client.patch(url, json={field: "Changed", "version": 2}, headers={**admin_headers, "If-Match": '"1"'})
+    assert response.status_code == 400
+
+
+def test_new_drawings_start_at_version_one(client, admin_headers, records):
+    drawing = {"drawing_number": "SS-002", "project_id": records["project"]}
+    response = client.post("/drawings/", json=drawing, headers=admin_headers)
+    assert response.status_code == 201
+    assert response.json["version"] == 1
+
+    # The version is kept by the application, and cannot be given when a drawing is created
+    response = client.post("/drawings/", json={**drawing, "version": -7}, headers=admin_headers)
+    assert response.status_code == 400
+    response = client.post("/drawings/bulk", json=[drawing, {**drawing, "version": -7}], headers=admin_headers)
+    assert [result["status"] for result in response.json["results"]] == ["created", "error"]
+    history = client.get(f"/drawings/{response.json['results'][0]['id']}/history", headers=admin_headers)
+    assert [revision["version"] for revision in history.json["results"]] == [1]
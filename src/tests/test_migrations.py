@@ -0,0 +1,118 @@
+import pytest
+import sqlalchemy as sa
+
+from main import db, init_app
+from models import Country, Project, Drawing, Comment, DrawingRevision, SearchDocument, CatalogueEntry, TableVersion
+from utils.migrations import load_migrations, upgrade_schema, get_current_revision, versioned_table_names
+
+# The schema created by the old `flask db create` command (the baseline revision), before search documents, the
+# catalogue, exchange rates, version counters, drawing revisions and table versions were added.
+BASELINE_SCHEMA = [
+    "CREATE TABLE countries (id INTEGER PRIMARY KEY, country VARCHAR(56) NOT NULL UNIQUE)",
+    "CREATE TABLE currencies (id INTEGER PRIMARY KEY, currency_abbr VARCHAR(3) NOT NULL UNIQUE)",
+    "CREATE TABLE location_types (id INTEGER PRIMARY KEY, location_type VARCHAR(25) NOT NULL UNIQUE)",
+    "CREATE TABLE locations (id INTEGER PRIMARY KEY, name VARCHAR(50) NOT NULL UNIQUE, admin_phone_number VARCHAR(25) NOT NULL, "
+    "country_id INTEGER NOT NULL REFERENCES countries (id), location_type_id INTEGER NOT NULL REFERENCES location_types (id))",
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(40) NOT NULL UNIQUE, email_address VARCHAR(255) NOT NULL UNIQUE, "
+    "position VARCHAR(40), password VARCHAR NOT NULL, is_admin BOOLEAN NOT NULL, location_id INTEGER NOT NULL REFERENCES locations (id))",
+    "CREATE TABLE projects (id INTEGER PRIMARY KEY, title VARCHAR(50) NOT NULL, published_date DATE, description TEXT, "
+    "certification_number VARCHAR(25))",
+    "CREATE TABLE drawings (id INTEGER PRIMARY KEY, drawing_number VARCHAR(10) NOT NULL, part_description TEXT, version INTEGER, "
+    "last_modified DATETIME, project_id INTEGER NOT NULL REFERENCES projects (id))",
+    "CREATE TABLE comments (id INTEGER PRIMARY KEY, comment TEXT NOT NULL, when_created DATETIME, last_edited DATETIME, "
+    "project_id INTEGER NOT NULL REFERENCES projects (id), user_id INTEGER NOT NULL REFERENCES users (id))",
+    "CREATE TABLE manufactures (location_id INTEGER NOT NULL REFERENCES locations (id), project_id INTEGER NOT NULL REFERENCES projects (id), "
+    "price_estimate FLOAT NOT NULL, currency_id INTEGER NOT NULL REFERENCES currencies (id), PRIMARY KEY (location_id, project_id))",
+]
+
+BASELINE_DATA = [
+    "INSERT INTO countries VALUES (1, 'Australia')",
+    "INSERT INTO currencies VALUES (1, 'AUD')",
+    "INSERT INTO location_types VALUES (1, 'Workshop')",
+    "INSERT INTO locations VALUES (1, 'Balmora', '+614 555 555 55', 1, 1)",
+    "INSERT INTO users VALUES (1, 'admin', 'admin@example.com', NULL, '-', 1, 1)",
+    "INSERT INTO projects VALUES (1, 'Silt Strider', '2014-01-22', 'A giant insect.', NULL)",
+    "INSERT INTO drawings VALUES (1, 'SS-001', 'Leg assembly', NULL, '2023-01-10 00:00:00', 1)",
+    "INSERT INTO comments VALUES (1, 'Looks good.', '2023-01-10 00:00:00', NULL, 1, 1)",
+    "INSERT INTO manufactures VALUES (1, 1, 1000.0, 1)",
+]
+
+
+@pytest.fixture
+def legacy_app(database_uri):
+    '''
+    The application, with a database created by the old `flask db create` command and not yet upgraded.
+    '''
+    engine = sa.create_engine(database_uri)
+    with engine.begin() as connection:
+        for statement in BASELINE_SCHEMA + BASELINE_DATA:
+            connection.exec_driver_sql(statement)
+    engine.dispose()
+
+    app = init_app()
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def table_names():
+    return set(sa.inspect(db.engine).get_table_names())
+
+
+def test_empty_database_is_created_at_latest_revision(app):
+    with db.engine.connect() as connection:
+        assert get_current_revision(connection) == load_migrations()[-1].revision
+    assert set(db.session.scalars(db.select(TableVersion.table_name))) == set(versioned_table_names())
+
+
+def test_legacy_database_is_upgraded(legacy_app):
+    applied = upgrade_schema()
+
+    scripts = load_migrations()
+    assert [script.revision for script in applied] == [script.revision for script in scripts]
+    with db.engine.connect() as connection:
+        assert get_current_revision(connection) == scripts[-1].revision
+
+    # The existing entries are carried into the new tables
+    assert db.session.get(Project, 1).version == 1
+    assert db.session.get(Drawing, 1).version == 1
+    assert db.session.get(Comment, 1).version == 1
+    assert {(document.kind, document.entity_id) for document in db.session.scalars(db.select(SearchDocument))} == {
+        ("project", 1), ("drawing", 1), ("comment", 1)
+        }
+    assert db.session.scalars(db.select(CatalogueEntry)).one().project_title == "Silt Strider"
+    assert db.session.scalars(db.select(DrawingRevision)).one().part_description == "Leg assembly"
+    assert db.session.scalar(db.text("SELECT rowid FROM search_documents_fts WHERE search_documents_fts MATCH 'insect'")) is not None
+
+    # Every table has a version, increased by the upgrade, and writes keep them up to date
+    versions = {entry.table_name: entry.version for entry in db.session.scalars(db.select(TableVersion))}
+    assert versions["projects"] >= 1 and versions["catalogue_entries"] >= 1
+    db.session.add(Country(country="Canada"))
+    db.session.commit()
+    assert db.session.get(TableVersion, "countries").version == versions["countries"] + 1
+
+    # Nothing is left to apply
+    assert upgrade_schema() == []
+
+
+def test_failed_revision_is_rolled_back(legacy_app, monkeypatch):
+    scripts = {script.revision: script for script in load_migrations()}
+    upgrade = scripts["0003"].upgrade
+
+    def failing_upgrade(connection):
+        upgrade(connection)
+        raise RuntimeError("Revision failed")
+
+    monkeypatch.setattr(scripts["0003"], "upgrade", failing_upgrade)
+    with pytest.raises(RuntimeError):
+        upgrade_schema()
+
+    # The tables created by the failed revision are removed, and the database stays at the revision before it
+    assert not {"search_documents", "search_documents_fts"} & table_names()
+    with db.engine.connect() as connection:
+        assert get_current_revision(connection) == "0002"
+
+    monkeypatch.setattr(scripts["0003"], "upgrade", upgrade)
+    upgrade_schema()
+    assert db.session.scalar(db.select(db.func.count()).select_from(SearchDocument)) == 3
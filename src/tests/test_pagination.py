@@ -0,0 +1,115 @@
+import base64
+import datetime
+import json
+
+import pytest
+from werkzeug.exceptions import BadRequest
+
+from main import db
+from models import Project, Location, Manufacture
+from utils.pagination import encode_cursor, decode_cursor, cursor_value
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("utf-8")
+
+
+def read_pages(client, headers, url, limit, **params):
+    '''
+    Follows the next_cursor of a list route from the first page to the last, and returns every row.
+    '''
+    rows = []
+    cursor = None
+    while True:
+        response = client.get(url, query_string={**params, "limit": limit, **({"after": cursor} if cursor else {})}, headers=headers)
+        assert response.status_code == 200, response.json
+        rows.extend(response.json["results"])
+        cursor = response.json["next_cursor"]
+        if cursor is None:
+            return rows
+        assert len(response.json["results"]) == limit
+
+
+@pytest.mark.parametrize("values", [
+    [1],
+    [3, 7],
+    ["Silt Strider", 12],
+    [None, 4],
+    [1250.5, 2, 9],
+])
+def test_cursor_round_trip(values):
+    cursor = encode_cursor(values)
+    assert not set(cursor) & set("+/&?")
+    assert decode_cursor(cursor, len(values)) == values
+
+
+def test_cursor_round_trip_of_dates(app):
+    cursor = encode_cursor([datetime.date(2014, 1, 22), 5])
+    date, entity_id = decode_cursor(cursor, 2)
+    assert cursor_value(Project.published_date, date) == datetime.date(2014, 1, 22)
+    assert cursor_value(Project.id, entity_id) == 5
+
+
+@pytest.mark.parametrize("cursor, key_count", [
+    ("not a cursor!", 1),
+    (raw_cursor({"id": 1}), 1),
+    (raw_cursor([1, 2]), 1),
+    (raw_cursor([[1]]), 1),
+    (base64.urlsafe_b64encode(b"\xff\xfe").decode("utf-8"), 1),
+])
+def test_bad_cursor_is_rejected(cursor, key_count):
+    with pytest.raises(BadRequest):
+        decode_cursor(cursor, key_count)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    raw_cursor([1, 2]),
+    raw_cursor(["first"]),
+    raw_cursor([True]),
+])
+def test_bad_cursor_returns_400(client, admin_headers, records, cursor):
+    response = client.get("/projects/", query_string={"after": cursor}, headers=admin_headers)
+    assert response.status_code == 400
+
+
+def test_descending_order_with_empty_values_last(client, admin_headers, records):
+    dates = [datetime.date(2020, 1, 1), None, datetime.date(2023, 5, 1), datetime.date(2020, 1, 1), None,
+        datetime.date(2018, 7, 9), datetime.date(2023, 5, 1), None, datetime.date(2020, 1, 1), datetime.date(2010, 2, 3)]
+    db.session.add_all([Project(title=f"Project {number}", published_date=date) for number, date in enumerate(dates)])
+    db.session.commit()
+
+    projects = db.session.scalars(db.select(Project)).all()
+    dated = sorted((project for project in projects if project.published_date), key=lambda project: (-project.published_date.toordinal(), project.id))
+    undated = sorted((project for project in projects if not project.published_date), key=lambda project: project.id)
+    expected = [project.id for project in dated + undated]
+
+    for limit in (1, 2, 3, 4, len(expected) - 1, len(expected), len(expected) + 1):
+        rows = read_pages(client, admin_headers, "/projects/", limit, sort="-published_date", fields="id,published_date")
+        # Every row is returned once, in order, whichever rows the pages end on
+        assert [row["id"] for row in rows] == expected
+
+
+def test_composite_key_pages(client, admin_headers, records):
+    locations = [
+        Location(name=f"Location {number}", admin_phone_number="+614 555 555 55", country_id=records["country"], location_type_id=records["location_type"])
+        for number in range(3)
+        ]
+    projects = [Project(title=f"Project {number}") for number in range(3)]
+    db.session.add_all(locations + projects)
+    db.session.commit()
+    db.session.add_all([
+        Manufacture(location_id=location.id, project_id=project.id, price_estimate=100.0 * (index % 4), currency_id=records["currency"])
+        for index, (location, project) in enumerate((location, project) for location in locations for project in projects)
+        ])
+    db.session.commit()
+
+    manufactures = db.session.scalars(db.select(Manufacture)).all()
+    by_key = sorted((manufacture.location_id, manufacture.project_id) for manufacture in manufactures)
+    by_price = [key for _, key in sorted((manufacture.price_estimate, (manufacture.location_id, manufacture.project_id)) for manufacture in manufactures)]
+
+    for limit in (1, 2, 3, 4):
+        rows = read_pages(client, admin_headers, "/manufactures/", limit)
+        assert [(row["location"]["id"], row["project"]["id"]) for row in rows] == by_key
+        rows = read_pages(client, admin_headers, "/manufactures/", limit, sort="price_estimate")
+        assert [(row["location"]["id"], row["project"]["id"]) for row in rows] == by_price
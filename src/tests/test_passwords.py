@@ -0,0 +1,27 @@
+import pytest
+
+from utils.passwords import PasswordHasher
+
+
+@pytest.fixture
+def busy_hasher(app):
+    '''
+    A password hasher whose worker and queue are taken, so every hash is turned away at once.
+    '''
+    hasher = PasswordHasher(workers=1, queue_size=0, queue_timeout=0)
+    hasher._slots.acquire()
+    app.extensions["password_hasher"] = hasher
+    yield hasher
+    del app.extensions["password_hasher"]
+
+
+def test_busy_hasher_returns_json_503(client, user_headers, records, busy_hasher):
+    responses = [
+        client.post("/auth/register", json={"username": "newuser", "email_address": "new@example.com", "password": "Secret123!",
+            "location_id": records["location"]}),
+        client.post("/auth/login", json={"username": "user", "password": "Secret123!"}),
+        client.patch("/users/update_info/", json={"position": "Engineer", "password": "Secret456!"}, headers=user_headers),
+    ]
+    for response in responses:
+        assert response.status_code == 503, response.json
+        assert response.json == {"error": "The server is handling too many logins. Please try again shortly."}
@@ -0,0 +1,26 @@
+from sqlalchemy import event
+
+from main import db
+from models import ExchangeRate
+
+
+def test_table_versions_are_read_once_per_request(client, user_headers, records):
+    db.session.add(ExchangeRate(currency_id=records["currency"], rate=0.65))
+    db.session.commit()
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record_statement)
+    try:
+        # The first request computes and caches the summaries, the second is served from the cache
+        for _ in range(2):
+            statements.clear()
+            response = client.get("/projects/supplier_prices", query_string={"currency": "AUD"}, headers=user_headers)
+            assert response.status_code == 200
+            assert response.json["results"][0]["offers"] == 1
+            assert sum("FROM table_versions" in statement for statement in statements) == 1
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record_statement)
@@ -0,0 +1,64 @@
+import pytest
+
+from main import db
+from models import DrawingRevision
+from utils.revisions import SNAPSHOT_INTERVAL, encode_delta, apply_delta
+
+
+@pytest.mark.parametrize("old, new", [
+    ("Leg assembly, left side", "Leg assembly, right side"),
+    ("Leg assembly with a long description of the welded joints", "Leg assembly with a description of the bolted joints"),
+    ("Chitin plate, 5 mm", "Chitin plate, 5 mm"),
+    ("Hull plate – étagère Ø 12 mm, \"polished\"", "Hull plate – étagère Ø 14 mm, \"polished\" ✓"),
+    ("A" * 200, "A" * 100 + "B" + "A" * 99),
+    ("Old description [1, -2]", "Old description [1, -2, \"x\"]"),
+])
+def test_delta_round_trip(old, new):
+    delta = encode_delta(old, new)
+    assert delta is not None and len(delta) < len(new)
+    assert apply_delta(old, delta) == new
+
+
+@pytest.mark.parametrize("old, new", [
+    ("", "New description"),
+    ("Old description", ""),
+    ("abc", "xyz"),
+    ("step asm", "step assembly"),
+])
+def test_delta_of_changed_text_is_not_stored(old, new):
+    # The description is stored in full when the delta would be no shorter than it
+    assert encode_delta(old, new) is None
+
+
+def test_history_across_snapshot_boundary(client, admin_headers, records):
+    url = f"/drawings/{records['drawing']}"
+
+    # Small edits to a long description are stored as deltas, with a snapshot every SNAPSHOT_INTERVAL revisions
+    descriptions = ["Leg assembly"]
+    count = 2 * SNAPSHOT_INTERVAL + 5
+    for number in range(2, count + 1):
+        description = f"Leg assembly of the silt strider, revision {number}, with {number % 7} reinforcing ribs."
+        assert client.patch(url, json={"part_description": description}, headers=admin_headers).status_code == 200
+        descriptions.append(description)
+
+    revisions = db.session.scalars(db.select(DrawingRevision).order_by(DrawingRevision.version)).all()
+    assert [revision.version for revision in revisions] == list(range(1, count + 1))
+    assert any(revision.part_description_delta is not None for revision in revisions)
+    snapshots = [revision.version for revision in revisions if revision.part_description_delta is None]
+    assert all(later - earlier <= SNAPSHOT_INTERVAL for earlier, later in zip(snapshots, snapshots[1:] + [count + 1]))
+
+    # Every page rebuilds its descriptions, whichever revision of a delta chain it starts at
+    for limit in (1, 5, SNAPSHOT_INTERVAL - 1, SNAPSHOT_INTERVAL, SNAPSHOT_INTERVAL + 1, 100):
+        history = []
+        cursor = None
+        while True:
+            query = {"limit": limit, **({"after": cursor} if cursor else {})}
+            response = client.get(f"{url}/history", query_string=query, headers=admin_headers)
+            assert response.status_code == 200
+            history.extend(response.json["results"])
+            cursor = response.json["next_cursor"]
+            if cursor is None:
+                break
+
+        assert [revision["version"] for revision in history] == list(range(1, count + 1))
+        assert [revision["part_description"] for revision in history] == descriptions
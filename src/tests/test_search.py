@@ -0,0 +1,22 @@
+from main import db
+from models import Comment
+from utils.search import highlight_html, HIGHLIGHT_START, HIGHLIGHT_STOP
+
+
+def test_highlight_is_escaped_before_marks_are_added():
+    fragment = f'<b>Bolt</b> the {HIGHLIGHT_START}chitin{HIGHLIGHT_STOP} plate & "weld" it'
+    assert highlight_html(fragment) == '&lt;b&gt;Bolt&lt;/b&gt; the <mark>chitin</mark> plate &amp; &quot;weld&quot; it'
+    assert highlight_html(None) is None
+
+
+def test_search_results_escape_entry_text(client, user_headers, records):
+    db.session.add(Comment(comment='<script>alert("chitin")</script> <mark>chitin</mark> plates', project_id=records["project"], user_id=records["user"]))
+    db.session.commit()
+
+    response = client.get("/search/", query_string={"q": "chitin", "type": "comment"}, headers=user_headers)
+    assert response.status_code == 200
+    (result,) = response.json["results"]
+    assert "<script>" not in result["highlight"]
+    assert result["highlight"].count("<mark>") == result["highlight"].count("</mark>") == 2
+    assert result["highlight"].startswith("&lt;script&gt;alert(&quot;<mark>chitin</mark>&quot;)&lt;/script&gt;")
+    assert "&lt;mark&gt;<mark>chitin</mark>&lt;/mark&gt;" in result["highlight"]
@@ -0,0 +1,42 @@
+import sqlalchemy as sa
+
+from main import db
+from models import Country, TableVersion
+
+
+def committed_version(table_name):
+    # Read on a connection of its own, to see what other requests see
+    with db.engine.connect() as connection:
+        return connection.scalar(sa.select(TableVersion.version).where(TableVersion.table_name == table_name))
+
+
+def test_versions_are_increased_after_commit(app):
+    before = committed_version("countries")
+
+    db.session.add(Country(country="Canada"))
+    db.session.flush()
+    # The table_versions row is not written, and so not locked, by the transaction that changed the table
+    assert committed_version("countries") == before
+    assert db.session.scalar(sa.select(TableVersion.version).where(TableVersion.table_name == "countries")) == before
+
+    db.session.commit()
+    assert committed_version("countries") == before + 1
+
+
+def test_versions_are_kept_after_rollback(app):
+    before = committed_version("countries")
+
+    db.session.add(Country(country="Canada"))
+    db.session.flush()
+    db.session.rollback()
+
+    db.session.add(Country(country="Australia"))
+    db.session.commit()
+    assert committed_version("countries") == before + 1
+
+
+def test_versions_of_core_writes_are_increased_after_commit(client, admin_headers, records):
+    before = committed_version("drawings"), committed_version("drawing_revisions")
+    response = client.post("/drawings/bulk", json=[{"drawing_number": "SS-002", "project_id": records["project"]}], headers=admin_headers)
+    assert response.status_code == 201
+    assert (committed_version("drawings"), committed_version("drawing_revisions")) == (before[0] + 1, before[1] + 1)
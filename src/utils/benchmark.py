@@ -0,0 +1,283 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import json
+from sqlalchemy import event
+from urllib.parse import urlsplit
+from werkzeug.exceptions import NotFound
+from werkzeug.routing import RequestRedirect
+import math
+import time
+import urllib.error
+import urllib.request
+
+from main import db
+from models import Project, Drawing, Comment, Manufacture, Location
+from schemas.project_schema import projects_schema
+from schemas.drawing_schema import drawings_schema
+from schemas.comment_schema import comments_schema
+from schemas.manufacture_schema import manufactures_schema
+from schemas.location_schema import locations_schema
+from utils.json_provider import JSON_PROVIDERS, orjson
+from utils.loading import eager_load_options
+from utils.serialisers import CompiledSchema
+
+# The list schemas whose output is serialised by the serialisation benchmarks
+SERIALISATION_SCHEMAS = {
+    "projects": (Project, projects_schema),
+    "drawings": (Drawing, drawings_schema),
+    "comments": (Comment, comments_schema),
+    "manufactures": (Manufacture, manufactures_schema),
+    "locations": (Location, locations_schema),
+}
+
+# Values substituted for the placeholders of the homepage route listing, e.g. GET /projects/<id> -> GET /projects/1
+ROUTE_PARAMETERS = {"<id>": "1", "<id1>": "1", "<id2>": "1", "<text>": "steel"}
+
+
+def benchmark_routes(app):
+    '''
+    This helper function returns the url of every GET route listed on the homepage (see
+    controllers/homepage_controller.py), with its placeholders filled in and redirects (e.g. a missing trailing slash)
+    resolved against the url map of the application. Only GET routes are benchmarked, so that runs do not change the
+    dataset and can be repeated and compared.
+    '''
+    listing = app.test_client().get("/").get_json()
+    adapter = app.url_map.bind("localhost")
+    urls = []
+
+    for description in listing.values():
+        if not description.startswith("GET "):
+            continue
+
+        url = description[len("GET "):]
+        for placeholder, value in ROUTE_PARAMETERS.items():
+            url = url.replace(placeholder, value)
+
+        path, _, query_string = url.partition("?")
+        try:
+            adapter.match(path, method="GET")
+        except RequestRedirect as e:
+            path = urlsplit(e.new_url).path
+        except NotFound:
+            continue
+        urls.append(f"{path}?{query_string}" if query_string else path)
+
+    return urls
+
+
+def percentile(ordered, fraction):
+    # Nearest-rank percentile of a sorted list
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarise(latencies, elapsed, queries=None):
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "requests_per_second": len(ordered) / elapsed if elapsed else 0.0,
+        "queries_per_request": None if queries is None else queries / len(ordered),
+    }
+
+
+def run_test_client(app, urls, headers, requests):
+    '''
+    This function requests each url `requests` times, one after another, through the Flask test client, and returns the
+    latency, throughput and database statements per request of each url. The application runs in this process, so the
+    statements are counted on the database engine directly.
+    '''
+    client = app.test_client()
+    statements = [0]
+
+    def count_statement(*args):
+        statements[0] += 1
+
+    results = {}
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        for url in urls:
+            # The first request warms the caches of the route (eager loading options, reference tables, ...).
+            status = client.get(url, headers=headers).status_code
+
+            latencies = []
+            statements[0] = 0
+            start = time.perf_counter()
+            for _ in range(requests):
+                request_start = time.perf_counter()
+                client.get(url, headers=headers)
+                latencies.append(time.perf_counter() - request_start)
+            results[url] = {"status": status, **summarise(latencies, time.perf_counter() - start, statements[0])}
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    return results
+
+
+def run_http_load(base_url, urls, headers, requests, concurrency):
+    '''
+    This function sends `requests` requests to each url of a running server, `concurrency` at a time, and returns the
+    latency and throughput of each url. Requests that fail or time out are counted as errors.
+    '''
+    def fetch(url):
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(urllib.request.Request(base_url + url, headers=headers), timeout=30) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except OSError:
+            status = None
+        return status, time.perf_counter() - start
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        for url in urls:
+            fetch(url)
+
+            start = time.perf_counter()
+            responses = list(clients.map(fetch, [url] * requests))
+            elapsed = time.perf_counter() - start
+
+            statuses = [status for status, _ in responses]
+            results[url] = {
+                "status": max(set(statuses), key=statuses.count),
+                "errors": sum(1 for status in statuses if status is None or status >= 500),
+                **summarise([latency for _, latency in responses], elapsed),
+                }
+
+    return results
+
+
+def http_login(base_url, username, password):
+    body = json.dumps({"username": username, "password": password}).encode("utf-8")
+    request = urllib.request.Request(base_url + "/auth/login", data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())["access_token"]
+
+
+def format_report(results):
+    lines = [f"{'route':<40} {'status':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'queries':>8} {'errors':>6}"]
+    for url, result in results.items():
+        queries = "-" if result["queries_per_request"] is None else f"{result['queries_per_request']:.1f}"
+        lines.append(
+            f"{url:<40} {result['status']!s:>6} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+            f"{result['requests_per_second']:>8.1f} {queries:>8} {result.get('errors', '-')!s:>6}")
+    return "\n".join(lines)
+
+
+def compare_results(baseline, results, tolerance, min_delta_ms):
+    '''
+    This helper function compares a benchmark run with a saved baseline run (e.g. from the main branch), and returns a
+    description of each regression:
+
+    - the p95 latency of a route rose by more than `tolerance` percent, and by at least `min_delta_ms` milliseconds so that
+    timer noise on very fast routes is ignored;
+    - the throughput of a route fell by more than `tolerance` percent, and the time per request rose by at least
+    `min_delta_ms` milliseconds;
+    - a route runs more database statements per request than before.
+
+    Routes that are not in the baseline are skipped.
+    '''
+    regressions = []
+    for url, result in results.items():
+        before = baseline.get(url)
+        if before is None:
+            continue
+
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance / 100) and result["p95_ms"] - before["p95_ms"] >= min_delta_ms:
+            regressions.append(f"{url}: p95 latency {before['p95_ms']:.2f} ms -> {result['p95_ms']:.2f} ms")
+        if (result["requests_per_second"] < before["requests_per_second"] * (1 - tolerance / 100)
+                and 1000 / result["requests_per_second"] - 1000 / before["requests_per_second"] >= min_delta_ms):
+            regressions.append(f"{url}: throughput {before['requests_per_second']:.1f} -> {result['requests_per_second']:.1f} req/s")
+        if None not in (result["queries_per_request"], before["queries_per_request"]) and result["queries_per_request"] > before["queries_per_request"]:
+            regressions.append(f"{url}: queries per request {before['queries_per_request']:.1f} -> {result['queries_per_request']:.1f}")
+
+    return regressions
+
+
+
+def load_serialisation_rows(rows):
+    '''
+    This helper function reads up to `rows` entries of each table in SERIALISATION_SCHEMAS, with the relationships its
+    schema dumps loaded, so that serialisation can be timed without database statements.
+    '''
+    return {
+        name: db.session.scalars(db.select(model).options(*eager_load_options(schema, model)).limit(rows)).all()
+        for name, (model, schema) in SERIALISATION_SCHEMAS.items()
+    }
+
+
+def best_time(function, repeat):
+    # The fastest of `repeat` runs, in milliseconds; slower runs are mostly other processes competing for the CPU.
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def compare_json_backends(app, entries, repeat):
+    '''
+    This function dumps the entries of each list schema once, then times building a json response from the dumped list
+    with each JSON provider (see utils/json_provider.py), the same way jsonify(results=...) does in the list routes. The
+    responses of every provider are decoded and checked to hold the same data.
+    '''
+    providers = {name: provider(app) for name, provider in JSON_PROVIDERS.items() if name == "json" or orjson is not None}
+    results = {}
+    for name, items in entries.items():
+        payload = SERIALISATION_SCHEMAS[name][1].dump(items)
+        bodies = {backend: provider.response(results=payload).get_data() for backend, provider in providers.items()}
+        if any(json.loads(body) != json.loads(bodies["json"]) for body in bodies.values()):
+            raise ValueError(f"The JSON providers return different data for {name}.")
+
+        results[name] = {
+            "rows": len(items),
+            "bytes": len(bodies["json"]),
+            **{f"{backend}_ms": best_time(lambda: provider.response(results=payload), repeat) for backend, provider in providers.items()},
+            }
+    return results
+
+
+def compare_serialisers(entries, repeat):
+    '''
+    This function times dumping the entries of each list schema with marshmallow's generic serialisation and with the
+    compiled serialisers (see utils/serialisers.py). The json of both dumps, with keys in the order they were dumped, is
+    checked to be identical.
+    '''
+    def dump(schema, items, compiled):
+        CompiledSchema.compiled = compiled
+        try:
+            return schema.dump(items)
+        finally:
+            CompiledSchema.compiled = True
+
+    results = {}
+    for name, items in entries.items():
+        schema = SERIALISATION_SCHEMAS[name][1]
+        body = json.dumps(dump(schema, items, False), sort_keys=False)
+        if json.dumps(dump(schema, items, True), sort_keys=False) != body:
+            raise ValueError(f"The compiled serialiser of {name} does not give the same output as marshmallow.")
+
+        results[name] = {
+            "rows": len(items),
+            "bytes": len(body),
+            "marshmallow_ms": best_time(lambda: dump(schema, items, False), repeat),
+            "compiled_ms": best_time(lambda: dump(schema, items, True), repeat),
+            }
+    return results
+
+
+def format_serialisation_report(results):
+    columns = [column for column in next(iter(results.values())) if column.endswith("_ms")]
+    lines = [f"{'schema':<15} {'rows':>8} {'bytes':>10} " + " ".join(f"{column:>14}" for column in columns) + f" {'speedup':>8}"]
+    for name, result in results.items():
+        times = [result[column] for column in columns]
+        lines.append(
+            f"{name:<15} {result['rows']:>8} {result['bytes']:>10} " + " ".join(f"{value:>14.2f}" for value in times)
+            + f" {times[0] / times[-1] if times[-1] else 0:>7.1f}x")
+    return "\n".join(lines)
@@ -0,0 +1,170 @@
+from flask import current_app, jsonify, request
+from marshmallow.exceptions import ValidationError
+from werkzeug.exceptions import BadRequest
+from sqlalchemy.dialects import postgresql, sqlite
+import json
+
+from main import db
+from models import Drawing
+from utils.table_versions import bump_table_versions
+from utils.search import SEARCHABLE, build_document, index_documents
+from utils.catalogue import CATALOGUE_SOURCES, catalogue_key, refresh_catalogue
+from utils.revisions import snapshot_revisions
+
+
+def read_bulk_items():
+    '''
+    This helper function reads the entries sent to a bulk route. The request body can either be a json array of objects,
+    or a stream of newline delimited json objects (one per line) with the content type "application/x-ndjson". Up to
+    BULK_MAX_ITEMS entries are accepted in a single request.
+    '''
+    max_items = current_app.config["BULK_MAX_ITEMS"]
+
+    if request.mimetype == "application/x-ndjson":
+        items = []
+        for line_number, line in enumerate(request.stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise BadRequest(f"Line {line_number} of the request body is not valid json.")
+            if len(items) > max_items:
+                break
+    else:
+        items = request.get_json()
+
+    if not isinstance(items, list) or not items:
+        raise BadRequest("The request body must be a non-empty json array, or newline delimited json objects.")
+    if len(items) > max_items:
+        raise BadRequest(f"A maximum of {max_items} entries can be sent in a single request.")
+
+    return items
+
+
+def load_bulk_items(schema, items):
+    '''
+    This helper function validates every entry with a plural (many=True) schema in a single pass. A tuple is returned of
+    the valid entries as a dictionary of index -> loaded data, and the validation errors as a dictionary of index -> error
+    messages. The index is the position of the entry in the request, so that results can be matched up by the client.
+    '''
+    try:
+        loaded = schema.load(items)
+        return dict(enumerate(loaded)), {}
+    except ValidationError as e:
+        errors = {index: messages for index, messages in e.messages.items() if isinstance(index, int)}
+        if len(errors) < len(e.messages):
+            # Errors that are not tied to a single entry, e.g. an entry that is not a json object.
+            raise
+        valid = {index: data for index, data in enumerate(e.valid_data) if index not in errors}
+        return valid, errors
+
+
+def check_foreign_keys(model, rows, errors):
+    '''
+    This helper function checks that every foreign key of the valid entries refers to an existing entry, so that a single
+    bad id is reported against its own entry instead of failing the whole insert with an IntegrityError. One query is used
+    per foreign key column, whatever the number of entries. Entries with a missing reference are moved from rows to errors.
+
+    Database statement (per foreign key column): SELECT id FROM table WHERE id IN (ids);
+    '''
+    for foreign_key in model.__table__.foreign_keys:
+        name = foreign_key.parent.key
+        ids = {data[name] for data in rows.values() if data.get(name) is not None}
+        if not ids:
+            continue
+
+        query = db.select(foreign_key.column).where(foreign_key.column.in_(ids))
+        existing = set(db.session.scalars(query))
+        for index in [index for index, data in rows.items() if data.get(name) is not None and data[name] not in existing]:
+            errors.setdefault(index, {})[name] = [f"A {foreign_key.column.table.name} entry with id={rows[index][name]} does not exist."]
+            del rows[index]
+
+
+def drop_duplicate_keys(model, rows, errors):
+    '''
+    This helper function finds entries that share a primary key with a later entry in the same request, e.g. two offers
+    for the same location and project. Only the last of them is kept, as if they had been sent one after another, and
+    the earlier ones are reported as errors. A single INSERT ... ON CONFLICT statement cannot update the same row twice.
+    '''
+    key_names = [column.key for column in model.__table__.primary_key]
+    last_index = {}
+    for index, data in rows.items():
+        last_index[tuple(data.get(name) for name in key_names)] = index
+
+    for index in [index for index, data in rows.items() if last_index[tuple(data.get(name) for name in key_names)] != index]:
+        later = last_index[tuple(rows[index].get(name) for name in key_names)]
+        errors[index] = {"_schema": [f"Entry {later} has the same {' and '.join(key_names)}, and replaces this entry."]}
+        del rows[index]
+
+
+def bulk_insert(model, rows):
+    '''
+    This helper function inserts the valid entries with a single multi-row INSERT statement, and returns the new primary
+    key of each entry in the same order as the entries were given. The table version is increased for conditional GET
+    requests, projects and drawings are added to the search documents, and drawings are recorded as their first revision,
+    because Core statements bypass the ORM flush events.
+
+    Database statement: INSERT INTO table (columns) VALUES (...), (...), ... RETURNING id;
+    '''
+    if not rows:
+        return []
+
+    statement = db.insert(model).returning(model.id, sort_by_parameter_order=True)
+    ids = list(db.session.scalars(statement, rows))
+    bump_table_versions(db.session.connection(), [model.__tablename__])
+
+    # Searchable entries are added to the search documents here too, for the same reason.
+    if model in SEARCHABLE:
+        index_documents(db.session.connection(), [build_document(model, id, data) for id, data in zip(ids, rows)])
+    if model is Drawing:
+        snapshot_revisions(db.session.connection(), Drawing.id.in_(ids))
+    return ids
+
+
+def bulk_upsert(model, rows, update_columns):
+    '''
+    This helper function inserts the valid entries with a single INSERT ... ON CONFLICT statement. Entries whose primary
+    key already exists have the given columns updated instead. PostgreSQL and SQLite are supported natively; other
+    databases fall back to merging the entries one at a time.
+
+    Database statement: INSERT INTO table (columns) VALUES (...), (...), ...
+    ON CONFLICT (primary key) DO UPDATE SET column=excluded.column, ...;
+    '''
+    if not rows:
+        return
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        statement = insert(model)
+        statement = statement.on_conflict_do_update(
+            index_elements=[column.name for column in model.__table__.primary_key],
+            set_={name: statement.excluded[name] for name in update_columns}
+            )
+        db.session.execute(statement, rows)
+        bump_table_versions(db.session.connection(), [model.__tablename__])
+
+        # The catalogue entries built from these entries are refreshed here too, because Core statements bypass the ORM
+        # flush events.
+        if model in CATALOGUE_SOURCES:
+            refresh_catalogue(db.session.connection(), {model: {catalogue_key(model, data) for data in rows}})
+    else:
+        for data in rows:
+            db.session.merge(model(**data))
+
+
+def bulk_response(results, errors, total):
+    '''
+    This helper function builds the response of a bulk route. Each entry in the request gets one result, in request order,
+    with either its status or its error messages. The status code is 201 if every entry succeeded, 207 Multi-Status if only
+    some did, and 400 if none did.
+    '''
+    for index, messages in errors.items():
+        results[index] = {"index": index, "status": "error", "errors": messages}
+
+    ordered = [results[index] for index in sorted(results)]
+    succeeded = total - len(errors)
+    status = 201 if not errors else 207 if succeeded else 400
+
+    return jsonify(results=ordered, succeeded=succeeded, failed=len(errors)), status
@@ -0,0 +1,126 @@
+from sqlalchemy import event, inspect, or_, tuple_
+from sqlalchemy.orm import Session
+
+from main import db
+from models import Manufacture, Project, Location, Country, Currency, CatalogueEntry
+from utils.table_versions import bump_table_versions
+
+# The models that catalogue entries are built from, and the columns of each that appear in an entry. Updates to other
+# columns (e.g. a project description) leave the catalogue as it is.
+CATALOGUE_SOURCES = {
+    Manufacture: ("price_estimate", "currency_id"),
+    Project: ("title",),
+    Location: ("name", "admin_phone_number", "country_id"),
+    Country: ("country",),
+    Currency: ("currency_abbr",),
+}
+
+
+def catalogue_query():
+    '''
+    This helper function returns the query that builds catalogue entries from the manufactures table and the tables it
+    refers to, in the column order of the catalogue_entries table.
+    '''
+    return (
+        db.select(
+            Manufacture.location_id,
+            Manufacture.project_id,
+            Manufacture.price_estimate,
+            Manufacture.currency_id,
+            Project.title,
+            Location.name,
+            Location.admin_phone_number,
+            Country.country,
+            Currency.currency_abbr,
+            )
+        .join(Manufacture.project)
+        .join(Manufacture.location)
+        .join(Location.country)
+        .join(Manufacture.currency)
+        )
+
+
+def insert_catalogue_entries(connection, query):
+    columns = ["location_id", "project_id", "price_estimate", "currency_id", "project_title", "location_name",
+        "admin_phone_number", "country", "currency_abbr"]
+    connection.execute(db.insert(CatalogueEntry).from_select(columns, query))
+
+
+def refresh_catalogue(connection, changes):
+    '''
+    This helper function rebuilds the catalogue entries affected by changed entries of the source tables. `changes` maps
+    each changed model to the primary keys of its changed entries, e.g. {Project: {1, 2}, Manufacture: {(1, 3)}}. The
+    affected entries are deleted and built again from the source tables, which also removes the entries of deleted rows,
+    and the version of the catalogue_entries table is increased for conditional GET requests.
+
+    Database statements:
+    DELETE FROM catalogue_entries WHERE (location_id, project_id) IN (keys) OR project_id IN (ids) OR ...;
+    INSERT INTO catalogue_entries SELECT ... FROM manufactures JOIN projects ... WHERE (location_id, project_id) IN (keys) OR ...;
+    '''
+    changes = {model: keys for model, keys in changes.items() if keys}
+    if not changes:
+        return
+
+    countries = db.select(Location.id).where(Location.country_id.in_(changes.get(Country, ())))
+    entry_conditions = {
+        Manufacture: lambda keys: tuple_(CatalogueEntry.location_id, CatalogueEntry.project_id).in_(keys),
+        Project: lambda keys: CatalogueEntry.project_id.in_(keys),
+        Location: lambda keys: CatalogueEntry.location_id.in_(keys),
+        Country: lambda keys: CatalogueEntry.location_id.in_(countries),
+        Currency: lambda keys: CatalogueEntry.currency_id.in_(keys),
+    }
+    source_conditions = {
+        Manufacture: lambda keys: tuple_(Manufacture.location_id, Manufacture.project_id).in_(keys),
+        Project: lambda keys: Manufacture.project_id.in_(keys),
+        Location: lambda keys: Manufacture.location_id.in_(keys),
+        Country: lambda keys: Location.country_id.in_(keys),
+        Currency: lambda keys: Manufacture.currency_id.in_(keys),
+    }
+
+    connection.execute(db.delete(CatalogueEntry).where(or_(*[entry_conditions[model](list(keys)) for model, keys in changes.items()])))
+    insert_catalogue_entries(connection, catalogue_query().where(or_(*[source_conditions[model](list(keys)) for model, keys in changes.items()])))
+    bump_table_versions(connection, [CatalogueEntry.__tablename__])
+
+
+def rebuild_catalogue(connection):
+    '''
+    This helper function builds every catalogue entry again, e.g. when the table is first created or after rows are
+    loaded with Core statements in bulk.
+
+    Database statements:
+    DELETE FROM catalogue_entries;
+    INSERT INTO catalogue_entries SELECT ... FROM manufactures JOIN projects ... ;
+    '''
+    connection.execute(db.delete(CatalogueEntry))
+    insert_catalogue_entries(connection, catalogue_query())
+    bump_table_versions(connection, [CatalogueEntry.__tablename__])
+
+
+def catalogue_key(model, values):
+    '''
+    This helper function returns the primary key of an entry of a source table, from the instance itself or a dictionary
+    of its columns, e.g. (location_id, project_id) for a manufacture and the id for the other tables.
+    '''
+    get = values.get if isinstance(values, dict) else lambda name: getattr(values, name)
+    key = tuple(get(column.key) for column in model.__table__.primary_key)
+    return key if len(key) > 1 else key[0]
+
+
+@event.listens_for(Session, "after_flush")
+def refresh_flushed_catalogue(session, flush_context):
+    '''
+    Every catalogue entry built from an entry inserted, updated or deleted by the ORM during a flush is rebuilt in the same
+    transaction, so the catalogue never shows changes that are not committed, or misses ones that are.
+    '''
+    changes = {}
+    # New entries of the other tables have no manufactures yet, so only new manufactures add catalogue entries.
+    for instance in [instance for instance in session.new if type(instance) is Manufacture] + list(session.deleted):
+        if type(instance) in CATALOGUE_SOURCES:
+            changes.setdefault(type(instance), set()).add(catalogue_key(type(instance), instance))
+    for instance in session.dirty:
+        if type(instance) in CATALOGUE_SOURCES:
+            state = inspect(instance)
+            if any(state.attrs[name].history.has_changes() for name in CATALOGUE_SOURCES[type(instance)]):
+                changes.setdefault(type(instance), set()).add(catalogue_key(type(instance), instance))
+
+    refresh_catalogue(session.connection(), changes)
@@ -0,0 +1,95 @@
+from flask import current_app, g, request
+import functools
+import hashlib
+
+from utils.table_versions import get_table_versions
+
+
+def conditional_get(*models):
+    '''
+    This decorator adds ETag and Last-Modified headers to a GET route, and answers If-None-Match and If-Modified-Since
+    requests with 304 Not Modified when none of the tables the route reads from have changed. The 304 response is returned
+    before the route itself runs, so unchanged data is never queried or serialised again.
+
+    The models passed to the decorator must include every table that appears in the response, including the tables of
+    nested schema fields. e.g. the manufactures routes also depend on projects, locations, countries and currencies.
+
+    The ETag is built from the version of each of those tables (see utils/table_versions.py), the full path of the request
+    and the Accept header, so each page, query string and response format gets its own ETag. This decorator must be
+    placed below @jwt_required() so that authentication is still checked for conditional requests.
+
+    The table names are kept on the route as `conditional_tables`, so that asgi.py can answer conditional requests for
+    the same route.
+    '''
+    table_names = tuple(sorted(model.__tablename__ for model in models))
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            # The versions are kept for the rest of the request, for routes that cache their results (see
+            # request_table_versions).
+            g.table_versions = get_table_versions(table_names)
+            etag, last_modified = get_validators(table_names, g.table_versions)
+
+            if is_not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            return add_validators(response, etag, last_modified)
+
+        wrapper.conditional_tables = table_names
+        return wrapper
+
+    return decorator
+
+
+def request_table_versions(table_names):
+    '''
+    This helper function returns the versions of the given tables for the current request (see
+    utils/table_versions.get_table_versions). The versions already read by conditional_get are reused, so that a route
+    that caches its results keys the cache on the same versions as its ETag, without reading them again. Tables that the
+    decorator did not read are read from the database.
+    '''
+    versions = g.get("table_versions", {})
+    if all(name in versions for name in table_names):
+        return {name: versions[name] for name in table_names}
+    return get_table_versions(table_names)
+
+
+def get_validators(table_names, versions):
+    '''
+    This helper function returns the ETag and Last-Modified time of the current request, from the versions of the tables
+    it reads from (see utils/table_versions.get_table_versions).
+    '''
+    fingerprint = "|".join([
+        request.full_path,
+        request.headers.get("Accept", ""),
+        ",".join(f"{name}:{versions[name][0]}" for name in table_names)
+        ])
+    etag = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+    modified_times = [modified for _, modified in versions.values() if modified is not None]
+    last_modified = max(modified_times) if modified_times else None
+    return etag, last_modified
+
+
+def is_not_modified(etag, last_modified):
+    # If-None-Match takes precedence over If-Modified-Since when both are given (RFC 9110).
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+
+    return (
+        last_modified is not None
+        and request.if_modified_since is not None
+        and last_modified.replace(microsecond=0) <= request.if_modified_since
+        )
+
+
+def add_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    response.vary.add("Accept")
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
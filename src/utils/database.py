@@ -0,0 +1,62 @@
+from sqlalchemy import event
+import threading
+
+
+class PoolMetrics:
+    '''
+    Counters of the connection pool events of an engine, kept since the worker process started. Together with the
+    current state of the pool (see get_pool_status) they show whether DB_POOL_SIZE and DB_MAX_OVERFLOW suit the load:
+    e.g. connections opened keeps rising when the pool is too small and overflow connections are opened and closed, and
+    invalidated connections are ones the server or a proxy had closed.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {"connections_opened": 0, "checkouts": 0, "checkins": 0, "invalidated": 0}
+
+    def increment(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+def init_engine(engine, config):
+    '''
+    This function sets up an engine after it is created: its pool events are counted, and when connecting through
+    PgBouncer the statement timeout is set at the start of every transaction (see DB_PGBOUNCER in config.py).
+    '''
+    metrics = PoolMetrics()
+    engine.pool_metrics = metrics
+
+    event.listen(engine, "connect", lambda *args: metrics.increment("connections_opened"))
+    event.listen(engine, "checkout", lambda *args: metrics.increment("checkouts"))
+    event.listen(engine, "checkin", lambda *args: metrics.increment("checkins"))
+    event.listen(engine, "invalidate", lambda *args: metrics.increment("invalidated"))
+
+    if config["DB_PGBOUNCER"] and config["DB_STATEMENT_TIMEOUT"] and engine.dialect.name == "postgresql":
+        statement = f"SET LOCAL statement_timeout = {int(config['DB_STATEMENT_TIMEOUT'])}"
+
+        @event.listens_for(engine, "begin")
+        def set_statement_timeout(connection):
+            connection.exec_driver_sql(statement)
+
+
+def get_pool_status(engine):
+    '''
+    This helper function returns the current state of the connection pool of an engine, and its event counters. Pools
+    without a fixed size (e.g. NullPool when connecting through PgBouncer) only report their counters.
+    '''
+    pool = engine.pool
+    status = {"pool": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if method is not None:
+            status[name] = method()
+
+    # QueuePool counts overflow from -size while the pool is not full; only connections beyond the pool size are reported.
+    if "overflow" in status:
+        status["overflow"] = max(0, status["overflow"])
+    status.update(engine.pool_metrics.snapshot())
+    return status
@@ -0,0 +1,98 @@
+from flask import current_app, g
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from collections import namedtuple
+import threading
+import time
+
+from main import db
+from models.users import User
+
+Identity = namedtuple("Identity", ["user_id", "is_admin"])
+
+
+class IdentityCache(object):
+    '''
+    A small thread-safe cache of username -> Identity, shared by every request handled by this process. Entries expire
+    after IDENTITY_CACHE_TTL seconds so that changes made by other worker processes are picked up within that time.
+    '''
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, username, ttl):
+        with self._lock:
+            entry = self._entries.get(username)
+        if entry is None or time.monotonic() - entry[1] > ttl:
+            return None
+        return entry[0]
+
+    def set(self, username, identity):
+        with self._lock:
+            self._entries[username] = (identity, time.monotonic())
+
+    def invalidate(self, usernames):
+        with self._lock:
+            for username in usernames:
+                self._entries.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+identity_cache = IdentityCache()
+
+
+def get_current_identity():
+    '''
+    This helper function returns the id and is_admin flag of the user identified by the JWT of the current request. It is
+    used instead of loading the full user entry whenever only authorisation information is needed.
+
+    The identity is remembered for the rest of the request in flask.g, and for IDENTITY_CACHE_TTL seconds in the process
+    level identity cache. Only on a cache miss is the following database query used.
+    Database statement: SELECT id, is_admin FROM users WHERE username=get_jwt_identity();
+
+    None is returned if the user no longer exists in the users table.
+    '''
+    if "current_identity" in g:
+        return g.current_identity
+
+    username = get_jwt_identity()
+    ttl = current_app.config["IDENTITY_CACHE_TTL"]
+    identity = identity_cache.get(username, ttl)
+
+    if identity is None:
+        query = db.select(User.id, User.is_admin).filter_by(username=username)
+        row = db.session.execute(query).first()
+        if row is not None:
+            identity = Identity(row.id, row.is_admin)
+            identity_cache.set(username, identity)
+
+    g.current_identity = identity
+    return identity
+
+
+@event.listens_for(Session, "after_flush")
+def collect_stale_identities(session, flush_context):
+    '''
+    Any user entry that is updated (e.g. promote_user_to_admin, a username change) or deleted (directly, or by cascade from
+    a location or country) during a flush is recorded against the session. The cached identities are only dropped once the
+    transaction commits, so that another request cannot re-cache the old values in between.
+    '''
+    stale = session.info.setdefault("stale_identities", set())
+    for user in list(session.dirty) + list(session.deleted):
+        if isinstance(user, User):
+            stale.add(user.username)
+            stale.update(inspect(user).attrs.username.history.deleted or ())
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_stale_identities(session):
+    identity_cache.invalidate(session.info.pop("stale_identities", ()))
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_stale_identities(session):
+    session.info.pop("stale_identities", None)
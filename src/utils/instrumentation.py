@@ -0,0 +1,243 @@
+from flask import current_app, g, has_request_context, request
+from flask_marshmallow import Schema
+from sqlalchemy import event
+import functools
+import re
+import threading
+import time
+
+# Histogram buckets: seconds for durations, and a count for database statements per request
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Metric:
+    '''
+    A metric in the Prometheus text exposition format, with a value per combination of label values. Metrics are kept in
+    the memory of each worker process, so each process must be scraped on its own.
+    '''
+    def __init__(self, name, description, labels):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def label_text(self, values, extra=()):
+        pairs = list(zip(self.labels, values)) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [f"{self.name}{self.label_text(values)} {count}" for values, count in sorted(self._values.items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, description, labels, buckets):
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+
+    def observe(self, *label_values, value):
+        with self._lock:
+            counts, total, observations = self._values.get(label_values, ([0] * len(self.buckets), 0.0, 0))
+            counts = [count + 1 if value <= bound else count for count, bound in zip(counts, self.buckets)]
+            self._values[label_values] = (counts, total + value, observations + 1)
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            for values, (counts, total, observations) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{self.label_text(values, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{self.label_text(values, [('le', '+Inf')])} {observations}")
+                lines.append(f"{self.name}_sum{self.label_text(values)} {total}")
+                lines.append(f"{self.name}_count{self.label_text(values)} {observations}")
+        return lines
+
+
+class PoolGauge(Metric):
+    '''
+    A gauge of the connection pool of an engine, read from utils/database.get_pool_status when the metrics are scraped.
+    '''
+    kind = "gauge"
+
+    def __init__(self, name, description, engine, key):
+        super().__init__(name, description, ())
+        self.engine = engine
+        self.key = key
+
+    def samples(self):
+        from utils.database import get_pool_status
+        value = get_pool_status(self.engine).get(self.key)
+        return [] if value is None else [f"{self.name} {value}"]
+
+
+ROUTE_LABELS = ("blueprint", "endpoint", "method")
+
+request_duration = Histogram("http_request_duration_seconds", "Time taken to answer a request.", ROUTE_LABELS + ("status",), DURATION_BUCKETS)
+request_queries = Histogram("http_request_db_queries", "Database statements run by a request.", ROUTE_LABELS, QUERY_COUNT_BUCKETS)
+request_query_time = Histogram("http_request_db_seconds", "Time a request spent waiting on database statements.", ROUTE_LABELS, DURATION_BUCKETS)
+request_serialisation_time = Histogram("http_request_serialisation_seconds", "Time a request spent in marshmallow schema dumps.", ROUTE_LABELS, DURATION_BUCKETS)
+slow_queries = Counter("db_slow_queries_total", "Database statements slower than SLOW_QUERY_MS.", ("endpoint",))
+n_plus_one_warnings = Counter("db_n_plus_one_warnings_total", "Requests that ran one statement more than N_PLUS_ONE_THRESHOLD times.", ("endpoint",))
+
+REQUEST_METRICS = [request_duration, request_queries, request_query_time, request_serialisation_time, slow_queries, n_plus_one_warnings]
+METRICS = list(REQUEST_METRICS)
+
+
+def init_instrumentation(app, engine):
+    '''
+    This function registers the request instrumentation on the application and database engine:
+
+    - the time taken by each request, by blueprint, endpoint, method and status code;
+    - the number of database statements each request runs, and the time spent waiting on them;
+    - the time each request spends dumping marshmallow schemas;
+    - a slow query log: statements slower than SLOW_QUERY_MS milliseconds are logged with the route that ran them;
+    - an N+1 detector: a warning is logged when one request runs the same statement (ignoring its parameters) more than
+    N_PLUS_ONE_THRESHOLD times, which usually means a relationship is lazy loaded for every row of a list.
+
+    The metrics are served in the Prometheus text format by the /metrics route (see controllers/metrics_controller.py),
+    together with the state of the connection pool.
+    '''
+    app.before_request(start_request)
+    app.after_request(record_status)
+    app.teardown_request(finish_request)
+    instrument_engine(engine)
+    instrument_schema_dumps()
+
+    pool_gauges = [
+        ("db_pool_size", "Connections kept open by the pool.", "size"),
+        ("db_pool_checked_out", "Connections in use by requests.", "checkedout"),
+        ("db_pool_overflow", "Connections open beyond the pool size.", "overflow"),
+        ("db_pool_connections_opened", "Connections opened since the process started.", "connections_opened"),
+        ("db_pool_invalidated", "Connections found closed by the server or a proxy.", "invalidated"),
+    ]
+    METRICS[len(REQUEST_METRICS):] = [PoolGauge(name, description, engine, key) for name, description, key in pool_gauges]
+
+
+def instrument_engine(engine):
+    '''
+    This function counts and times the statements that requests run on the engine, for the request metrics, the slow
+    query log and the N+1 detector. asgi.py also registers it on the sync_engine of its async engine.
+    '''
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+def start_request():
+    g.instrumentation = {"start": time.perf_counter(), "queries": 0, "query_time": 0.0, "dump_time": 0.0, "dump_depth": 0, "statements": {}}
+
+
+def record_status(response):
+    data = g.get("instrumentation")
+    if data is not None:
+        data["status"] = response.status_code
+    return response
+
+
+def finish_request(exception=None):
+    '''
+    The metrics of a request are recorded when its context is torn down, which also happens when the view raised an
+    exception that no error handler answered. Such a request never reaches the after_request hooks, so it is recorded
+    with the status code 500 that the server answers it with.
+    '''
+    data = g.pop("instrumentation", None)
+    if data is None:
+        return
+
+    labels = (request.blueprint or "", request.endpoint or "", request.method)
+    request_duration.observe(*labels, str(data.get("status", 500)), value=time.perf_counter() - data["start"])
+    request_queries.observe(*labels, value=data["queries"])
+    request_query_time.observe(*labels, value=data["query_time"])
+    request_serialisation_time.observe(*labels, value=data["dump_time"])
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+
+    # Only statements run by requests are measured, not e.g. CLI commands loading data.
+    data = g.get("instrumentation") if has_request_context() else None
+    if data is None:
+        return
+
+    endpoint = request.endpoint
+    slow_query_ms = current_app.config["SLOW_QUERY_MS"]
+    if slow_query_ms and elapsed * 1000 >= slow_query_ms:
+        slow_queries.inc(endpoint or "")
+        current_app.logger.warning("Slow query (%.0f ms) in %s: %s", elapsed * 1000, endpoint, statement)
+
+    data["queries"] += 1
+    data["query_time"] += elapsed
+
+    shape = statement_shape(statement)
+    count = data["statements"].get(shape, 0) + 1
+    data["statements"][shape] = count
+    if count == current_app.config["N_PLUS_ONE_THRESHOLD"] + 1:
+        n_plus_one_warnings.inc(endpoint or "")
+        current_app.logger.warning("Possible N+1 queries: %s ran this statement more than %d times: %s", endpoint, count - 1, shape)
+
+
+def statement_shape(statement):
+    '''
+    This helper function reduces a statement to its shape, so that statements which only differ in their parameters (or
+    the length of an IN list) are counted together by the N+1 detector.
+    '''
+    shape = re.sub(r"\s+", " ", statement).strip()
+    return re.sub(r"\((?:\s*(?:\?|%\(\w+\)s|%s|\$\d+)\s*,?)+\)", "(...)", shape)
+
+
+def instrument_schema_dumps():
+    '''
+    Schema.dump is wrapped once, so that every schema of the application is timed. Nested schemas are dumped inside their
+    parent's dump, so only the outermost dump of each request is timed.
+    '''
+    if getattr(Schema.dump, "instrumented", False):
+        return
+
+    dump = Schema.dump
+
+    @functools.wraps(dump)
+    def timed_dump(self, *args, **kwargs):
+        data = g.get("instrumentation") if has_request_context() else None
+        if data is None or data["dump_depth"]:
+            return dump(self, *args, **kwargs)
+
+        data["dump_depth"] += 1
+        start = time.perf_counter()
+        try:
+            return dump(self, *args, **kwargs)
+        finally:
+            data["dump_time"] += time.perf_counter() - start
+            data["dump_depth"] -= 1
+
+    timed_dump.instrumented = True
+    Schema.dump = timed_dump
+
+
+def render_metrics():
+    '''
+    This helper function returns every metric in the Prometheus text exposition format.
+    '''
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,64 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    '''
+    JSON provider that serialises with orjson, which is several times faster than the json module of the standard library
+    for the large lists returned by the list and stream routes. Keys are sorted and debug responses are indented, the same
+    as the default provider. Dates and datetimes are written as ISO 8601 strings, the format the schemas already use,
+    instead of the HTTP date format of the default provider. Any other type that orjson does not support (e.g. Decimal) is
+    handed to the default provider's conversion.
+
+    Calls that pass json.dumps keyword arguments (e.g. `cls` or `separators`) are passed on to the default provider, since
+    orjson does not accept them.
+    '''
+    def options(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.options()).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        # The body is built as bytes, without decoding and encoding it again as the default provider does.
+        body = orjson.dumps(obj, default=self.default, option=self.options(indent))
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+JSON_PROVIDERS = {
+    "json": DefaultJSONProvider,
+    "orjson": OrjsonProvider,
+}
+
+
+def init_json_provider(app):
+    '''
+    This function sets the JSON provider used by jsonify, request.get_json and the streamed responses of the application,
+    chosen with the JSON_BACKEND setting. orjson is used by default, and the json module of the standard library if
+    JSON_BACKEND is set to "json" or the orjson package is not installed.
+    '''
+    backend = app.config["JSON_BACKEND"]
+    if backend not in JSON_PROVIDERS:
+        raise ValueError(f"Unknown JSON_BACKEND `{backend}`; expected one of {', '.join(JSON_PROVIDERS)}.")
+    if orjson is None:
+        backend = "json"
+
+    app.json = JSON_PROVIDERS[backend](app)
@@ -0,0 +1,131 @@
+from collections import namedtuple
+from flask import request
+from werkzeug.exceptions import BadRequest
+from sqlalchemy import inspect
+import datetime
+import functools
+import operator
+import re
+
+# The comparison of each filter operator, e.g. ?filter[price_estimate][lt]=100
+FILTER_OPERATORS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "in": lambda column, values: column.in_(values),
+}
+
+FILTER_PARAMETER = re.compile(r"^filter\[(\w+)\](?:\[(\w+)\])?$")
+
+ListOptions = namedtuple("ListOptions", ["filters", "sort", "schema"])
+
+
+def read_list_options(model, schema):
+    '''
+    This helper function reads the filter, sort and fields query parameters of a list route:
+
+    - `filter[column][operator]=value` keeps only the rows where the comparison holds. The operators are eq (the default when
+    no operator is given), ne, lt, lte, gt, gte and in (a comma separated list of values). Several filters can be combined,
+    e.g. ?filter[currency_id]=1&filter[price_estimate][lt]=5000
+    - `sort=column,-column` orders the rows by the given columns, descending when prefixed with `-`.
+    - `fields=name,name` only returns the given fields of the schema, e.g. ?fields=id,title. Fields of nested schemas can be
+    selected with a dot, e.g. ?fields=id,project.title
+
+    Columns can be filtered and sorted on if the schema returns them, or if they are foreign keys (e.g. currency_id), so
+    that load_only columns such as users.password can never be probed.
+
+    A ListOptions tuple is returned, of the filter expressions for the WHERE clause, the (column, descending) sort keys for
+    utils/pagination.py, and the schema to dump the rows with. A BadRequest is raised for unknown columns, operators or
+    fields, or values that do not match the type of their column.
+    '''
+    columns = queryable_columns(model, schema)
+    return ListOptions(read_filters(columns), read_sort(columns), read_fields(schema))
+
+
+def queryable_columns(model, schema):
+    columns = {}
+    for attribute in inspect(model).column_attrs:
+        column = attribute.columns[0]
+        if attribute.key in schema.dump_fields or column.foreign_keys:
+            columns[attribute.key] = column
+    return columns
+
+
+def read_filters(columns):
+    filters = []
+    for name, text in request.args.items(multi=True):
+        match = FILTER_PARAMETER.match(name)
+        if not match:
+            continue
+
+        key, operator_name = match.group(1), match.group(2) or "eq"
+        if key not in columns:
+            raise BadRequest(f"The `{key}` field can not be filtered on. Fields that can be filtered on: {', '.join(columns)}.")
+        if operator_name not in FILTER_OPERATORS:
+            raise BadRequest(f"The `{operator_name}` filter is not valid. Filters: {', '.join(FILTER_OPERATORS)}.")
+
+        column = columns[key]
+        if operator_name == "in":
+            value = [parse_value(key, column, item) for item in text.split(",")]
+        else:
+            value = parse_value(key, column, text)
+        filters.append(FILTER_OPERATORS[operator_name](column, value))
+
+    return filters
+
+
+def parse_value(key, column, text):
+    '''
+    This helper function converts a filter value from the query string to the python type of its column.
+    '''
+    python_type = column.type.python_type
+    try:
+        if python_type is bool:
+            if text.lower() not in ("true", "false"):
+                raise ValueError
+            return text.lower() == "true"
+        if python_type in (datetime.date, datetime.datetime):
+            return python_type.fromisoformat(text)
+        return python_type(text)
+    except ValueError:
+        raise BadRequest(f"The value `{text}` is not a valid {python_type.__name__} for the `{key}` filter.")
+
+
+def read_sort(columns):
+    sort = []
+    for name in request.args.get("sort", "").split(","):
+        name = name.strip()
+        if not name:
+            continue
+
+        descending = name.startswith("-")
+        key = name.lstrip("-")
+        if key not in columns:
+            raise BadRequest(f"The `{key}` field can not be sorted on. Fields that can be sorted on: {', '.join(columns)}.")
+        sort.append((columns[key], descending))
+
+    return sort
+
+
+def read_fields(schema):
+    fields = request.args.get("fields")
+    if not fields:
+        return schema
+
+    only = tuple(sorted({name.strip() for name in fields.split(",") if name.strip()}))
+    return sparse_schema(schema, only)
+
+
+@functools.lru_cache(maxsize=256)
+def sparse_schema(schema, only):
+    '''
+    This helper function returns a copy of a schema that only dumps the given fields. The copies are cached, so that the
+    eager loading options built for each schema (see utils/loading.py) are reused between requests.
+    '''
+    try:
+        return type(schema)(many=schema.many, only=only)
+    except ValueError:
+        raise BadRequest(f"The `fields` query parameter must only name fields of the response: {', '.join(schema.dump_fields)}.")
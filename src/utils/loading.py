@@ -0,0 +1,81 @@
+from marshmallow import fields
+from sqlalchemy import inspect
+from sqlalchemy.orm import ColumnProperty, RelationshipProperty, joinedload, load_only, selectinload
+import functools
+
+
+@functools.lru_cache(maxsize=1024)
+def eager_load_options(schema, model):
+    '''
+    This helper function builds the SQLAlchemy loader options needed to serialise rows of the given model with the given
+    schema. Every Nested field of a schema declares a relationship that will be read during schema.dump(), so each one is
+    matched to the relationship of the same name on the model and loaded up front. Without this, each relationship is lazy
+    loaded with a separate SELECT for every row that is dumped (the N+1 query problem).
+
+    Many-to-one relationships (e.g. Manufacture.location) are joined into the main query with joinedload. Collections
+    are loaded with selectinload, which uses one extra "SELECT ... WHERE id IN (...)" per relationship so that the number
+    of rows returned by the main query (and therefore LIMIT) is unaffected.
+
+    Nested schemas are followed recursively, so ManufactureSchema.location -> LocationSchema.country gives
+    joinedload(Manufacture.location).joinedload(Location.country). The `only` declarations of each Nested field are
+    respected, so relationships that are not dumped are not loaded.
+
+    Only the columns that a schema dumps are selected, with load_only, for the model and for each nested relationship, so
+    that large columns which are not returned (e.g. projects.description for the project title of a manufacture) are
+    neither read from the database nor loaded into the ORM. The key columns of each loaded relationship are also selected.
+    The columns of a model are not narrowed when its schema dumps something other than a column or relationship (e.g.
+    the properties of CatalogueEntry), as the columns it needs are not known. Columns that are not selected are still
+    loaded if they are read, with a SELECT of their own.
+
+    The options only depend on the schema instance and the model, so they are built once and cached. The cache is bounded
+    because sparse fieldsets (see utils/list_options.py) create a schema instance per combination of fields requested.
+    '''
+    return tuple(_loader_options(schema, model, None))
+
+
+def _loader_options(schema, model, parent):
+    options = []
+
+    columns = dumped_columns(schema, model)
+    if columns:
+        options.append(load_only(*columns) if parent is None else parent.load_only(*columns))
+
+    for name, field in schema.dump_fields.items():
+        if not isinstance(field, fields.Nested):
+            continue
+
+        attribute = getattr(model, field.attribute or name, None)
+        relationship = getattr(attribute, "property", None)
+        if not isinstance(relationship, RelationshipProperty):
+            continue
+
+        strategy = selectinload if relationship.uselist else joinedload
+        loader = strategy(attribute) if parent is None else getattr(parent, strategy.__name__)(attribute)
+
+        # Chained options include the path of their parent, so the parent only needs to be added on its own when the
+        # nested schema has no relationships of its own.
+        child_options = _loader_options(field.schema, relationship.mapper.class_, loader)
+        options.extend(child_options or [loader])
+
+    return options
+
+
+def dumped_columns(schema, model):
+    '''
+    This helper function returns the column attributes of a model that are needed to dump it with a schema: the columns
+    the schema dumps, and the local key columns of the relationships it dumps (e.g. Manufacture.project_id for
+    Manufacture.project). None is returned if a field of the schema is not a column or relationship of the model.
+    '''
+    mapper = inspect(model)
+    columns = []
+
+    for name, field in schema.dump_fields.items():
+        prop = mapper.attrs.get(field.attribute or name)
+        if isinstance(prop, ColumnProperty):
+            columns.append(getattr(model, prop.key))
+        elif isinstance(prop, RelationshipProperty):
+            columns.extend(getattr(model, mapper.get_property_by_column(column).key) for column in prop.local_columns)
+        else:
+            return None
+
+    return list(dict.fromkeys(columns))
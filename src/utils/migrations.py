@@ -0,0 +1,147 @@
+import contextlib
+import datetime
+import importlib
+import pkgutil
+
+import migrations
+from main import db
+from models import TableVersion
+from utils.table_versions import bump_table_versions
+
+# The revision the database schema is at. The table holds a single row.
+schema_migrations = db.Table(
+    "schema_migrations",
+    db.Column("revision", db.String(32), primary_key=True)
+)
+
+
+def load_migrations():
+    '''
+    This helper function imports every revision script in the migrations package, ordered by revision. Each script has a
+    `revision` string, a `description`, and `upgrade(connection)` and `downgrade(connection)` functions.
+    '''
+    scripts = [importlib.import_module(f"{migrations.__name__}.{info.name}") for info in pkgutil.iter_modules(migrations.__path__)]
+    return sorted(scripts, key=lambda script: script.revision)
+
+
+def get_current_revision(connection):
+    '''
+    This helper function returns the revision the database is at, or None if migrations have never been run on it.
+    '''
+    if not db.inspect(connection).has_table(schema_migrations.name):
+        return None
+    return connection.scalar(db.select(schema_migrations.c.revision))
+
+
+def versioned_table_names():
+    '''
+    This helper function returns the tables of the models that have a version entry in the table_versions table.
+    '''
+    return [table_name for table_name in db.metadata.tables if table_name not in (TableVersion.__tablename__, schema_migrations.name)]
+
+
+def set_current_revision(connection, revision):
+    connection.execute(db.delete(schema_migrations))
+    if revision is not None:
+        connection.execute(db.insert(schema_migrations).values(revision=revision))
+
+
+@contextlib.contextmanager
+def migration_transaction():
+    '''
+    This helper function returns a connection in a transaction that also covers schema changes, so that a revision that
+    fails is rolled back as a whole and can be applied again. The SQLite driver only begins a transaction before data
+    changes, and runs CREATE TABLE and other schema statements before the first of them outside of any transaction; on
+    SQLite the transaction is begun and ended with explicit statements instead.
+    '''
+    if db.engine.dialect.name != "sqlite":
+        with db.engine.begin() as connection:
+            yield connection
+        return
+
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.exec_driver_sql("BEGIN")
+        try:
+            yield connection
+        except BaseException:
+            connection.exec_driver_sql("ROLLBACK")
+            raise
+        connection.exec_driver_sql("COMMIT")
+
+
+def create_schema(connection):
+    '''
+    This helper function creates every table of the models in an empty database, and gives every table a version entry,
+    used for the ETags of conditional GET requests.
+    '''
+    db.metadata.create_all(connection)
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    connection.execute(db.insert(TableVersion), [
+        {"table_name": table_name, "version": 0, "last_modified": now} for table_name in versioned_table_names()
+        ])
+
+
+def upgrade_schema():
+    '''
+    This function brings the database schema up to the latest revision, and returns the scripts that were applied.
+
+    - An empty database gets the current schema of the models directly, and is stamped with the latest revision.
+    - A database created by the old `flask db create` command (tables but no schema_migrations table) is stamped with the
+    first (baseline) revision, and the later revisions are applied.
+    - Otherwise every revision after the current one is applied.
+
+    Each revision is applied, and the new revision recorded, in its own transaction (see migration_transaction). Revisions
+    only use the tables and columns as they were at that revision, never the current models. Once revisions have been
+    applied the version of every table is increased, so that responses cached by clients under the old schema are not
+    reported as unchanged by conditional GET requests.
+    '''
+    scripts = load_migrations()
+    applied = []
+
+    with migration_transaction() as connection:
+        current = get_current_revision(connection)
+        if current is None:
+            model_tables = set(db.metadata.tables) - {schema_migrations.name}
+            if model_tables.isdisjoint(db.inspect(connection).get_table_names()):
+                create_schema(connection)
+                set_current_revision(connection, scripts[-1].revision)
+                return scripts
+            schema_migrations.create(connection)
+            current = scripts[0].revision
+            set_current_revision(connection, current)
+            applied.append(scripts[0])
+
+    for script in scripts:
+        if script.revision <= current:
+            continue
+        with migration_transaction() as connection:
+            script.upgrade(connection)
+            set_current_revision(connection, script.revision)
+        applied.append(script)
+
+    if any(script.revision > scripts[0].revision for script in applied):
+        with db.engine.begin() as connection:
+            bump_table_versions(connection, versioned_table_names())
+
+    return applied
+
+
+def downgrade_schema():
+    '''
+    This function reverts the latest applied revision, and returns its script, or None if there is nothing to revert. The
+    baseline revision can not be reverted; use `flask db drop` instead.
+    '''
+    scripts = load_migrations()
+
+    with migration_transaction() as connection:
+        current = get_current_revision(connection)
+        position = [script.revision for script in scripts].index(current) if current is not None else 0
+        if position == 0:
+            return None
+
+        script = scripts[position]
+        script.downgrade(connection)
+        set_current_revision(connection, scripts[position - 1].revision)
+
+    return script
@@ -0,0 +1,202 @@
+from flask import current_app, request
+from werkzeug.exceptions import BadRequest
+from sqlalchemy import inspect, tuple_, and_, or_, false
+from sqlalchemy.orm import undefer
+import base64
+import datetime
+import json
+
+from main import db
+from utils.queries import record_exists
+
+
+def encode_cursor(values):
+    '''
+    This helper function turns the sort key value(s) of the last row on a page into an opaque cursor string. The cursor
+    is a url-safe base64 encoding of a json list, so that composite keys such as (location_id, project_id) for the
+    manufactures table can be passed back in a single query parameter. Dates and times are stored as ISO 8601 strings.
+    '''
+    values = [value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("utf-8")
+
+
+def decode_cursor(cursor, key_count):
+    '''
+    This helper function reverses encode_cursor. A BadRequest is raised if the cursor was tampered with or does not match
+    the number of sort key columns, which is handled by the bad request error handler of each blueprint.
+    '''
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))
+    except (ValueError, TypeError):
+        raise BadRequest("The `after` cursor is not valid.")
+
+    if not isinstance(values, list) or len(values) != key_count:
+        raise BadRequest("The `after` cursor is not valid.")
+    if not all(value is None or isinstance(value, (int, float, str)) for value in values):
+        raise BadRequest("The `after` cursor is not valid.")
+
+    return values
+
+
+def cursor_value(column, value):
+    '''
+    This helper function converts a value read from a cursor back to the python type of its column.
+    '''
+    if value is None and column.nullable:
+        return None
+
+    python_type = column.type.python_type
+    try:
+        if python_type in (datetime.date, datetime.datetime):
+            return python_type.fromisoformat(value)
+        if python_type is float and isinstance(value, (int, float)):
+            return float(value)
+        if isinstance(value, python_type) and not isinstance(value, bool):
+            return value
+    except (TypeError, ValueError):
+        pass
+
+    raise BadRequest("The `after` cursor is not valid.")
+
+
+def get_limit():
+    '''
+    This helper function reads the `limit` query parameter of the request. If no limit is given, PAGINATION_DEFAULT_LIMIT is
+    used. The limit is capped at PAGINATION_MAX_LIMIT so that a single request can never pull an entire table.
+    '''
+    default_limit = current_app.config["PAGINATION_DEFAULT_LIMIT"]
+    max_limit = current_app.config["PAGINATION_MAX_LIMIT"]
+
+    limit = request.args.get("limit", default_limit, type=int)
+    if limit < 1:
+        raise BadRequest("The `limit` query parameter must be a positive integer.")
+
+    return min(limit, max_limit)
+
+
+def sort_keys(model, sort=()):
+    '''
+    This helper function returns the full ordering of a list as (column, descending) pairs: the requested sort columns (see
+    utils/list_options.py), followed by any primary key columns of the model that were not sorted on, in ascending order.
+    Ending with the primary key gives every row a unique position, which keyset pagination needs.
+    '''
+    keys = list(sort)
+    sorted_columns = {column.key for column, _ in keys}
+    keys.extend((column, False) for column in inspect(model).primary_key if column.key not in sorted_columns)
+    return keys
+
+
+def order_by_clauses(keys):
+    '''
+    This helper function turns sort keys into ORDER BY clauses. Empty values of nullable columns are always placed last, so
+    that PostgreSQL and SQLite return rows in the same order.
+    '''
+    clauses = []
+    for column, descending in keys:
+        clause = column.desc() if descending else column.asc()
+        clauses.append(clause.nulls_last() if column.nullable else clause)
+    return clauses
+
+
+def after_clause(keys, values):
+    '''
+    This helper function builds the WHERE clause that selects the rows after the cursor position in the given ordering.
+
+    When every key is in ascending order and not nullable (e.g. the primary key alone), a single row value comparison is
+    used, which the database can answer with a range scan of the primary key index:
+        (location_id, project_id) > (1, 2)
+    Otherwise the comparison is spelled out column by column, with empty values placed last:
+        published_date < '2020-01-01' OR published_date IS NULL OR (published_date = '2020-01-01' AND id > 5)
+    '''
+    columns = [column for column, _ in keys]
+    if not any(descending or column.nullable for column, descending in keys):
+        if len(columns) == 1:
+            return columns[0] > values[0]
+        return tuple_(*columns) > tuple_(*values)
+
+    clause = None
+    for (column, descending), value in reversed(list(zip(keys, values))):
+        if value is None:
+            # Empty values sort last, so only rows with an empty value and a later position in the next key follow.
+            same = column.is_(None)
+            beyond = None
+        else:
+            same = column == value
+            beyond = column < value if descending else column > value
+            if column.nullable:
+                beyond = or_(beyond, column.is_(None))
+
+        after = same if clause is None else and_(same, clause)
+        if clause is None:
+            # The last key is unique, so an equal value is not after the cursor.
+            after = beyond if beyond is not None else false()
+        elif beyond is not None:
+            after = or_(beyond, after)
+        clause = after
+
+    return clause
+
+
+def paginate(query, model, sort=()):
+    '''
+    This helper function applies keyset (cursor) pagination to a select statement for the given model. Rows are ordered by
+    the requested sort columns and then the primary key of the model, and the `after` cursor from the previous page holds
+    the position of the last row it returned. This keeps the cost of each page constant, unlike OFFSET pagination which
+    has to skip over every earlier row.
+
+    One extra row is fetched beyond the limit to find out if there is a further page. A tuple of the rows and the cursor
+    for the next page is returned. The cursor is None when the last page has been reached.
+
+    Database statement: SELECT * FROM table WHERE (primary key) > (after) ORDER BY (primary key) LIMIT limit + 1;
+    '''
+    statement, finish_page = keyset_page(query, model, sort)
+    return finish_page(db.session.scalars(statement).all())
+
+
+def keyset_page(query, model, sort=()):
+    '''
+    This helper function does the work of paginate without running the query, for callers with their own session (see
+    asgi.py). It returns the statement for the page, and a function that turns the rows of that statement into the rows
+    of the page and the cursor for the next page.
+    '''
+    mapper = inspect(model)
+    keys = sort_keys(model, sort)
+    limit = get_limit()
+
+    after = request.args.get("after")
+    if after:
+        values = decode_cursor(after, len(keys))
+        values = [cursor_value(column, value) for (column, _), value in zip(keys, values)]
+        query = query.where(after_clause(keys, values))
+
+    def finish_page(rows):
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_row = rows[-1]
+            next_cursor = encode_cursor(
+                getattr(last_row, mapper.get_property_by_column(column).key) for column, _ in keys
+                )
+        return rows, next_cursor
+
+    # The cursor is read from the sort columns of the last row, so they are loaded even if the schema does not dump them
+    # (see utils/loading.py).
+    query = query.options(*[undefer(getattr(model, mapper.get_property_by_column(column).key)) for column, _ in keys])
+
+    return query.order_by(*order_by_clauses(keys)).limit(limit + 1), finish_page
+
+
+def paginate_children(query, model, parent_model, parent_id, sort=()):
+    '''
+    This helper function paginates the child entries of a parent entry, e.g. the drawings of a project, and reports whether
+    the parent exists. The child query is run first. If it returns any rows, the parent must exist because of the foreign
+    key, so no second query is needed. The parent is only looked up, with a lightweight EXISTS query, when the page is empty
+    so that a missing parent can be told apart from a parent with no children.
+
+    A tuple of the rows, the cursor for the next page, and whether the parent exists is returned.
+    '''
+    rows, next_cursor = paginate(query, model, sort)
+    if rows:
+        return rows, next_cursor, True
+
+    return rows, next_cursor, record_exists(parent_model, parent_id)
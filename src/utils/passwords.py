@@ -0,0 +1,103 @@
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import threading
+import bcrypt
+
+
+def bcrypt_hash(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def bcrypt_check(hashed, password):
+    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+class PasswordHasher(object):
+    '''
+    Bcrypt is deliberately slow, so hashing on the request thread lets a burst of logins take over every CPU core of the
+    server. This class runs the hashing in a bounded pool of worker processes instead. At most `workers` hashes run at a
+    time and at most `queue_size` more can wait for a worker. When the queue is full, a request waits up to `queue_timeout`
+    seconds for space before a 503 Service Unavailable is returned, so that a login storm is pushed back onto the clients
+    rather than onto the other routes of the application.
+
+    With workers=0 the hashing is done on the calling thread, which is useful for CLI commands and testing.
+    '''
+    def __init__(self, workers, queue_size, queue_timeout):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size) if workers else None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Worker processes are started on first use. The spawn start method is used so that the workers do not inherit
+        # the threads and open database connections of the web server process.
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                    )
+        return self._executor
+
+    def run(self, function, *args):
+        if not self.workers:
+            return function(*args)
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise ServiceUnavailable("The server is handling too many logins. Please try again shortly.")
+        try:
+            return self._get_executor().submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+def get_hasher():
+    '''
+    This helper function returns the password hasher of the current application, creating it from the PASSWORD_HASH_*
+    configuration values on first use.
+    '''
+    hasher = current_app.extensions.get("password_hasher")
+    if hasher is None:
+        hasher = PasswordHasher(
+            workers=current_app.config["PASSWORD_HASH_WORKERS"],
+            queue_size=current_app.config["PASSWORD_HASH_QUEUE_SIZE"],
+            queue_timeout=current_app.config["PASSWORD_HASH_QUEUE_TIMEOUT"]
+            )
+        current_app.extensions["password_hasher"] = hasher
+    return hasher
+
+
+def hash_password(password):
+    '''
+    This helper function hashes a password with bcrypt at the cost factor set by BCRYPT_LOG_ROUNDS. The cost is stored in
+    the hash itself (e.g. "$2b$12$..."), so hashes made with an older cost can still be checked.
+    '''
+    return get_hasher().run(bcrypt_hash, password, current_app.config["BCRYPT_LOG_ROUNDS"])
+
+
+def check_password(hashed, password):
+    '''
+    This helper function checks a password against a bcrypt hash stored in the users table.
+    '''
+    return get_hasher().run(bcrypt_check, hashed, password)
+
+
+def needs_rehash(hashed):
+    '''
+    This helper function returns True when a bcrypt hash was made with a different cost factor to BCRYPT_LOG_ROUNDS. It is
+    used at login, where the plain password is available, to move existing users onto the current cost factor.
+    '''
+    try:
+        rounds = int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return True
+    return rounds != current_app.config["BCRYPT_LOG_ROUNDS"]
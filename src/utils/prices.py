@@ -0,0 +1,135 @@
+from flask import request
+from werkzeug.exceptions import BadRequest
+from sqlalchemy import and_, case, func
+
+from main import db
+from models import Manufacture, Project, Currency, ExchangeRate
+from utils.list_options import read_filters
+from utils.pagination import encode_cursor, decode_cursor, get_limit
+from utils.reference_cache import get_reference_cache
+from utils.conditional import request_table_versions
+
+# The tables a supplier price summary is computed from
+PRICE_TABLES = (Manufacture.__tablename__, Project.__tablename__, Currency.__tablename__, ExchangeRate.__tablename__)
+
+
+def read_target_currency():
+    '''
+    This helper function reads the `currency` query parameter of a price summary, e.g. ?currency=AUD, and returns the
+    currency abbreviation and its exchange rate. A BadRequest is raised if the currency does not exist or has no rate.
+
+    Database statement: SELECT exchange_rates.rate FROM currencies LEFT JOIN exchange_rates ON ... WHERE currency_abbr=currency;
+    '''
+    abbr = request.args.get("currency", "").strip().upper()
+    if not abbr:
+        raise BadRequest("The `currency` query parameter is required, e.g. ?currency=AUD")
+
+    row = db.session.execute(
+        db.select(Currency.id, ExchangeRate.rate).outerjoin(Currency.exchange_rate).where(Currency.currency_abbr == abbr)
+        ).first()
+    if row is None:
+        raise BadRequest(f"The currency `{abbr}` does not exist in the database.")
+    if row.rate is None:
+        raise BadRequest(f"The currency `{abbr}` has no exchange rate. An admin can set one with PUT /currencies/{row.id}/exchange_rate.")
+
+    return abbr, row.rate
+
+
+def get_price_summaries():
+    '''
+    This helper function returns a page of supplier price summaries, and the cursor of the next page. Summaries are cached
+    by the full path of the request (see utils/reference_cache.py) together with the versions of the tables they are
+    computed from, so a cached summary is only served while none of those tables have changed. The versions are the ones
+    conditional_get read for the ETag of the request (see utils/conditional.request_table_versions).
+    '''
+    versions = request_table_versions(PRICE_TABLES)
+    version_key = [versions[name][0] for name in PRICE_TABLES]
+    cache = get_reference_cache()
+    cache_key = f"supplier_prices:{request.full_path}"
+
+    cached = cache.get(cache_key)
+    if cached is not None and cached["versions"] == version_key:
+        return cached["results"], cached["next_cursor"]
+
+    results, next_cursor = compute_price_summaries()
+    cache.set(cache_key, {"versions": version_key, "results": results, "next_cursor": next_cursor})
+    return results, next_cursor
+
+
+def compute_price_summaries():
+    '''
+    This helper function computes a page of supplier price summaries: for each project with manufacturing offerings, the
+    number of offerings and their min, median and max price converted to the requested currency. Offerings in a currency
+    without an exchange rate can not be converted; they are counted as `unconverted` and left out of the prices.
+
+    The projects are paged by id. `filter[project_id]` (e.g. filter[project_id][in]=1,2,3) narrows the projects. The
+    prices are converted and aggregated in a single statement, with the median taken as the middle price (or the mean of
+    the two middle prices) of each project, ranked with a window function.
+
+    Database statement: WITH converted AS (SELECT project_id, price_estimate * rate / target_rate AS price FROM manufactures
+    LEFT JOIN exchange_rates ON ... WHERE project_id IN (SELECT project_id FROM manufactures ... GROUP BY project_id
+    ORDER BY project_id LIMIT limit + 1)), ranked AS (SELECT ..., row_number() OVER (PARTITION BY project_id ORDER BY price)
+    ...) SELECT project_id, title, count(price), min(price), avg(middle price), max(price) FROM ranked JOIN projects
+    GROUP BY project_id ORDER BY project_id;
+    '''
+    abbr, target_rate = read_target_currency()
+    filters = read_filters({"project_id": Manufacture.project_id})
+    limit = get_limit()
+    cursor = request.args.get("after")
+    after = decode_cursor(cursor, 1)[0] if cursor else None
+    if after is not None and not isinstance(after, int):
+        raise BadRequest("The `after` cursor is not valid.")
+
+    # The page of projects with offerings
+    page = db.select(Manufacture.project_id).where(*filters).group_by(Manufacture.project_id).order_by(Manufacture.project_id).limit(limit + 1)
+    if after is not None:
+        page = page.where(Manufacture.project_id > after)
+
+    price = (Manufacture.price_estimate * ExchangeRate.rate / target_rate).label("price")
+    converted = (
+        db.select(Manufacture.project_id, price)
+        .outerjoin(ExchangeRate, ExchangeRate.currency_id == Manufacture.currency_id)
+        .where(Manufacture.project_id.in_(page))
+        .cte("converted")
+        )
+
+    # Converted prices are numbered 1..offers within their project; unconverted offerings are numbered separately.
+    ranked = db.select(
+        converted.c.project_id,
+        converted.c.price,
+        func.row_number().over(partition_by=(converted.c.project_id, converted.c.price.is_(None)), order_by=converted.c.price).label("position"),
+        func.count(converted.c.price).over(partition_by=converted.c.project_id).label("offers"),
+        ).cte("ranked")
+    middle = ranked.c.position.in_([(ranked.c.offers + 1) // 2, (ranked.c.offers + 2) // 2])
+
+    query = (
+        db.select(
+            ranked.c.project_id,
+            Project.title,
+            func.count(ranked.c.price).label("offers"),
+            (func.count() - func.count(ranked.c.price)).label("unconverted"),
+            func.min(ranked.c.price).label("min_price"),
+            func.avg(case((and_(ranked.c.price.is_not(None), middle), ranked.c.price))).label("median_price"),
+            func.max(ranked.c.price).label("max_price"),
+            )
+        .join(Project, Project.id == ranked.c.project_id)
+        .group_by(ranked.c.project_id, Project.title)
+        .order_by(ranked.c.project_id)
+        )
+
+    rows = db.session.execute(query).mappings().all()
+    next_cursor = encode_cursor([rows[limit - 1]["project_id"]]) if len(rows) > limit else None
+    results = [{
+        "project": {"id": row["project_id"], "title": row["title"]},
+        "currency": abbr,
+        "offers": row["offers"],
+        "unconverted": row["unconverted"],
+        "min_price": round_price(row["min_price"]),
+        "median_price": round_price(row["median_price"]),
+        "max_price": round_price(row["max_price"]),
+        } for row in rows[:limit]]
+    return results, next_cursor
+
+
+def round_price(value):
+    return None if value is None else round(float(value), 2)
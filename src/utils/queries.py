@@ -0,0 +1,19 @@
+from sqlalchemy import exists, inspect
+
+from main import db
+
+
+def record_exists(model, *key):
+    '''
+    This helper function checks whether an entry with the given primary key exists in the table of the given model. Only
+    a boolean is returned by the database, so no row is loaded into the session and nothing needs to be serialised.
+
+    Database statement: SELECT EXISTS (SELECT 1 FROM table WHERE id=key);
+    '''
+    return db.session.scalar(record_exists_query(model, *key))
+
+
+def record_exists_query(model, *key):
+    key_columns = inspect(model).primary_key
+    condition = [column == value for column, value in zip(key_columns, key)]
+    return db.select(exists().where(*condition))
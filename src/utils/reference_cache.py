@@ -0,0 +1,116 @@
+from flask import current_app
+import json
+import threading
+import time
+
+from main import db
+
+
+class LocalCacheBackend(object):
+    '''
+    Cache backend held in the memory of this process. Each gunicorn worker has its own copy, so an entry invalidated by one
+    worker can still be served by the others for up to `ttl` seconds. At most `max_entries` entries are held; when it is
+    full, expired entries are dropped first, then the oldest.
+    '''
+    def __init__(self, ttl, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+
+    def set(self, key, value):
+        now = time.monotonic()
+        with self._lock:
+            # Entries are kept in the order they were set, so the oldest entry is always first.
+            self._entries.pop(key, None)
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: entry for k, entry in self._entries.items() if now - entry[1] <= self.ttl}
+            while len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (value, now)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisCacheBackend(object):
+    '''
+    Cache backend shared by every worker through a Redis server, so an invalidation is seen by all workers at once. The
+    redis package is only needed when REFERENCE_CACHE_URL is set.
+    '''
+    def __init__(self, url, ttl):
+        import redis
+
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(f"reference:{key}")
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value):
+        self._client.set(f"reference:{key}", json.dumps(value), ex=self.ttl)
+
+    def delete(self, key):
+        self._client.delete(f"reference:{key}")
+
+
+def get_reference_cache():
+    '''
+    This helper function returns the reference table cache of the current application. A Redis backend is used if
+    REFERENCE_CACHE_URL is set, otherwise entries are cached in the memory of each process.
+    '''
+    cache = current_app.extensions.get("reference_cache")
+    if cache is None:
+        url = current_app.config["REFERENCE_CACHE_URL"]
+        ttl = current_app.config["REFERENCE_CACHE_TTL"]
+        cache = RedisCacheBackend(url, ttl) if url else LocalCacheBackend(ttl)
+        current_app.extensions["reference_cache"] = cache
+    return cache
+
+
+def get_reference_list(schema, model):
+    '''
+    This helper function returns every entry of a small lookup table (countries, currencies, location types), serialised
+    with the given plural schema. The serialised list is read from the reference cache, and the database is only queried
+    when the cache is empty.
+
+    Database statement (cache miss only): SELECT * FROM table ORDER BY id;
+    '''
+    cache = get_reference_cache()
+    response = cache.get(model.__tablename__)
+
+    if response is None:
+        query = db.select(model).order_by(model.id)
+        response = schema.dump(db.session.scalars(query))
+        cache.set(model.__tablename__, response)
+
+    return response
+
+
+def get_reference_entry(schema, model, entry_id):
+    '''
+    This helper function returns a single serialised entry of a lookup table by id, taken from the cached list of the
+    whole table. The plural schema of the table must be given, as for get_reference_list. None is returned if no entry
+    has that id.
+    '''
+    for entry in get_reference_list(schema, model):
+        if entry["id"] == entry_id:
+            return entry
+    return None
+
+
+def invalidate_reference_list(model):
+    '''
+    This helper function removes the cached list of a lookup table. It must be called by every route that creates, updates
+    or deletes entries of that table, after the change has been committed.
+    '''
+    get_reference_cache().delete(model.__tablename__)
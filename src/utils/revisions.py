@@ -0,0 +1,214 @@
+from flask import request
+from werkzeug.exceptions import BadRequest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import difflib
+import json
+
+from main import db
+from models import Drawing, DrawingRevision
+from utils.pagination import encode_cursor, decode_cursor, get_limit
+from utils.table_versions import bump_table_versions
+
+# The part description is stored in full on every SNAPSHOT_INTERVAL-th revision of a drawing, and as a delta against the
+# previous revision in between, so any revision is rebuilt from at most SNAPSHOT_INTERVAL rows.
+SNAPSHOT_INTERVAL = 16
+
+# The drawing columns copied into each revision
+REVISION_COLUMNS = ("version", "drawing_number", "project_id", "part_description", "last_modified")
+
+
+def encode_delta(old, new):
+    '''
+    This helper function returns the changes that turn the text `old` into the text `new`, as a compact json list of
+    operations applied from the start of `old`: a positive number copies that many characters of `old`, a negative number
+    skips that many characters of `old`, and a string is inserted, e.g. encode_delta("Leg assembly, left side",
+    "Leg assembly, right side") is '[14,-3,"righ",6]'. None is returned if the delta is no shorter than `new` itself, in
+    which case the text is stored in full.
+    '''
+    operations = []
+    for tag, old_start, old_end, new_start, new_end in difflib.SequenceMatcher(None, old, new).get_opcodes():
+        if tag == "equal":
+            operations.append(old_end - old_start)
+            continue
+        if old_end > old_start:
+            operations.append(old_start - old_end)
+        if new_end > new_start:
+            operations.append(new[new_start:new_end])
+
+    delta = json.dumps(operations, ensure_ascii=False, separators=(",", ":"))
+    return delta if len(delta) < len(new) else None
+
+
+def apply_delta(old, delta):
+    '''
+    This helper function reverses encode_delta, returning the new text from the old text and the delta.
+    '''
+    parts = []
+    position = 0
+    for operation in json.loads(delta):
+        if isinstance(operation, str):
+            parts.append(operation)
+        elif operation > 0:
+            parts.append(old[position:position + operation])
+            position += operation
+        else:
+            position -= operation
+    return "".join(parts)
+
+
+def rebuild_descriptions(rows):
+    '''
+    This helper function returns the part description of each of the given revisions of one drawing, ordered by version,
+    by applying each delta to the description of the revision before it. The first row must be a snapshot.
+    '''
+    descriptions = []
+    description = None
+    for row in rows:
+        if row.part_description_delta is None:
+            description = row.part_description
+        else:
+            description = apply_delta(description, row.part_description_delta)
+        descriptions.append(description)
+    return descriptions
+
+
+def snapshot_revisions(connection, *conditions):
+    '''
+    This helper function records the current version of each drawing matching the conditions as a snapshot revision, e.g.
+    for new drawings, or every existing drawing when revisions are first added. Drawings created by the ORM are recorded
+    by the after_flush listener below; drawings inserted with Core statements must be recorded by the caller.
+
+    Database statement: INSERT INTO drawing_revisions (drawing_id, version, ..., base_version)
+    SELECT id, version, ..., version FROM drawings WHERE conditions;
+    '''
+    columns = [getattr(Drawing, name) for name in REVISION_COLUMNS]
+    connection.execute(
+        db.insert(DrawingRevision).from_select(
+            ["drawing_id", *REVISION_COLUMNS, "base_version"],
+            db.select(Drawing.id, *columns, Drawing.version).where(*conditions)
+            )
+        )
+    bump_table_versions(connection, [DrawingRevision.__tablename__])
+
+
+def record_revisions(connection, drawings):
+    '''
+    This helper function records the current version of each of the given (updated) drawings. The part description is
+    stored as a delta against the latest revision of the drawing, which is rebuilt from its delta chain, read with a single
+    query for all the drawings. A snapshot is stored instead when the chain has reached SNAPSHOT_INTERVAL revisions, when
+    either description is empty, when the delta would be no shorter than the description, or when the drawing has no
+    revisions yet.
+
+    Database statement: SELECT * FROM drawing_revisions WHERE drawing_id IN (ids) AND version >= (SELECT base_version FROM
+    drawing_revisions AS latest WHERE latest.drawing_id = drawing_revisions.drawing_id ORDER BY version DESC LIMIT 1)
+    ORDER BY drawing_id, version;
+    Database statement: INSERT INTO drawing_revisions (...) VALUES (...), ...;
+    '''
+    if not drawings:
+        return
+
+    latest = db.aliased(DrawingRevision)
+    chain_start = (
+        db.select(latest.base_version)
+        .where(latest.drawing_id == DrawingRevision.drawing_id)
+        .order_by(latest.version.desc())
+        .limit(1)
+        .scalar_subquery()
+        )
+    rows = connection.execute(
+        db.select(DrawingRevision)
+        .where(DrawingRevision.drawing_id.in_([drawing.id for drawing in drawings]), DrawingRevision.version >= chain_start)
+        .order_by(DrawingRevision.drawing_id, DrawingRevision.version)
+        ).all()
+    chains = {}
+    for row in rows:
+        chains.setdefault(row.drawing_id, []).append(row)
+
+    revisions = []
+    for drawing in drawings:
+        revision = {name: getattr(drawing, name) for name in REVISION_COLUMNS}
+        revision.update(drawing_id=drawing.id, part_description_delta=None, base_version=drawing.version)
+
+        chain = chains.get(drawing.id, [])
+        previous = rebuild_descriptions(chain)[-1] if chain else None
+        if previous is not None and drawing.part_description is not None and len(chain) < SNAPSHOT_INTERVAL:
+            delta = encode_delta(previous, drawing.part_description)
+            if delta is not None:
+                revision.update(part_description=None, part_description_delta=delta, base_version=chain[0].base_version)
+        revisions.append(revision)
+
+    connection.execute(db.insert(DrawingRevision), revisions)
+    bump_table_versions(connection, [DrawingRevision.__tablename__])
+
+
+def remove_revisions(connection, drawing_ids):
+    '''
+    This helper function removes the revisions of deleted drawings. The foreign key removes them on PostgreSQL; SQLite does
+    not enforce foreign keys, and may give the id of a deleted drawing to a new one.
+
+    Database statement: DELETE FROM drawing_revisions WHERE drawing_id IN (drawing_ids);
+    '''
+    if not drawing_ids:
+        return
+
+    connection.execute(db.delete(DrawingRevision).where(DrawingRevision.drawing_id.in_(drawing_ids)))
+    bump_table_versions(connection, [DrawingRevision.__tablename__])
+
+
+@event.listens_for(Session, "after_flush")
+def record_flushed_revisions(session, flush_context):
+    '''
+    Every drawing inserted by the ORM during a flush is recorded as its first revision, and the revisions of every deleted
+    drawing are removed, in the same transaction. Drawings are updated with utils/updates.update_entry, which records the
+    new revision itself.
+    '''
+    new_ids = [instance.id for instance in session.new if type(instance) is Drawing]
+    deleted_ids = [instance.id for instance in session.deleted if type(instance) is Drawing]
+
+    connection = session.connection()
+    if new_ids:
+        snapshot_revisions(connection, Drawing.id.in_(new_ids))
+    remove_revisions(connection, deleted_ids)
+
+
+def get_drawing_history(drawing_id):
+    '''
+    This helper function returns a page of the revisions of a drawing, oldest first, and the cursor of the next page. The
+    `after` cursor holds the last version of the previous page.
+
+    The revisions of the page are read together with the delta chain leading up to the first of them (at most
+    SNAPSHOT_INTERVAL - 1 earlier revisions) in a single statement served by the (drawing_id, version) index, and the part
+    description of each revision is rebuilt from its snapshot.
+
+    Database statement: SELECT * FROM drawing_revisions WHERE drawing_id=drawing_id AND version >= (SELECT base_version
+    FROM drawing_revisions WHERE drawing_id=drawing_id AND version > after ORDER BY version LIMIT 1) ORDER BY version
+    LIMIT limit + SNAPSHOT_INTERVAL;
+    '''
+    limit = get_limit()
+    cursor = request.args.get("after")
+    after = decode_cursor(cursor, 1)[0] if cursor else None
+    if after is not None and not isinstance(after, int):
+        raise BadRequest("The `after` cursor is not valid.")
+
+    query = db.select(DrawingRevision).filter_by(drawing_id=drawing_id).order_by(DrawingRevision.version)
+    if after is not None:
+        chain_start = (
+            db.select(DrawingRevision.base_version)
+            .filter_by(drawing_id=drawing_id)
+            .where(DrawingRevision.version > after)
+            .order_by(DrawingRevision.version)
+            .limit(1)
+            .scalar_subquery()
+            )
+        query = query.where(DrawingRevision.version >= chain_start)
+
+    rows = db.session.scalars(query.limit(limit + SNAPSHOT_INTERVAL)).all()
+    page = [
+        {**{name: getattr(row, name) for name in REVISION_COLUMNS}, "part_description": description}
+        for row, description in zip(rows, rebuild_descriptions(rows))
+        if after is None or row.version > after
+        ]
+
+    next_cursor = encode_cursor([page[limit - 1]["version"]]) if len(page) > limit else None
+    return page[:limit], next_cursor
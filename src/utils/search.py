@@ -0,0 +1,236 @@
+from flask import current_app, request
+from werkzeug.exceptions import BadRequest
+from sqlalchemy import event, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+import html
+
+from main import db
+from models import Project, Drawing, Comment, SearchDocument
+from utils.pagination import encode_cursor, decode_cursor, get_limit
+from utils.table_versions import bump_table_versions
+
+# The searchable models: kind, title column and content column of each.
+SEARCHABLE = {
+    Project: ("project", "title", "description"),
+    Drawing: ("drawing", "drawing_number", "part_description"),
+    Comment: ("comment", None, "comment"),
+}
+SEARCH_KINDS = [kind for kind, _, _ in SEARCHABLE.values()]
+
+# The database marks the matches in a highlighted fragment with these characters (Unicode noncharacters, reserved for
+# internal use), which are turned into <mark></mark> tags once the rest of the fragment has been escaped.
+HIGHLIGHT_START = "\ufdd0"
+HIGHLIGHT_STOP = "\ufdd1"
+
+
+def build_document(model, entity_id, values):
+    '''
+    This helper function returns the search_documents entry of an entry of a searchable model. The values can be the
+    instance itself or a dictionary of its columns.
+    '''
+    kind, title_column, content_column = SEARCHABLE[model]
+    get = values.get if isinstance(values, dict) else lambda name: getattr(values, name)
+    return {
+        "search_kind": kind,
+        "search_entity_id": entity_id,
+        "search_title": get(title_column) if title_column else None,
+        "search_content": get(content_column),
+        }
+
+
+def index_documents(connection, documents):
+    '''
+    This helper function adds or replaces the search_documents entries of the given documents (see build_document). On
+    PostgreSQL the tsvector of each document is built in the same statement, with the title weighted above the content. On
+    SQLite the FTS5 table is updated by triggers.
+
+    Database statement: INSERT INTO search_documents (kind, entity_id, title, content, document) VALUES (...), ...
+    ON CONFLICT (kind, entity_id) DO UPDATE SET title=excluded.title, content=excluded.content, document=excluded.document;
+    '''
+    if not documents:
+        return
+
+    dialect = connection.dialect.name
+    values = {
+        "kind": db.bindparam("search_kind"),
+        "entity_id": db.bindparam("search_entity_id"),
+        "title": db.bindparam("search_title"),
+        "content": db.bindparam("search_content"),
+        }
+    if dialect == "postgresql":
+        language = current_app.config["SEARCH_LANGUAGE"]
+        title_vector = func.to_tsvector(language, func.coalesce(db.bindparam("search_title"), ""))
+        content_vector = func.to_tsvector(language, func.coalesce(db.bindparam("search_content"), ""))
+        values["document"] = func.setweight(title_vector, "A").op("||")(func.setweight(content_vector, "B"))
+
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    statement = insert(SearchDocument).values(**values)
+    statement = statement.on_conflict_do_update(
+        index_elements=["kind", "entity_id"],
+        set_={name: statement.excluded[name] for name in values if name not in ("kind", "entity_id")}
+        )
+    connection.execute(statement, documents)
+    bump_table_versions(connection, [SearchDocument.__tablename__])
+
+
+def remove_documents(connection, kind, entity_ids):
+    '''
+    This helper function removes the search_documents entries of deleted entries.
+
+    Database statement: DELETE FROM search_documents WHERE kind=kind AND entity_id IN (entity_ids);
+    '''
+    if not entity_ids:
+        return
+
+    connection.execute(
+        db.delete(SearchDocument).where(SearchDocument.kind == kind, SearchDocument.entity_id.in_(entity_ids))
+        )
+    bump_table_versions(connection, [SearchDocument.__tablename__])
+
+
+def reindex_all(connection):
+    '''
+    This helper function builds the search_documents entry of every project, drawing and comment, e.g. for an existing
+    database when search is first added.
+    '''
+    for model in SEARCHABLE:
+        rows = connection.execute(db.select(model.__table__)).mappings()
+        index_documents(connection, [build_document(model, row["id"], row) for row in rows])
+
+
+@event.listens_for(Session, "after_flush")
+def index_flushed_documents(session, flush_context):
+    '''
+    Every searchable entry inserted or updated by the ORM during a flush has its search document rebuilt, and every deleted
+    entry has its search document removed, in the same transaction.
+    '''
+    documents = []
+    deleted = {}
+    for instance in session.new:
+        if type(instance) in SEARCHABLE:
+            documents.append(build_document(type(instance), instance.id, instance))
+    for instance in session.dirty:
+        if type(instance) in SEARCHABLE and session.is_modified(instance, include_collections=False):
+            documents.append(build_document(type(instance), instance.id, instance))
+    for instance in session.deleted:
+        if type(instance) in SEARCHABLE:
+            deleted.setdefault(SEARCHABLE[type(instance)][0], []).append(instance.id)
+
+    connection = session.connection()
+    index_documents(connection, documents)
+    for kind, entity_ids in deleted.items():
+        remove_documents(connection, kind, entity_ids)
+
+
+def read_search_query():
+    '''
+    This helper function reads the `q` (search text) and optional `type` (comma separated kinds) query parameters.
+    '''
+    text = request.args.get("q", "").strip()
+    if not text:
+        raise BadRequest("The `q` query parameter is required.")
+
+    kinds = [kind for kind in request.args.get("type", "").split(",") if kind] or SEARCH_KINDS
+    unknown = set(kinds) - set(SEARCH_KINDS)
+    if unknown:
+        raise BadRequest(f"The `type` query parameter must be one or more of: {', '.join(SEARCH_KINDS)}.")
+
+    return text, kinds
+
+
+def highlight_html(fragment):
+    '''
+    This helper function turns a highlighted fragment from the database into HTML. The text of the fragment is escaped,
+    so that markup in a project, drawing or comment is shown as text, and then the matches are wrapped in <mark></mark>.
+    '''
+    if fragment is None:
+        return None
+    return html.escape(fragment).replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_STOP, "</mark>")
+
+
+def search_documents(text, kinds):
+    '''
+    This helper function returns a page of the search documents matching the search text, ranked best match first, and the
+    cursor of the next page. Each result has the kind and id of the matching entry, its title, its rank and a highlighted
+    fragment of the matching text as HTML: the text is escaped and the matches are wrapped in <mark></mark> (see
+    highlight_html).
+
+    Ranked results have no stable key to page on, so the `after` cursor holds the offset of the next page.
+
+    On PostgreSQL the search text uses web search syntax ("quoted phrases", or, -excluded) against the tsvector column, and
+    the highlighted fragments are only built for the rows on the page.
+    Database statement: SELECT ... FROM search_documents WHERE document @@ websearch_to_tsquery(text)
+    ORDER BY ts_rank(document, query) DESC, id LIMIT limit + 1 OFFSET after;
+
+    On SQLite every word of the search text must match the FTS5 table, ranked by bm25.
+    Database statement: SELECT ... FROM search_documents_fts JOIN search_documents ON search_documents.id = rowid
+    WHERE search_documents_fts MATCH text ORDER BY bm25(search_documents_fts) LIMIT limit + 1 OFFSET after;
+    '''
+    limit = get_limit()
+    cursor = request.args.get("after")
+    offset = decode_cursor(cursor, 1)[0] if cursor else 0
+    if not isinstance(offset, int) or offset < 0:
+        raise BadRequest("The `after` cursor is not valid.")
+
+    if db.session.get_bind().dialect.name == "postgresql":
+        query = postgres_search_query(text, kinds, offset, limit + 1)
+    else:
+        query = sqlite_search_query(text, kinds, offset, limit + 1)
+
+    rows = db.session.execute(query).mappings().all()
+    next_cursor = encode_cursor([offset + limit]) if len(rows) > limit else None
+    results = [{
+        "type": row["kind"],
+        "id": row["entity_id"],
+        "title": row["title"],
+        "rank": row["rank"],
+        "highlight": highlight_html(row["highlight"]),
+        } for row in rows[:limit]]
+    return results, next_cursor
+
+
+def postgres_search_query(text, kinds, offset, limit):
+    language = current_app.config["SEARCH_LANGUAGE"]
+    ts_query = func.websearch_to_tsquery(language, text)
+    rank = func.ts_rank(SearchDocument.document, ts_query)
+
+    # Rank and page the matches first, so that ts_headline (which re-reads each document) only runs for the rows returned.
+    page = (
+        db.select(SearchDocument.id, rank.label("rank"))
+        .where(SearchDocument.document.op("@@")(ts_query), SearchDocument.kind.in_(kinds))
+        .order_by(rank.desc(), SearchDocument.id)
+        .offset(offset)
+        .limit(limit)
+        .subquery()
+        )
+    highlight = func.ts_headline(
+        language,
+        func.concat_ws(" ", SearchDocument.title, SearchDocument.content),
+        ts_query,
+        f'StartSel="{HIGHLIGHT_START}", StopSel="{HIGHLIGHT_STOP}", MaxFragments=2'
+        )
+    return (
+        db.select(SearchDocument.kind, SearchDocument.entity_id, SearchDocument.title, page.c.rank, highlight.label("highlight"))
+        .join(page, SearchDocument.id == page.c.id)
+        .order_by(page.c.rank.desc(), SearchDocument.id)
+        )
+
+
+def sqlite_search_query(text, kinds, offset, limit):
+    # Quote every word so that FTS5 query syntax in the search text is matched literally.
+    match = " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+    fts = db.table("search_documents_fts", db.column("rowid"))
+    # bm25 is lower for better matches; it is negated so that a higher rank is a better match on both databases.
+    rank = -func.bm25(db.literal_column("search_documents_fts"), 2.0, 1.0)
+    highlight = func.snippet(db.literal_column("search_documents_fts"), -1, HIGHLIGHT_START, HIGHLIGHT_STOP, "...", 16)
+
+    return (
+        db.select(SearchDocument.kind, SearchDocument.entity_id, SearchDocument.title, rank.label("rank"), highlight.label("highlight"))
+        .select_from(fts)
+        .join(SearchDocument, SearchDocument.id == fts.c.rowid)
+        .where(db.literal_column("search_documents_fts").op("MATCH")(match), SearchDocument.kind.in_(kinds))
+        .order_by(db.literal_column("rank").desc(), SearchDocument.id)
+        .offset(offset)
+        .limit(limit)
+        )
@@ -0,0 +1,53 @@
+from flask import Response, current_app, request, stream_with_context
+from main import db
+from utils.pagination import sort_keys, order_by_clauses
+
+
+def wants_stream():
+    '''
+    This helper function checks whether the client asked for a streamed response: newline delimited json with the
+    "Accept: application/x-ndjson" header, or a streamed json array with the "?stream=true" query parameter.
+    '''
+    return wants_ndjson() or request.args.get("stream", "").lower() == "true"
+
+
+def wants_ndjson():
+    return request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"]) == "application/x-ndjson"
+
+
+def stream_response(query, model, schema, sort=()):
+    '''
+    This helper function returns every row of a select statement as a streamed response, for exports that are too large to
+    build in memory. Unlike the paginated response, rows are read from a server-side cursor in batches of STREAM_BATCH_SIZE,
+    and each batch is serialised and sent before the next one is read. The session only keeps weak references to unchanged
+    rows, so a sent batch can be garbage collected and the memory used stays the same whatever the number of rows.
+
+    Rows are ordered by the requested sort columns and then the primary key of the model (see utils/pagination.py), and
+    serialised with the given plural schema. The response is newline delimited json (one object per line) if the client
+    accepts application/x-ndjson, otherwise a json array.
+
+    Database statement: SELECT * FROM table ORDER BY (primary key);
+    '''
+    batch_size = current_app.config["STREAM_BATCH_SIZE"]
+    query = query.order_by(*order_by_clauses(sort_keys(model, sort))).execution_options(yield_per=batch_size)
+    ndjson = wants_ndjson()
+    dumps = current_app.json.dumps
+
+    def generate():
+        first = True
+        if not ndjson:
+            yield "["
+
+        for batch in db.session.scalars(query).partitions():
+            for item in schema.dump(batch):
+                if ndjson:
+                    yield dumps(item) + "\n"
+                else:
+                    yield dumps(item) if first else "," + dumps(item)
+                first = False
+
+        if not ndjson:
+            yield "]"
+
+    mimetype = "application/x-ndjson" if ndjson else "application/json"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
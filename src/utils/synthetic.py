@@ -0,0 +1,211 @@
+from sqlalchemy import func
+import click
+import csv
+import datetime
+import io
+import itertools
+import random
+import string
+
+from main import db
+from models import Country, Currency, ExchangeRate, LocationType, Location, User, Project, Drawing, Comment, Manufacture
+from utils.catalogue import rebuild_catalogue
+from utils.passwords import hash_password
+from utils.reference_cache import invalidate_reference_list
+from utils.revisions import snapshot_revisions
+from utils.search import SEARCHABLE, build_document, index_documents
+from utils.table_versions import bump_table_versions
+
+# Rows added per unit of scale, e.g. --scale 1000 adds 1000 locations, 1000 projects, 5000 drawings, 10000 comments, ...
+# About 22 rows are added per unit of scale in total, so --scale 450000 gives a dataset of 10 million rows.
+DRAWINGS_PER_PROJECT = 5
+COMMENTS_PER_PROJECT = 10
+SUPPLIERS_PER_PROJECT = 5
+USERS_PER_LOCATION = 0.1
+LOCATIONS_PER_COUNTRY = 1000
+LOCATIONS_PER_LOCATION_TYPE = 10000
+LOCATIONS_PER_CURRENCY = 10000
+
+# Rows generated, inserted and committed at a time
+BATCH_SIZE = 10000
+
+# Password of every synthetic user, e.g. synthetic_user_1 / synthetic-password
+SYNTHETIC_PASSWORD = "synthetic-password"
+
+WORDS = (
+    "bracket", "shaft", "coupling", "housing", "liner", "chute", "frame", "guard", "plate", "flange", "bearing", "pulley",
+    "conveyor", "crusher", "screen", "pump", "impeller", "hopper", "mount", "support", "platform", "walkway", "ladder",
+    "skirt", "idler", "bushing", "sleeve", "wear", "steel", "stainless", "welded", "machined", "replacement", "upgrade",
+    )
+
+
+def seed_synthetic(scale, seed=0):
+    '''
+    This function adds a synthetic dataset on top of the seeded tables, for benchmarking the application at a realistic
+    size. `scale` locations and projects are added, with DRAWINGS_PER_PROJECT drawings, COMMENTS_PER_PROJECT comments and
+    SUPPLIERS_PER_PROJECT suppliers (manufactures) for each project, a user for every 1/USERS_PER_LOCATION locations, and
+    countries, location types and currencies (with exchange rates) in proportion. Every foreign key refers to an existing entry.
+
+    The rows are generated from a fixed random seed, so the same scale always gives the same dataset and benchmark runs
+    can be compared between branches. They are written in batches of BATCH_SIZE with Core inserts (COPY on PostgreSQL),
+    which are committed as they go, with a progress bar per table. Because Core statements bypass the ORM flush events, the
+    search documents, drawing revisions, location catalogues, table versions and cached lookup tables are updated here.
+    '''
+    rng = random.Random(seed)
+    password = hash_password(SYNTHETIC_PASSWORD)
+
+    with db.engine.connect() as connection:
+        add_rows(connection, Country, new_ids(connection, Country, max(1, scale // LOCATIONS_PER_COUNTRY)),
+            lambda id: [{"id": id, "country": f"Synthetic Country {id}"}])
+        add_rows(connection, LocationType, new_ids(connection, LocationType, max(1, scale // LOCATIONS_PER_LOCATION_TYPE)),
+            lambda id: [{"id": id, "location_type": f"Synthetic Type {id}"}])
+
+        currency_ids = new_ids(connection, Currency, max(1, scale // LOCATIONS_PER_CURRENCY))
+        codes = unused_currency_codes(connection)
+        add_rows(connection, Currency, currency_ids[:len(codes)],
+            lambda id: [{"id": id, "currency_abbr": codes[id - currency_ids[0]]}])
+        add_rows(connection, ExchangeRate, currency_ids[:len(codes)],
+            lambda id: [{"currency_id": id, "rate": round(rng.uniform(0.01, 2), 6), "last_modified": random_time(rng)}])
+
+        country_ids = connection.scalars(db.select(Country.id)).all()
+        location_type_ids = connection.scalars(db.select(LocationType.id)).all()
+        currency_ids = connection.scalars(db.select(Currency.id)).all()
+
+        location_ids = new_ids(connection, Location, scale)
+        add_rows(connection, Location, location_ids, lambda id: [{
+            "id": id,
+            "name": f"Synthetic Site {id}",
+            "admin_phone_number": f"+61 {rng.randrange(10**8, 10**9)}",
+            "country_id": rng.choice(country_ids),
+            "location_type_id": rng.choice(location_type_ids),
+            }])
+
+        user_ids = new_ids(connection, User, max(1, int(scale * USERS_PER_LOCATION)))
+        add_rows(connection, User, user_ids, lambda id: [{
+            "id": id,
+            "username": f"synthetic_user_{id}",
+            "email_address": f"synthetic_user_{id}@example.com",
+            "position": "Engineer",
+            "password": password,
+            "is_admin": False,
+            "location_id": rng.choice(location_ids),
+            }])
+
+        project_ids = new_ids(connection, Project, scale)
+        add_rows(connection, Project, project_ids, lambda id: [{
+            "id": id,
+            "title": sentence(rng, 3).title(),
+            "published_date": datetime.date(2015, 1, 1) + datetime.timedelta(days=rng.randrange(3650)),
+            "description": sentence(rng, 20),
+            "certification_number": f"CERT-{rng.randrange(10**6):06d}",
+            }])
+
+        drawing_ids = new_ids(connection, Drawing, scale * DRAWINGS_PER_PROJECT)
+        add_rows(connection, Drawing, drawing_ids, lambda id: [{
+            "id": id,
+            "drawing_number": f"SD{id:08d}",
+            "part_description": sentence(rng, 8),
+            "version": rng.randrange(1, 5),
+            "last_modified": random_time(rng),
+            "project_id": project_ids[(id - drawing_ids[0]) // DRAWINGS_PER_PROJECT],
+            }])
+        print("Recording the drawing revisions.")
+        snapshot_revisions(connection, Drawing.id >= drawing_ids.start)
+        connection.commit()
+
+        comment_ids = new_ids(connection, Comment, scale * COMMENTS_PER_PROJECT)
+        add_rows(connection, Comment, comment_ids, lambda id: [{
+            "id": id,
+            "comment": sentence(rng, 15),
+            "when_created": random_time(rng),
+            "last_edited": None,
+            "project_id": project_ids[(id - comment_ids[0]) // COMMENTS_PER_PROJECT],
+            "user_id": rng.choice(user_ids),
+            }])
+
+        # Manufactures are keyed by (location_id, project_id), so they are generated per project.
+        add_rows(connection, Manufacture, project_ids, lambda project_id: [{
+            "location_id": location_id,
+            "project_id": project_id,
+            "price_estimate": round(rng.uniform(100, 100000), 2),
+            "currency_id": rng.choice(currency_ids),
+            } for location_id in sorted(rng.sample(location_ids, min(SUPPLIERS_PER_PROJECT, len(location_ids))))])
+
+        print("Rebuilding the location catalogues.")
+        rebuild_catalogue(connection)
+        connection.commit()
+
+    for model in (Country, LocationType, Currency):
+        invalidate_reference_list(model)
+
+
+def new_ids(connection, model, count):
+    # The ids after the highest existing id are given to the new rows, so that they can be referred to without RETURNING.
+    first_id = connection.scalar(db.select(func.coalesce(func.max(model.id), 0))) + 1
+    return range(first_id, first_id + count)
+
+
+def unused_currency_codes(connection):
+    existing = set(connection.scalars(db.select(Currency.currency_abbr)))
+    return [code for code in map("".join, itertools.product(string.ascii_uppercase, repeat=3)) if code not in existing]
+
+
+def add_rows(connection, model, keys, make_rows):
+    '''
+    This helper function inserts the rows made for each key (e.g. each new id) in batches of BATCH_SIZE keys, committing
+    each batch. Searchable rows are indexed in the same transaction as their batch.
+    '''
+    table = model.__table__
+    with click.progressbar(length=len(keys), label=f"{table.name:<15}") as progress:
+        for start in range(0, len(keys), BATCH_SIZE):
+            batch = keys[start:start + BATCH_SIZE]
+            rows = [row for key in batch for row in make_rows(key)]
+            insert_rows(connection, table, rows)
+            if model in SEARCHABLE:
+                index_documents(connection, [build_document(model, row["id"], row) for row in rows])
+            connection.commit()
+            progress.update(len(batch))
+
+    bump_table_versions(connection, [table.name])
+    if connection.dialect.name == "postgresql" and "id" in table.c:
+        # Explicit ids do not advance the id sequence, so it is moved past them for the next insert.
+        connection.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), (SELECT max(id) FROM {table.name}))"
+            ))
+    connection.commit()
+
+
+def insert_rows(connection, table, rows):
+    '''
+    This helper function writes a batch of rows with COPY on PostgreSQL (psycopg2), the fastest way to load rows into it,
+    and with a single executemany INSERT statement on other databases.
+
+    Database statement: COPY table (columns) FROM STDIN WITH (FORMAT csv);
+    '''
+    if not rows:
+        return
+
+    if connection.dialect.driver != "psycopg2":
+        connection.execute(table.insert(), rows)
+        return
+
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # An empty unquoted field is read as NULL by COPY ... (FORMAT csv).
+        writer.writerow(["" if row[name] is None else row[name] for name in columns])
+    buffer.seek(0)
+
+    preparer = connection.dialect.identifier_preparer
+    statement = f"COPY {preparer.format_table(table)} ({', '.join(preparer.quote(name) for name in columns)}) FROM STDIN WITH (FORMAT csv)"
+    with connection.connection.cursor() as cursor:
+        cursor.copy_expert(statement, buffer)
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def random_time(rng):
+    return datetime.datetime(2020, 1, 1) + datetime.timedelta(seconds=rng.randrange(4 * 365 * 24 * 3600))
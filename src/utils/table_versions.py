@@ -0,0 +1,140 @@
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import datetime
+import weakref
+
+from main import db
+from models.table_versions import TableVersion
+
+# The session whose transaction each connection belongs to, while that transaction is open (see track_session_connection)
+session_connections = weakref.WeakKeyDictionary()
+
+
+def bump_table_versions(connection, table_names):
+    '''
+    This helper function increases the version counter and updates the last_modified time of each of the given tables in
+    the table_versions table.
+
+    When the connection belongs to the transaction of an ORM session (e.g. db.session.connection()), the tables are only
+    noted on the session, and their versions are increased after the session commits, in a short transaction of their own
+    (see bump_committed_table_versions). Otherwise, e.g. for the connections of migrations and CLI commands, they are
+    increased straight away, on the given connection, and become visible when its transaction commits.
+
+    Writes made through the ORM are picked up automatically by the after_flush listener below. Writes made with Core
+    statements, e.g. db.session.execute(insert(...)), must call this function themselves.
+
+    Database statement: UPDATE table_versions SET version=version + 1, last_modified=now() WHERE table_name IN (table_names);
+    '''
+    session = session_connections.get(connection)
+    if session is not None:
+        session.info.setdefault("changed_tables", set()).update(table_names)
+        return
+
+    table_names = set(table_names)
+    if not table_names:
+        return
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    result = connection.execute(
+        db.update(TableVersion)
+        .where(TableVersion.table_name.in_(table_names))
+        .values(version=TableVersion.version + 1, last_modified=now)
+        )
+
+    # Tables are given a version entry when the schema is created (see utils/migrations.create_schema), or by the revision
+    # that adds the table_versions table to an older database. Any that are missing are added on their first change.
+    if result.rowcount < len(table_names):
+        existing = set(connection.scalars(
+            db.select(TableVersion.table_name).where(TableVersion.table_name.in_(table_names))
+            ))
+        missing = table_names - existing
+        if missing:
+            connection.execute(
+                db.insert(TableVersion),
+                [{"table_name": name, "version": 1, "last_modified": now} for name in missing]
+                )
+
+
+def get_table_versions(table_names):
+    '''
+    This helper function returns a dictionary of table name -> (version, last_modified) for the given tables. Tables that
+    have never been changed are given version 0 and no last_modified time.
+
+    Database statement: SELECT * FROM table_versions WHERE table_name IN (table_names);
+    '''
+    return versions_by_table(table_names, db.session.scalars(table_versions_query(table_names)))
+
+
+def table_versions_query(table_names):
+    return db.select(TableVersion).where(TableVersion.table_name.in_(table_names))
+
+
+def versions_by_table(table_names, entries):
+    versions = {name: (0, None) for name in table_names}
+    for entry in entries:
+        last_modified = entry.last_modified
+        # SQLite does not store the time zone, so the stored UTC time comes back without one.
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=datetime.timezone.utc)
+        versions[entry.table_name] = (entry.version, last_modified)
+    return versions
+
+
+@event.listens_for(Session, "after_flush")
+def bump_flushed_table_versions(session, flush_context):
+    '''
+    Every table with an entry inserted, updated or deleted by the ORM during a flush has its version increased when the
+    session commits.
+    '''
+    table_names = set()
+    for instance in list(session.new) + list(session.deleted):
+        table_names.add(instance.__table__.name)
+    for instance in session.dirty:
+        if session.is_modified(instance, include_collections=False):
+            table_names.add(instance.__table__.name)
+
+    table_names.discard(TableVersion.__tablename__)
+    bump_table_versions(session.connection(), table_names)
+
+
+@event.listens_for(Session, "after_begin")
+def track_session_connection(session, transaction, connection):
+    session_connections[connection] = session
+    session.info.setdefault("versioned_connections", []).append(connection)
+
+
+@event.listens_for(Session, "after_commit")
+def bump_committed_table_versions(session):
+    '''
+    The versions of the tables changed by a session are increased once its transaction has committed, rather than inside
+    it. Increasing them inside the transaction would lock the table_versions row of each changed table until the commit,
+    so that every concurrent write to the same table (including long bulk inserts) would wait for the one before it.
+    Instead each row is only locked for the length of a single UPDATE.
+
+    Because the versions are increased after the data is committed, a conditional GET may briefly read the new data with
+    the old version. It is then answered in full again once the version has moved on, so clients are sent the change a
+    second time rather than never. conditional_get reads the versions before the data for this reason. If the process
+    stops between the commit and this update, the change is only picked up by the ETags when the table next changes.
+    '''
+    table_names = session.info.pop("changed_tables", None)
+    if not table_names:
+        return
+
+    try:
+        with session.get_bind(TableVersion).begin() as connection:
+            bump_table_versions(connection, table_names)
+    except Exception:
+        # The changes themselves are already committed, so the request is not failed.
+        current_app.logger.exception("Could not increase the versions of the tables %s", ", ".join(sorted(table_names)))
+
+
+@event.listens_for(Session, "after_transaction_end")
+def forget_session_connections(session, transaction):
+    if transaction.parent is not None:
+        return
+
+    # Tables changed by a transaction that was rolled back keep their versions.
+    session.info.pop("changed_tables", None)
+    for connection in session.info.pop("versioned_connections", []):
+        session_connections.pop(connection, None)
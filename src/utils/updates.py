@@ -0,0 +1,122 @@
+from flask import request
+from werkzeug.exceptions import BadRequest
+from sqlalchemy import inspect
+
+from main import db
+from models import Project, Drawing, Comment
+from utils.catalogue import CATALOGUE_SOURCES, catalogue_key, refresh_catalogue
+from utils.revisions import record_revisions
+from utils.search import SEARCHABLE, build_document, index_documents
+from utils.table_versions import bump_table_versions
+
+# The models whose entries have a version counter, which every update increases (see update_entry)
+VERSIONED = (Project, Drawing, Comment)
+
+
+def read_partial_update(schema, field_names):
+    '''
+    This helper function reads the changes of a PATCH request: the fields of `field_names` that are given in the json body.
+    Only those fields are validated, with schema.load(partial=True), so that fields which are not being changed do not
+    need placeholder values to pass validation. Other keys in the body are ignored. A dictionary of the loaded values is
+    returned, which is empty if nothing is to be changed; a ValidationError is raised for invalid values.
+    '''
+    body = request.get_json()
+    if not isinstance(body, dict):
+        raise BadRequest("The request body must be a json object.")
+
+    changes = schema.load({name: body[name] for name in field_names if name in body}, partial=True)
+    return {name: changes[name] for name in field_names if name in changes}
+
+
+def read_expected_version():
+    '''
+    This helper function reads the version of the entry that a PATCH request was based on, from the If-Match header (the
+    ETag of the entry, e.g. If-Match: "3") or the `version` field of the json body, and returns it. None is returned if
+    neither is given, or If-Match is *, in which case the changes are applied to whichever version the entry is at. A
+    BadRequest is raised if the version is not an integer, or the header and the body give different versions.
+    '''
+    versions = set()
+
+    if request.if_match and not request.if_match.star_tag:
+        tags = request.if_match.as_set()
+        if len(tags) != 1 or not next(iter(tags)).isdigit():
+            raise BadRequest('The If-Match header must be the ETag of a single version of the entry, e.g. If-Match: "3"')
+        versions.add(int(next(iter(tags))))
+
+    body = request.get_json(silent=True)
+    if isinstance(body, dict) and "version" in body:
+        if type(body["version"]) is not int:
+            raise BadRequest("The `version` field must be an integer.")
+        versions.add(body["version"])
+
+    if len(versions) > 1:
+        raise BadRequest("The If-Match header and the `version` field give different versions.")
+    return versions.pop() if versions else None
+
+
+def update_entry(model, key, changes, *conditions, version=None):
+    '''
+    This helper function applies the changes to the entry with the given primary key (e.g. {"id": 1}) with a single
+    statement, without reading the entry first, and returns the updated entry, or None if no entry has that key or the
+    extra conditions do not hold (e.g. Comment.user_id == user_id). The updated entry is added to the session, so it can
+    be dumped without another query.
+
+    Versioned entries (see VERSIONED) are locked optimistically: the statement increases the version of the entry, and if
+    `version` is given (see read_expected_version), only matches the entry while it is still at that version. Concurrent
+    updates are therefore never silently overwritten, and no row is locked for longer than the statement itself. None is
+    returned if the entry has moved on to another version; see current_version.
+
+    Because the statement bypasses the ORM flush events, the search document and the catalogue entries built from the
+    entry, and the revision history of a drawing, are updated here, in the same transaction, and the table version is
+    increased once it commits (see utils/table_versions.py, utils/search.py, utils/catalogue.py and utils/revisions.py).
+
+    Database statement: UPDATE table SET (changes), version=version+1 WHERE (primary key)=key AND conditions
+    AND version=expected version RETURNING *;
+    '''
+    values = changes
+    if model in VERSIONED:
+        values = {**changes, "version": model.version + 1}
+        if version is not None:
+            conditions = (*conditions, model.version == version)
+
+    statement = db.update(model).filter_by(**key).where(*conditions).values(**values).returning(model)
+    entry = db.session.scalar(statement)
+    if entry is None:
+        return None
+
+    connection = db.session.connection()
+    bump_table_versions(connection, [model.__tablename__])
+
+    if model in SEARCHABLE and set(changes) & set(SEARCHABLE[model][1:]):
+        index_documents(connection, [build_document(model, entry.id, entry)])
+
+    key_names = {column.key for column in inspect(model).primary_key}
+    if model in CATALOGUE_SOURCES and set(changes) & (set(CATALOGUE_SOURCES[model]) | key_names):
+        # Both keys are refreshed when the key itself changes, which removes the entries built from the old key.
+        refresh_catalogue(connection, {model: {catalogue_key(model, key), catalogue_key(model, entry)}})
+
+    if model is Drawing:
+        record_revisions(connection, [entry])
+
+    return entry
+
+
+def current_version(model, key):
+    '''
+    This helper function returns the version that the entry with the given primary key is at, or None if no entry has that
+    key, e.g. to tell a missing entry from a conflicting update when update_entry returns None.
+
+    Database statement: SELECT version FROM table WHERE (primary key)=key;
+    '''
+    return db.session.scalar(db.select(model.version).filter_by(**key))
+
+
+def version_etag(response, entry):
+    # The version of an entry is its ETag, which is sent back in the If-Match header to update it, e.g. If-Match: "3"
+    response.set_etag(str(entry.version))
+    return response
+
+
+def changed_fields(changes):
+    # The names of the changed fields, for the response message, e.g. " title description"
+    return "".join(f" {name}" for name in changes)